@@ -1,8 +1,19 @@
 import guildsDataRaw from "@/data/guilds.json";
 import { Guild } from "@/types";
+import { loadTileIndex, watchTiles } from "@/lib/tiles";
 
 const guildsData = guildsDataRaw as Guild[];
 
+// Guild id -> layer file name under /data/layers (and /data/tiles)
+export const GUILD_LAYER_FILES: Record<string, string> = {
+  "chanterelle": "golden-chanterelle",
+  "hedgehog": "hedgehog-mushroom",
+  "trumpet": "black-trumpet",
+  "candycap": "candy-cap",
+  "bolete": "king-bolete",
+  "morel": "burn-morel"
+};
+
 export const updateProbabilityLayer = (
   map: google.maps.Map, 
   guildId: string,
@@ -11,93 +22,109 @@ export const updateProbabilityLayer = (
   const guild = guildsData.find(g => g.id === guildId);
   if (!guild) return { remove: () => {} };
 
-  const fileMap: Record<string, string> = {
-    "chanterelle": "golden-chanterelle",
-    "hedgehog": "hedgehog-mushroom",
-    "trumpet": "black-trumpet",
-    "candycap": "candy-cap",
-    "bolete": "king-bolete",
-    "morel": "burn-morel"
-  };
-
-  const fileName = fileMap[guildId];
+  const fileName = GUILD_LAYER_FILES[guildId];
   if (!fileName) return { remove: () => {} };
 
-  const url = `/data/layers/${fileName}.json`;
   let heatmap: google.maps.visualization.HeatmapLayer | null = null;
+  let stopWatching: (() => void) | null = null;
+  let removed = false;
+
+  const toPoints = (features: any[]) =>
+    features.map((f: any) => {
+      let weight = f.properties.intensity || 1.0;
 
-  fetch(url)
-    .then(res => res.json())
-    .then(data => {
-      const points = data.features.map((f: any) => {
-        let weight = f.properties.intensity || 1.0;
-        
-        if (activeFilter !== 'total' && f.properties.factors) {
-          weight = f.properties.factors[activeFilter] || 0.1;
-        }
+      if (activeFilter !== 'total' && f.properties.factors) {
+        weight = f.properties.factors[activeFilter] || 0.1;
+      }
 
-        return {
-          location: new google.maps.LatLng(f.geometry.coordinates[1], f.geometry.coordinates[0]),
-          weight: weight
-        };
-      });
+      // Points aggregated at low zoom stand in for `count` originals
+      weight *= f.properties.count || 1;
 
-      const gradients: Record<string, string[]> = {
-        total: [
-          "rgba(0, 255, 255, 0)",
-          "rgba(0, 255, 255, 1)",
-          "rgba(0, 191, 255, 1)",
-          "rgba(0, 127, 255, 1)",
-          "rgba(0, 63, 255, 1)",
-          "rgba(0, 0, 255, 1)",
-          "rgba(0, 0, 223, 1)",
-          "rgba(0, 0, 191, 1)",
-          "rgba(0, 0, 159, 1)",
-          "rgba(0, 0, 127, 1)",
-          "rgba(63, 0, 91, 1)",
-          "rgba(127, 0, 63, 1)",
-          "rgba(191, 0, 31, 1)",
-          "rgba(255, 0, 0, 1)"
-        ],
-        weather: [
-          "rgba(0, 255, 0, 0)",
-          "rgba(0, 255, 0, 1)",
-          "rgba(255, 255, 0, 1)"
-        ],
-        host: [
-          "rgba(139, 69, 19, 0)",
-          "rgba(139, 69, 19, 1)",
-          "rgba(205, 133, 63, 1)"
-        ],
-        season: [
-          "rgba(255, 165, 0, 0)",
-          "rgba(255, 165, 0, 1)",
-          "rgba(255, 69, 0, 1)"
-        ],
-        habitat: [
-          "rgba(34, 139, 34, 0)",
-          "rgba(34, 139, 34, 1)",
-          "rgba(0, 100, 0, 1)"
-        ],
-        aspect: [
-          "rgba(128, 0, 128, 0)",
-          "rgba(128, 0, 128, 1)", // Purple for North/East slopes
-          "rgba(255, 0, 255, 1)"
-        ]
+      return {
+        location: new google.maps.LatLng(f.geometry.coordinates[1], f.geometry.coordinates[0]),
+        weight: weight
       };
+    });
+
+  const gradients: Record<string, string[]> = {
+    total: [
+      "rgba(0, 255, 255, 0)",
+      "rgba(0, 255, 255, 1)",
+      "rgba(0, 191, 255, 1)",
+      "rgba(0, 127, 255, 1)",
+      "rgba(0, 63, 255, 1)",
+      "rgba(0, 0, 255, 1)",
+      "rgba(0, 0, 223, 1)",
+      "rgba(0, 0, 191, 1)",
+      "rgba(0, 0, 159, 1)",
+      "rgba(0, 0, 127, 1)",
+      "rgba(63, 0, 91, 1)",
+      "rgba(127, 0, 63, 1)",
+      "rgba(191, 0, 31, 1)",
+      "rgba(255, 0, 0, 1)"
+    ],
+    weather: [
+      "rgba(0, 255, 0, 0)",
+      "rgba(0, 255, 0, 1)",
+      "rgba(255, 255, 0, 1)"
+    ],
+    host: [
+      "rgba(139, 69, 19, 0)",
+      "rgba(139, 69, 19, 1)",
+      "rgba(205, 133, 63, 1)"
+    ],
+    season: [
+      "rgba(255, 165, 0, 0)",
+      "rgba(255, 165, 0, 1)",
+      "rgba(255, 69, 0, 1)"
+    ],
+    habitat: [
+      "rgba(34, 139, 34, 0)",
+      "rgba(34, 139, 34, 1)",
+      "rgba(0, 100, 0, 1)"
+    ],
+    aspect: [
+      "rgba(128, 0, 128, 0)",
+      "rgba(128, 0, 128, 1)", // Purple for North/East slopes
+      "rgba(255, 0, 255, 1)"
+    ]
+  };
+
+  const showFeatures = (features: any[]) => {
+    if (removed) return;
+    const points = toPoints(features);
+    if (heatmap) {
+      heatmap.setData(points);
+      return;
+    }
+    heatmap = new google.maps.visualization.HeatmapLayer({
+      data: points,
+      map: map,
+      radius: 40,
+      opacity: 0.8,
+      gradient: gradients[activeFilter] || gradients['total']
+    });
+  };
 
-      heatmap = new google.maps.visualization.HeatmapLayer({
-        data: points,
-        map: map,
-        radius: 40,
-        opacity: 0.8,
-        gradient: gradients[activeFilter] || gradients['total']
-      });
+  // Prefer viewport tiles; fall back to the monolithic layer file when
+  // the layer has not been tiled.
+  loadTileIndex(fileName)
+    .then(index => {
+      if (removed) return;
+      if (index) {
+        stopWatching = watchTiles(map, index, showFeatures);
+        return;
+      }
+      return fetch(`/data/layers/${fileName}.json`)
+        .then(res => res.json())
+        .then(data => showFeatures(data.features));
     })
     .catch(err => console.error("Failed to load layer data", err));
 
   return {
     remove: () => {
+      removed = true;
+      if (stopWatching) stopWatching();
       if (heatmap) heatmap.setMap(null);
     }
   };
@@ -1,22 +1,37 @@
+import { loadTileIndex, watchTiles } from "@/lib/tiles";
+
 export const addPublicLandsLayer = (map: google.maps.Map) => {
   const url = "/data/layers/public-lands.json";
-  
-  map.data.loadGeoJson(url, { idPropertyName: "name" }, (features) => {
-    // Style the layer
-    map.data.setStyle((feature) => {
-      const agency = feature.getProperty("agency");
-      let color = "#228B22"; // Default Forest Green
-      
-      if (agency === "NPS") color = "#4B5320"; // Army Green
-      if (agency === "CAL FIRE") color = "#8B4513"; // Saddle Brown
-      
-      return {
-        fillColor: color,
-        fillOpacity: 0.2,
-        strokeColor: color,
-        strokeWeight: 1,
-        clickable: true
-      };
+  let stopWatching: (() => void) | null = null;
+  let removed = false;
+
+  // Style the layer
+  map.data.setStyle((feature) => {
+    const agency = feature.getProperty("agency");
+    let color = "#228B22"; // Default Forest Green
+    
+    if (agency === "NPS") color = "#4B5320"; // Army Green
+    if (agency === "CAL FIRE") color = "#8B4513"; // Saddle Brown
+    
+    return {
+      fillColor: color,
+      fillOpacity: 0.2,
+      strokeColor: color,
+      strokeWeight: 1,
+      clickable: true
+    };
+  });
+
+  // Polygons repeat across the tiles they overlap; keying features by
+  // name keeps a single copy of each on the map.
+  loadTileIndex("public-lands").then(index => {
+    if (removed) return;
+    if (!index) {
+      map.data.loadGeoJson(url, { idPropertyName: "name" });
+      return;
+    }
+    stopWatching = watchTiles(map, index, (features) => {
+      map.data.addGeoJson({ type: "FeatureCollection", features }, { idPropertyName: "name" });
     });
   });
 
@@ -43,6 +58,8 @@ export const addPublicLandsLayer = (map: google.maps.Map) => {
 
   return {
     remove: () => {
+      removed = true;
+      if (stopWatching) stopWatching();
       map.data.forEach((feature) => {
         map.data.remove(feature);
       });
@@ -0,0 +1,117 @@
+/**
+ * Client side of the pre-tiled layers written by scripts/tile_layers.py.
+ * Each layer has /data/tiles/<layer>/index.json listing its non-empty
+ * z/x/y tiles; only tiles inside the current viewport are fetched. Tiles
+ * live under the version directory the index names, so a refresh never
+ * mixes tiles from two builds.
+ */
+export interface TileIndex {
+  layer: string;
+  minzoom: number;
+  maxzoom: number;
+  aggregate_below: number;
+  bounds: [number, number, number, number] | null;
+  features: number;
+  version?: string;
+  tiles: Record<string, number>;
+}
+
+const TILE_ROOT = "/data/tiles";
+const MAX_MERCATOR_LAT = 85.05112878;
+
+export async function loadTileIndex(layer: string): Promise<TileIndex | null> {
+  try {
+    const res = await fetch(`${TILE_ROOT}/${layer}/index.json`);
+    if (!res.ok) return null;
+    return (await res.json()) as TileIndex;
+  } catch {
+    return null;
+  }
+}
+
+/**
+ * Web-mercator tile containing a point at zoom z.
+ */
+export function lngLatToTile(lng: number, lat: number, z: number): [number, number] {
+  const n = 2 ** z;
+  const clampedLat = Math.max(Math.min(lat, MAX_MERCATOR_LAT), -MAX_MERCATOR_LAT);
+  const latRad = (clampedLat * Math.PI) / 180;
+  const x = ((lng + 180) / 360) * n;
+  const y = ((1 - Math.asinh(Math.tan(latRad)) / Math.PI) / 2) * n;
+  return [
+    Math.min(Math.max(Math.floor(x), 0), n - 1),
+    Math.min(Math.max(Math.floor(y), 0), n - 1),
+  ];
+}
+
+/**
+ * Keys ("z/x/y") of the indexed tiles that cover the map's viewport.
+ * Zooms past the index's maxzoom reuse the maxzoom tiles.
+ */
+export function visibleTileKeys(map: google.maps.Map, index: TileIndex): string[] {
+  const bounds = map.getBounds();
+  const zoom = map.getZoom();
+  if (!bounds || zoom === undefined) return [];
+
+  const z = Math.min(Math.max(Math.floor(zoom), index.minzoom), index.maxzoom);
+  const ne = bounds.getNorthEast();
+  const sw = bounds.getSouthWest();
+  const [x0, y0] = lngLatToTile(sw.lng(), ne.lat(), z);
+  const [x1, y1] = lngLatToTile(ne.lng(), sw.lat(), z);
+
+  const keys: string[] = [];
+  for (let x = x0; x <= x1; x++) {
+    for (let y = y0; y <= y1; y++) {
+      const key = `${z}/${x}/${y}`;
+      if (key in index.tiles) keys.push(key);
+    }
+  }
+  return keys;
+}
+
+/**
+ * Calls onFeatures with the features of every visible tile whenever the
+ * map settles. Tiles are fetched once and cached for the watcher's life.
+ * Returns a function that stops watching.
+ */
+export function watchTiles(
+  map: google.maps.Map,
+  index: TileIndex,
+  onFeatures: (features: any[]) => void
+): () => void {
+  const cache = new Map<string, Promise<any[]>>();
+  let generation = 0;
+
+  const fetchTile = (key: string) => {
+    let tile = cache.get(key);
+    if (!tile) {
+      const dir = index.version ? `${index.layer}/${index.version}` : index.layer;
+      tile = fetch(`${TILE_ROOT}/${dir}/${key}.json`)
+        .then(res => res.json())
+        .then(data => data.features as any[])
+        .catch(err => {
+          cache.delete(key);
+          console.error(`Failed to load tile ${key}`, err);
+          return [];
+        });
+      cache.set(key, tile);
+    }
+    return tile;
+  };
+
+  const refresh = () => {
+    const current = ++generation;
+    Promise.all(visibleTileKeys(map, index).map(fetchTile)).then(tiles => {
+      // Drop results that a newer viewport has already superseded
+      if (current === generation) onFeatures(tiles.flat());
+    });
+  };
+
+  const listener = map.addListener("idle", refresh);
+  refresh();
+
+  return () => {
+    generation++;
+    google.maps.event.removeListener(listener);
+  };
+}
@@ -6,24 +6,57 @@ import BestBetsWidget from "@/components/UI/BestBetsWidget";
 import ActionToolsWidget from "@/components/UI/ActionToolsWidget";
 import HotspotFinder from "@/components/UI/HotspotFinder";
 import guildsDataRaw from "@/data/guilds.json";
-import { Guild } from "@/types";
+import { Guild, HotspotResult } from "@/types";
+import { GUILD_LAYER_FILES } from "@/components/Map/ProbabilityLayer";
 
 const guildsData = guildsDataRaw as Guild[];
 import { Layers, AlertTriangle, Menu, X, ChevronDown, ChevronUp } from "lucide-react";
 import { Button } from "@/components/ui/button";
 import { cn } from "@/lib/utils";
 
+// Base URL of scripts/hotspot_server.py; unset in the static build
+const HOTSPOT_API_URL = import.meta.env.VITE_HOTSPOT_API_URL;
+
 export default function Home() {
   const [selectedGuildId, setSelectedGuildId] = useState<string>(guildsData[0].id);
   const [showUncertainty, setShowUncertainty] = useState(false);
   const [sidebarOpen, setSidebarOpen] = useState(true);
   const [showAllGuilds, setShowAllGuilds] = useState(false);
 
-  const handleFindHotspots = (lat: number, lng: number, radiusMiles: number, publicOnly: boolean) => {
+  const handleFindHotspots = async (lat: number, lng: number, radiusMiles: number, publicOnly: boolean) => {
     console.log(`Searching for hotspots at ${lat}, ${lng} within ${radiusMiles} miles (Public Only: ${publicOnly})`);
-    // In a real implementation, this would trigger a map search
-    // For now, we'll just alert the user
-    alert(`Scanning ${radiusMiles} mile radius around your location... \n(Public Lands Only: ${publicOnly ? 'ON' : 'OFF'})`);
+    if (!HOTSPOT_API_URL) {
+      // No hotspot service configured (static build); just alert the user
+      alert(`Scanning ${radiusMiles} mile radius around your location... \n(Public Lands Only: ${publicOnly ? 'ON' : 'OFF'})`);
+      return;
+    }
+
+    const params = new URLSearchParams({
+      lat: String(lat),
+      lng: String(lng),
+      radius_miles: String(radiusMiles),
+      public_only: publicOnly ? "1" : "0",
+      limit: "5",
+    });
+    const layer = GUILD_LAYER_FILES[selectedGuildId];
+    if (layer) params.set("layer", layer);
+
+    try {
+      const res = await fetch(`${HOTSPOT_API_URL}/hotspots?${params}`);
+      const data: { results: HotspotResult[] } = await res.json();
+      if (data.results.length === 0) {
+        alert(`No hotspots found within ${radiusMiles} miles.`);
+        return;
+      }
+      const lines = data.results.map((r, i) =>
+        `${i + 1}. ${r.location ?? "Unnamed"}: ${r.distance_miles} mi, intensity ${r.intensity}` +
+        (r.public_land ? ` (${r.public_land})` : "")
+      );
+      alert(`Top hotspots within ${radiusMiles} miles:\n${lines.join("\n")}`);
+    } catch (err) {
+      console.error("Hotspot query failed", err);
+      alert("Hotspot search is unavailable right now.");
+    }
   };
 
   return (
@@ -31,3 +31,13 @@ export interface WeatherData {
     message: string;
   }>;
 }
+
+export interface HotspotResult {
+  layer: string;
+  lat: number;
+  lng: number;
+  intensity: number;
+  distance_miles: number;
+  location: string | null;
+  public_land: string | null;
+}
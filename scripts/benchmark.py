@@ -0,0 +1,296 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+import generate_probability as gp
+import geocoder
+import host_density
+import weather_cache
+import weather_client
+import weather_series
+from fetch_env_data import AOI_BOUNDS
+from host_index import HostIndex
+
+# Benchmark suite for the probability pipeline. Builds synthetic inputs at
+# each size (observation CSV shaped like data/gather_guild_data.csv, host
+# FeatureCollections shaped like client/public/data/hosts/*.json), serves
+# weather from an in-process fake provider, times each pipeline stage and
+# compares the results against a stored baseline.
+#
+#   python benchmark.py                          # default sizes vs baseline
+#   python benchmark.py --sizes 1000 10000       # quick sweep (10^6 takes ~30 min a repeat)
+#   python benchmark.py --update-baseline        # record a new baseline
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(SCRIPT_DIR, "data", "benchmark_baseline.json")
+RESULTS_PATH = os.path.join(SCRIPT_DIR, "data", "benchmark_results.json")
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+LOCATIONS_PER_ROW = 20
+HOST_BONUS_CALLS = 10_000
+MAX_SCALAR_SIZE = 100_000 # generate_heatmap is skipped above this
+BENCHMARK_DAYS = 30 # main_dates runs --dates over this many days
+REGRESSION_TOLERANCE = 0.25 # Flag stages more than 25% slower than baseline
+MIN_REGRESSION_SECONDS = 0.005 # ...and slower by at least this much
+
+class FakeWeatherClient:
+    """Deterministic, in-process stand-in for WeatherClient."""
+
+    def __init__(self):
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.request_count = 0
+        self.retry_count = 0
+        self.latencies = []
+
+    def fetch_batch(self, coords, start_date, end_date):
+        self.request_count += 1
+        results = []
+        for lat, lng in coords:
+            rng = random.Random(weather_cache.cell_key(lat, lng))
+            results.append({
+                "precip_14d_in": rng.uniform(0, 6),
+                "soil_temp_c": rng.uniform(6, 18),
+                "soil_moisture_m3": rng.uniform(0.1, 0.45)
+            })
+        return results
+
+    def fetch_daily_batch(self, coords, start_date, end_date):
+        self.request_count += 1
+        days = [date.fromisoformat(start_date) + timedelta(days=d)
+                for d in range((date.fromisoformat(end_date) - date.fromisoformat(start_date)).days + 1)]
+        results = []
+        for lat, lng in coords:
+            rngs = [random.Random(f"{weather_cache.cell_key(lat, lng)},{day}") for day in days]
+            results.append({
+                "time": [day.isoformat() for day in days],
+                "precipitation_sum": [rng.uniform(0, 11) for rng in rngs],
+                "soil_temperature_0_to_7cm_mean": [rng.uniform(6, 18) for rng in rngs],
+                "soil_moisture_0_to_7cm_mean": [rng.uniform(0.1, 0.45) for rng in rngs]
+            })
+        return results
+
+    def fetch_one(self, lat, lng, start_date, end_date):
+        return self.fetch_batch([(lat, lng)], start_date, end_date)[0]
+
+    def close(self):
+        pass
+
+def write_observations(path, size, seed=0):
+    """Observation CSV with size location references spread over every guild."""
+    rng = random.Random(seed)
+    places = [name for name, _, _ in geocoder.load_gazetteer()]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Subject", "Recent Locations", "Current Status", "Habitat Notes", "Elevation Range", "Error"])
+        written = 0
+        row = 0
+        while written < size:
+            count = min(LOCATIONS_PER_ROW, size - written)
+            locations = [f"Site {written + i} near {rng.choice(places)}" for i in range(count)]
+            writer.writerow([gp.GUILDS[row % len(gp.GUILDS)], str(locations), "Synthetic", "", "", ""])
+            written += count
+            row += 1
+
+def write_host_trees(host_dir, size, seed=0):
+    """size host points split evenly over the host species files."""
+    rng = np.random.default_rng(seed)
+    names = sorted({name for hosts in gp.GUILD_HOSTS.values() for name in hosts["primary"] + hosts["secondary"]})
+    os.makedirs(host_dir, exist_ok=True)
+    for k, name in enumerate(names):
+        count = size // len(names) + (1 if k < size % len(names) else 0)
+        lngs = rng.uniform(AOI_BOUNDS["west"], AOI_BOUNDS["east"], count)
+        lats = rng.uniform(AOI_BOUNDS["south"], AOI_BOUNDS["north"], count)
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [float(lng), float(lat)]},
+                "properties": {"id": k * 10_000_000 + i, "observed_on": "2024-11-15", "quality": "research"}
+            }
+            for i, (lng, lat) in enumerate(zip(lngs, lats))
+        ]
+        with open(os.path.join(host_dir, f"{name}.json"), "w") as f:
+            json.dump({"type": "FeatureCollection", "features": features}, f)
+
+def reset_process_caches():
+    """Forgets in-memory caches so every stage starts like a fresh run."""
+    gp.WEATHER_CACHE.clear()
+    geocoder._shared_geocoder = None
+
+def timed(func, repeat):
+    """Best wall time of repeat calls (stdout suppressed) and the last result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        reset_process_caches()
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run_size(size, work_dir, repeat):
+    paths = {
+        "observations": os.path.join(work_dir, "observations.csv"),
+        "hosts": os.path.join(work_dir, "hosts"),
+        "store": os.path.join(work_dir, "host_store"),
+        "layers": os.path.join(work_dir, "layers"),
+        "manifest": os.path.join(work_dir, "build_manifest.json")
+    }
+    write_observations(paths["observations"], size)
+    write_host_trees(paths["hosts"], size)
+
+    # Weather for every synthetic location is on disk before timing starts,
+    # as it is on a steady-state daily run
+    observations = gp.load_observations(paths["observations"])
+    locations, _ = gp.build_location_table(observations)
+    gp.prefetch_weather([lat for _, (lat, _) in locations], [lng for _, (_, lng) in locations])
+
+    stages = {}
+    # Observations stream lazily, so a full pass is what loading costs
+    stages["load_observations"], _ = timed(lambda: list(gp.load_observations(paths["observations"])), repeat)
+    stages["load_host_trees_cold"], _ = timed(
+        lambda: (shutil.rmtree(paths["store"], ignore_errors=True), gp.load_host_trees(paths["hosts"], paths["store"])),
+        repeat
+    )
+    stages["load_host_trees"], host_data = timed(lambda: gp.load_host_trees(paths["hosts"], paths["store"]), repeat)
+    stages["host_index"], host_index = timed(lambda: HostIndex(host_data), repeat)
+
+    rng = random.Random(1)
+    queries = [(rng.uniform(AOI_BOUNDS["south"], AOI_BOUNDS["north"]), rng.uniform(AOI_BOUNDS["west"], AOI_BOUNDS["east"]),
+                rng.choice(gp.GUILDS)) for _ in range(HOST_BONUS_CALLS)]
+    stages["calculate_host_bonus"], _ = timed(
+        lambda: [gp.calculate_host_bonus(lat, lng, guild, host_data, host_index) for lat, lng, guild in queries],
+        repeat
+    )
+
+    if size <= MAX_SCALAR_SIZE:
+        stages["generate_heatmap"], _ = timed(
+            lambda: gp.generate_heatmap(gp.GUILDS[0], observations, host_data, host_index), repeat
+        )
+    stages["generate_all_heatmaps"], _ = timed(
+        lambda: gp.generate_all_heatmaps(observations, host_data, host_index), repeat
+    )
+    stages["main"], _ = timed(lambda: gp.main([
+        "--force",
+        "--observations", paths["observations"],
+        "--host-dir", paths["hosts"],
+        "--host-store-dir", paths["store"],
+        "--output-dir", paths["layers"],
+        "--manifest", paths["manifest"]
+    ]), repeat)
+    # Host scoring from cached density grids instead of host list searches
+    stages["main_host_density"], _ = timed(lambda: gp.main([
+        "--force",
+        "--host-density",
+        "--observations", paths["observations"],
+        "--host-dir", paths["hosts"],
+        "--host-store-dir", paths["store"],
+        "--output-dir", paths["layers"],
+        "--manifest", paths["manifest"]
+    ]), repeat)
+    # One pass for BENCHMARK_DAYS days, to compare against BENCHMARK_DAYS x main
+    stages["main_dates"], _ = timed(lambda: gp.main([
+        "--dates", f"-{BENCHMARK_DAYS}",
+        "--observations", paths["observations"],
+        "--host-dir", paths["hosts"],
+        "--host-store-dir", paths["store"],
+        "--output-dir", paths["layers"]
+    ]), repeat)
+    return stages
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Prints current vs baseline per stage; returns the regressed (size, stage) pairs."""
+    regressions = []
+    for size, stages in results.items():
+        for stage, seconds in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            if base is None:
+                print(f"  {size:>9} {stage:<24} {seconds:9.4f}s  (no baseline)")
+                continue
+            ratio = seconds / base if base else float("inf")
+            flag = ""
+            if seconds > base * (1 + tolerance) and seconds - base > MIN_REGRESSION_SECONDS:
+                flag = "  REGRESSION"
+                regressions.append((size, stage))
+            print(f"  {size:>9} {stage:<24} {seconds:9.4f}s  baseline {base:9.4f}s  x{ratio:.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the probability pipeline on synthetic NorCal workloads.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="observation locations and host points per run")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the fastest is kept")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on any regression")
+    args = parser.parse_args()
+
+    work_root = tempfile.mkdtemp(prefix="mushroom-bench-")
+    weather_client._shared_client = FakeWeatherClient()
+    weather_cache._shared_cache = weather_cache.WeatherCache(os.path.join(work_root, "weather_cache.sqlite"))
+    weather_series._shared_store = weather_series.WeatherSeriesStore(os.path.join(work_root, "weather_series.sqlite"))
+    host_density.CACHE_DIR = os.path.join(work_root, "host_density_cache")
+
+    results = {}
+    try:
+        for size in args.sizes:
+            print(f"Benchmarking {size} points...")
+            work_dir = os.path.join(work_root, str(size))
+            os.makedirs(work_dir)
+            results[str(size)] = run_size(size, work_dir, args.repeat)
+    finally:
+        weather_cache._shared_cache.close()
+        weather_series._shared_store.close()
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "host_bonus_calls": HOST_BONUS_CALLS,
+        "results": results
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    baseline = {}
+    if not args.update_baseline:
+        try:
+            with open(args.baseline, "r") as f:
+                baseline = json.load(f)["results"]
+        except FileNotFoundError:
+            print(f"No baseline at {args.baseline}; run with --update-baseline to record one.")
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Updated baseline {args.baseline}")
+        return
+    print(f"{len(regressions)} regressions")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
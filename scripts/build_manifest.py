@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+
+# Build manifest for incremental layer rebuilds. For each layer it records
+# fingerprints of every input that can change the output: the observation
+# rows for the guild, its host tree files, its config, the month and the
+# cached weather entries it was scored with. A layer is rebuilt only when
+# one of those no longer matches.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_PATH = os.path.join(SCRIPT_DIR, "data", "build_manifest.json")
+MANIFEST_VERSION = 1
+
+def digest(value):
+    """Stable sha256 of any JSON-serializable value."""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+def file_fingerprint(path, previous=None):
+    """
+    Size, mtime and sha256 of a file. The hash from previous is reused when
+    size and mtime are unchanged, so unchanged files are never re-read.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+        return previous
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha.hexdigest()}
+
+def same_file(a, b):
+    if a is None or b is None:
+        return a is b
+    return a["sha256"] == b["sha256"]
+
+class BuildManifest:
+    def __init__(self, path=MANIFEST_PATH, layers=None):
+        self.path = path
+        self.layers = layers or {}
+
+    @classmethod
+    def load(cls, path=MANIFEST_PATH):
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return cls(path)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data.get("layers", {}))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "layers": self.layers}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def host_fingerprints(self, layer, host_paths):
+        previous = self.layers.get(layer, {}).get("hosts", {})
+        return {
+            name: file_fingerprint(path, previous.get(name))
+            for name, path in sorted(host_paths.items())
+        }
+
+    def stale_reasons(self, layer, inputs, output_path, weather_check):
+        """
+        Reasons the layer must be rebuilt; empty when it is up to date.
+        weather_check(cells, window) returns (digest, missing) for the
+        cached weather of those cells, as WeatherCache.digest_cells does.
+        """
+        entry = self.layers.get(layer)
+        if entry is None:
+            return ["no previous build"]
+        reasons = []
+        if not os.path.exists(output_path):
+            reasons.append("output missing")
+        if entry["rows"] != inputs["rows"]:
+            reasons.append("observation rows changed")
+        if entry["config"] != inputs["config"]:
+            reasons.append("guild config changed")
+        if entry["month"] != inputs["month"]:
+            reasons.append(f"month changed ({entry['month']} -> {inputs['month']})")
+        changed_hosts = [
+            name for name in sorted(set(entry["hosts"]) | set(inputs["hosts"]))
+            if not same_file(entry["hosts"].get(name), inputs["hosts"].get(name))
+        ]
+        if changed_hosts:
+            reasons.append(f"host files changed ({', '.join(changed_hosts)})")
+        weather = entry["weather"]
+        if weather["window"] != inputs["window"]:
+            reasons.append("weather window moved")
+        elif weather["missing"]:
+            reasons.append(f"weather was unavailable for {weather['missing']} cells")
+        else:
+            weather_digest, missing = weather_check(weather["cells"], weather["window"])
+            if missing or weather_digest != weather["digest"]:
+                reasons.append("weather cache entries changed or expired")
+        return reasons
+
+    def record(self, layer, inputs, cells, weather_digest, missing):
+        self.layers[layer] = {
+            "rows": inputs["rows"],
+            "config": inputs["config"],
+            "month": inputs["month"],
+            "hosts": inputs["hosts"],
+            "weather": {
+                "window": inputs["window"],
+                "cells": sorted(cells),
+                "digest": weather_digest,
+                "missing": missing
+            }
+        }
@@ -2,6 +2,8 @@ import json
 import random
 from datetime import datetime, timedelta
 
+from publish import publish
+
 # Configuration
 AOI_BOUNDS = {
     "north": 42.0,
@@ -10,6 +12,38 @@ AOI_BOUNDS = {
     "east": -119.0
 }
 
+# Simulated 14-day regional summaries, also the fallback for weather
+# lattice nodes the API has no data for
+REGIONAL_WEATHER = {
+    "north_coast": {
+        "precip_total_14d_in": 4.5,
+        "soil_moisture_pct": 85,
+        "temp_anomaly_c": 0.5
+    },
+    "bay_area": {
+        "precip_total_14d_in": 2.1,
+        "soil_moisture_pct": 65,
+        "temp_anomaly_c": 1.2
+    },
+    "sierra_foothills": {
+        "precip_total_14d_in": 3.8,
+        "soil_moisture_pct": 72,
+        "temp_anomaly_c": -0.5
+    }
+}
+
+# Rough (lat, lng) center of each region; a point belongs to the nearest
+REGION_CENTERS = {
+    "north_coast": (40.5, -123.8),
+    "bay_area": (37.8, -122.3),
+    "sierra_foothills": (38.8, -120.8)
+}
+
+def region_for(lat, lng):
+    """Name of the REGIONAL_WEATHER region closest to a point."""
+    return min(REGION_CENTERS, key=lambda name: (REGION_CENTERS[name][0] - lat) ** 2 +
+               (REGION_CENTERS[name][1] - lng) ** 2)
+
 def fetch_weather_data():
     """
     Simulates fetching PRISM/Open-Meteo data for the AOI.
@@ -21,23 +55,7 @@ def fetch_weather_data():
     today = datetime.now()
     weather_summary = {
         "generated_at": today.isoformat(),
-        "regions": {
-            "north_coast": {
-                "precip_total_14d_in": 4.5,
-                "soil_moisture_pct": 85,
-                "temp_anomaly_c": 0.5
-            },
-            "bay_area": {
-                "precip_total_14d_in": 2.1,
-                "soil_moisture_pct": 65,
-                "temp_anomaly_c": 1.2
-            },
-            "sierra_foothills": {
-                "precip_total_14d_in": 3.8,
-                "soil_moisture_pct": 72,
-                "temp_anomaly_c": -0.5
-            }
-        }
+        "regions": REGIONAL_WEATHER
     }
     
     return weather_summary
@@ -49,8 +67,7 @@ def main():
     import os
     script_dir = os.path.dirname(os.path.abspath(__file__))
     output_path = os.path.join(script_dir, "../client/public/data/weather_live.json")
-    with open(output_path, "w") as f:
-        json.dump(data, f, indent=2)
+    publish(output_path, json.dumps(data, indent=2))
     
     print(f"Weather data saved to {output_path}")
 
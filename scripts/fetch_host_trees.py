@@ -1,7 +1,29 @@
-import requests
+import argparse
 import json
 import os
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import publish
+from weather_client import ApiClient
+
+# Harvests every research-grade host tree observation in the AOI. Each
+# taxon is walked in ascending id order with an id_above cursor, taxa run
+# concurrently under one shared rate budget, and pages are appended to a
+# GeoJSON Sequence (one Feature per line) as they arrive. A checkpoint
+# next to each sequence file records the cursor, so an interrupted run
+# resumes where it stopped and a later run only pulls newer observations.
+# Finished sequences are compiled into the FeatureCollections in
+# client/public/data/hosts that the generator reads.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(SCRIPT_DIR, "../client/public/data/hosts")
+HARVEST_DIR = os.path.join(SCRIPT_DIR, "data", "host_harvest")
+INAT_URL = os.environ.get("INATURALIST_API_URL", "https://api.inaturalist.org/v1/observations")
 
 # Configuration
 HOST_TREES = {
@@ -22,71 +44,265 @@ BOUNDS = {
     "swlng": -124.5
 }
 
-def fetch_observations(taxon_id, limit=200):
-    """Fetches research-grade observations for a specific taxon in NorCal."""
-    url = "https://api.inaturalist.org/v1/observations"
-    params = {
-        "taxon_id": taxon_id,
-        "quality_grade": "research",
-        "geo": "true",
-        "nelat": BOUNDS["nelat"],
-        "nelng": BOUNDS["nelng"],
-        "swlat": BOUNDS["swlat"],
-        "swlng": BOUNDS["swlng"],
-        "per_page": limit,
-        "order": "desc",
-        "order_by": "created_at"
+PER_PAGE = 200 # API maximum
+DEFAULT_WORKERS = 3
+DEFAULT_RATE_PER_SEC = 1.0 # iNaturalist asks for roughly 60 requests/minute
+DEFAULT_TIMEOUT = 30
+DEFAULT_MAX_RETRIES = 5
+PROGRESS_EVERY_PAGES = 25
+
+def observation_feature(o):
+    """GeoJSON Feature for an observation, or None if it has no location."""
+    if not o.get("geojson"):
+        return None
+    return {
+        "type": "Feature",
+        "geometry": o["geojson"],
+        "properties": {
+            "id": o["id"],
+            "observed_on": o["observed_on"],
+            "quality": o["quality_grade"]
+        }
     }
-    
+
+def read_checkpoint(path):
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        return data["results"]
-    except Exception as e:
-        print(f"Error fetching taxon {taxon_id}: {e}")
-        return []
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def write_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def compile_feature_collection(sequence_path, output_path):
+    """Streams a GeoJSON Sequence into a FeatureCollection file; returns the feature count."""
+    count = 0
+    tmp_path = output_path + ".tmp"
+    with open(sequence_path, "r") as src, open(tmp_path, "w") as out:
+        out.write('{"type": "FeatureCollection", "features": [')
+        for line in src:
+            line = line.strip()
+            if not line:
+                continue
+            out.write(", " if count else "")
+            out.write(line)
+            count += 1
+        out.write("]}")
+    os.replace(tmp_path, output_path)
+    return count
+
+class HostTreeHarvester(ApiClient):
+    def __init__(self, base_url=INAT_URL, harvest_dir=HARVEST_DIR, output_dir=OUTPUT_DIR, per_page=PER_PAGE,
+                 max_workers=DEFAULT_WORKERS, rate_per_sec=DEFAULT_RATE_PER_SEC, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, rate_limiter=None):
+        super().__init__(base_url, max_workers, rate_per_sec, timeout, max_retries, rate_limiter)
+        self.harvest_dir = harvest_dir
+        self.output_dir = output_dir
+        self.per_page = per_page
+
+    def fetch_page(self, taxon_id, id_above):
+        """One page of research-grade observations with id > id_above, in id order."""
+        params = {
+            "taxon_id": taxon_id,
+            "quality_grade": "research",
+            "geo": "true",
+            "nelat": BOUNDS["nelat"],
+            "nelng": BOUNDS["nelng"],
+            "swlat": BOUNDS["swlat"],
+            "swlng": BOUNDS["swlng"],
+            "per_page": self.per_page,
+            "order": "asc",
+            "order_by": "id",
+            "id_above": id_above
+        }
+        return self._get(params)["results"]
+
+    def paths(self, name):
+        return (os.path.join(self.harvest_dir, f"{name}.geojsonl"),
+                os.path.join(self.harvest_dir, f"{name}.checkpoint.json"))
+
+    def harvest_taxon(self, name, taxon_id, restart=False):
+        """
+        Appends every observation past the checkpointed cursor to the
+        taxon's sequence file, then compiles it. Returns a summary dict.
+        """
+        sequence_path, checkpoint_path = self.paths(name)
+        checkpoint = None if restart else read_checkpoint(checkpoint_path)
+        if checkpoint is None or checkpoint["taxon_id"] != taxon_id:
+            checkpoint = {"taxon_id": taxon_id, "id_above": 0, "features": 0, "offset": 0, "complete": False}
+        resumed_from = checkpoint["id_above"]
+        was_complete = checkpoint["complete"]
+        features_before = checkpoint["features"]
+        pages = 0
+
+        mode = "r+b" if os.path.exists(sequence_path) and checkpoint["offset"] else "w+b"
+        with open(sequence_path, mode) as f:
+            # Anything past the checkpointed offset was written by a run that
+            # died before it could checkpoint; it is fetched again below
+            f.truncate(checkpoint["offset"])
+            f.seek(checkpoint["offset"])
+            while True:
+                try:
+                    results = self.fetch_page(taxon_id, checkpoint["id_above"])
+                except Exception as e:
+                    print(f"Error fetching {name} (ID: {taxon_id}) after id {checkpoint['id_above']}: {e}")
+                    return {"name": name, "complete": False, "features": checkpoint["features"], "pages": pages}
+                pages += 1
+                if not results:
+                    break
+
+                for o in results:
+                    feature = observation_feature(o)
+                    if feature:
+                        f.write((json.dumps(feature) + "\n").encode())
+                        checkpoint["features"] += 1
+                f.flush()
+                os.fsync(f.fileno())
+                checkpoint["offset"] = f.tell()
+                checkpoint["id_above"] = max(o["id"] for o in results)
+                checkpoint["complete"] = False
+                write_checkpoint(checkpoint_path, checkpoint)
+
+                if pages % PROGRESS_EVERY_PAGES == 0:
+                    print(f"  {name}: {checkpoint['features']} features so far (id_above={checkpoint['id_above']})")
+                if len(results) < self.per_page:
+                    break
+
+        output_path = os.path.join(self.output_dir, f"{name}.json")
+        if was_complete and checkpoint["features"] == features_before and os.path.exists(output_path):
+            # Nothing new since the last compile, as on most refresh cycles
+            print(f"{name} is up to date ({checkpoint['features']} points)")
+            return {"name": name, "complete": True, "features": checkpoint["features"], "pages": pages}
+        count = compile_feature_collection(sequence_path, output_path)
+        publish.record([output_path], os.path.dirname(os.path.abspath(self.output_dir)))
+        # Complete only once compiled, so a run that dies in between compiles next time
+        checkpoint["complete"] = True
+        write_checkpoint(checkpoint_path, checkpoint)
+        if resumed_from:
+            print(f"Saved {count} points for {name} (resumed after id {resumed_from}, {pages} pages)")
+        else:
+            print(f"Saved {count} points for {name} ({pages} pages)")
+        return {"name": name, "complete": True, "features": count, "pages": pages}
+
+    def harvest(self, taxa=HOST_TREES, restart=False):
+        """Harvests all taxa concurrently; returns {name: summary}."""
+        os.makedirs(self.harvest_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {name: pool.submit(self.harvest_taxon, name, taxon_id, restart)
+                       for name, taxon_id in taxa.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+# Local stand-in for the observations endpoint, for offline testing
+
+class StubINatHandler(BaseHTTPRequestHandler):
+    observations_per_taxon = 1000
+    latency = 0.02
+    error_rate = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+
+        query = parse_qs(urlparse(self.path).query)
+        taxon_id = int(query["taxon_id"][0])
+        id_above = int(query.get("id_above", ["0"])[0])
+        per_page = min(int(query.get("per_page", ["30"])[0]), PER_PAGE)
+
+        # Taxon t owns ids t*10^6 + 3i, so ids are sparse and ascending
+        base = taxon_id * 1_000_000
+        first = max(0, (id_above - base) // 3 + 1) if id_above >= base else 0
+        results = []
+        for i in range(first, min(first + per_page, self.observations_per_taxon)):
+            obs_id = base + 3 * i
+            rng = random.Random(obs_id)
+            lat = rng.uniform(BOUNDS["swlat"], BOUNDS["nelat"])
+            lng = rng.uniform(BOUNDS["swlng"], BOUNDS["nelng"])
+            results.append({
+                "id": obs_id,
+                # Obscured observations come back without coordinates
+                "geojson": None if i % 50 == 49 else {"type": "Point", "coordinates": [lng, lat]},
+                "observed_on": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "quality_grade": "research"
+            })
+        body = json.dumps({
+            "total_results": self.observations_per_taxon,
+            "page": 1,
+            "per_page": per_page,
+            "results": results
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(port=0, observations_per_taxon=1000, latency=0.02, error_rate=0.0):
+    """Starts the stub observations API on a daemon thread; returns (server, url)."""
+    handler = type("Handler", (StubINatHandler,), {
+        "observations_per_taxon": observations_per_taxon,
+        "latency": latency,
+        "error_rate": error_rate
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/observations"
 
 def main():
+    parser = argparse.ArgumentParser(description="Harvest host tree observations from iNaturalist.")
+    parser.add_argument("--base-url", default=INAT_URL)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="taxa fetched concurrently")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_PER_SEC,
+                        help="requests per second shared by all workers (0 = unlimited)")
+    parser.add_argument("--per-page", type=int, default=PER_PAGE)
+    parser.add_argument("--harvest-dir", default=HARVEST_DIR)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--restart", action="store_true", help="ignore checkpoints and harvest from the first id")
+    parser.add_argument("--stub", action="store_true", help="harvest from a local stub server instead of iNaturalist")
+    parser.add_argument("--serve", action="store_true", help="only run the stub server until interrupted")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--stub-observations", type=int, default=1000, help="observations per taxon on the stub")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub responses that are 429s")
+    args = parser.parse_args()
+
+    base_url = args.base_url
+    if args.stub or args.serve:
+        server, base_url = start_stub_server(args.port, args.stub_observations, error_rate=args.error_rate)
+        if args.serve:
+            print(f"Stub observations API listening on {base_url}")
+            try:
+                threading.Event().wait() # The server thread does the serving
+            except KeyboardInterrupt:
+                pass
+            server.shutdown()
+            server.server_close()
+            return
+
     print("Fetching host tree data from iNaturalist...")
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    output_dir = os.path.join(script_dir, "../client/public/data/hosts")
-    os.makedirs(output_dir, exist_ok=True)
-    
-    summary = {}
-    
-    for name, taxon_id in HOST_TREES.items():
-        print(f"Fetching {name} (ID: {taxon_id})...")
-        obs = fetch_observations(taxon_id, limit=300) # Limit to 300 for performance
-        
-        features = []
-        for o in obs:
-            if o.get("geojson"):
-                features.append({
-                    "type": "Feature",
-                    "geometry": o["geojson"],
-                    "properties": {
-                        "id": o["id"],
-                        "observed_on": o["observed_on"],
-                        "quality": o["quality_grade"]
-                    }
-                })
-        
-        geojson = {
-            "type": "FeatureCollection",
-            "features": features
-        }
-        
-        output_path = os.path.join(output_dir, f"{name}.json")
-        with open(output_path, "w") as f:
-            json.dump(geojson, f)
-            
-        summary[name] = len(features)
-        print(f"Saved {len(features)} points for {name}")
-        time.sleep(1.0) # Respect API rate limits
-        
-    print("Host tree data fetch complete.")
-    print(summary)
+    harvester = HostTreeHarvester(base_url, args.harvest_dir, args.output_dir, args.per_page,
+                                  args.workers, args.rate)
+    started = time.perf_counter()
+    summary = harvester.harvest(restart=args.restart)
+    harvester.close()
+
+    incomplete = [name for name, s in summary.items() if not s["complete"]]
+    print(f"Host tree data fetch {'incomplete' if incomplete else 'complete'} in "
+          f"{time.perf_counter() - started:.1f}s ({harvester.request_count} requests, "
+          f"{harvester.retry_count} retries).")
+    print({name: s["features"] for name, s in summary.items()})
+    if incomplete:
+        print(f"Rerun to resume: {', '.join(incomplete)}")
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,7 @@
-import requests
 import json
-import os
-from datetime import datetime, timedelta
+
+from weather_cache import weather_window, get_weather_cache
+from weather_client import get_weather_client
 
 def fetch_hyperlocal_weather(lat, lng):
     """
@@ -10,42 +10,21 @@ def fetch_hyperlocal_weather(lat, lng):
     - Precipitation Sum (Last 14 days)
     - Soil Moisture (0-7cm)
     - Soil Temperature (0-7cm)
+    Results are shared with generate_probability.py via the on-disk weather cache.
     """
     
-    end_date = datetime.now().strftime("%Y-%m-%d")
-    start_date = (datetime.now() - timedelta(days=14)).strftime("%Y-%m-%d")
-    
-    url = "https://archive-api.open-meteo.com/v1/archive"
-    params = {
-        "latitude": lat,
-        "longitude": lng,
-        "start_date": start_date,
-        "end_date": end_date,
-        "daily": ["precipitation_sum", "soil_temperature_0_to_7cm_mean", "soil_moisture_0_to_7cm_mean"],
-        "timezone": "America/Los_Angeles"
-    }
+    start_date, end_date = weather_window()
+    cache = get_weather_cache()
+    cached = cache.get(lat, lng, start_date, end_date)
+    if cached is not None:
+        return cached
     
-    try:
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if "daily" not in data:
-            return None
-            
-        # Calculate Aggregates
-        precip_total = sum(data["daily"]["precipitation_sum"]) / 25.4 # Convert mm to inches
-        avg_soil_temp = sum(data["daily"]["soil_temperature_0_to_7cm_mean"]) / len(data["daily"]["soil_temperature_0_to_7cm_mean"])
-        avg_soil_moisture = sum(data["daily"]["soil_moisture_0_to_7cm_mean"]) / len(data["daily"]["soil_moisture_0_to_7cm_mean"])
-        
-        return {
-            "precip_14d_in": precip_total,
-            "soil_temp_c": avg_soil_temp,
-            "soil_moisture_m3": avg_soil_moisture # Volumetric water content
-        }
-        
-    except Exception as e:
-        print(f"Error fetching weather for {lat}, {lng}: {e}")
+    result = get_weather_client().fetch_one(lat, lng, start_date, end_date)
+    if result is None:
+        print(f"Error fetching weather for {lat}, {lng}")
         return None
+    cache.set(lat, lng, start_date, end_date, result)
+    return result
 
 def main():
     # Test Point: Salt Point State Park
@@ -1,8 +1,3 @@
-import requests
-import json
-import os
-import time
-
 # NLCD 2021 Legend
 # 41: Deciduous Forest
 # 42: Evergreen Forest
@@ -15,23 +10,15 @@ VALID_HABITAT_CODES = [41, 42, 43, 52, 90, 95]
 
 def get_land_cover(lat, lng):
     """
-    Queries the USGS National Map / MRLC API for land cover at a point.
-    Note: Direct point query API for NLCD is often rate-limited or requires WMS parsing.
-    For this prototype, we will simulate the check or use a public WMS if accessible.
-    
-    Since we cannot easily query WMS per point in this environment without GDAL/Rasterio,
-    we will implement a 'Mock' function that would be replaced by a real WMS query in production.
-    
-    However, to make this 'Real' for the user, we will try to use the National Map Point Query if available.
-    If not, we will default to 'True' (Habitat) but log the logic.
+    NLCD land cover class at a point, read from the local class raster
+    (see habitat_mask.py) instead of a per-point WMS query.
+    Defaults to Evergreen Forest (42) when no raster has been downloaded.
     """
-    
-    # Real implementation would be:
-    # url = f"https://www.mrlc.gov/geoserver/NLCD_Land_Cover/wms?service=WMS&version=1.1.1&request=GetFeatureInfo&layers=nlcd_2021_land_cover&query_layers=nlcd_2021_land_cover&x=50&y=50&width=101&height=101&srs=EPSG:4326&bbox={lng-0.001},{lat-0.001},{lng+0.001},{lat+0.001}&info_format=application/json"
-    
-    # For now, we assume points in State Parks/Forests are valid.
-    # We will return a mock code based on simple logic (e.g. if it's a known forest spot).
-    return 42 # Default to Evergreen Forest for now to prove the pipeline works
+    from habitat_mask import get_land_cover_raster # habitat_mask imports VALID_HABITAT_CODES from here
+    land_cover = get_land_cover_raster()
+    if land_cover is None:
+        return 42
+    return int(land_cover.class_codes([lat], [lng])[0])
 
 def main():
     print("Testing Land Cover API...")
@@ -1,10 +1,37 @@
+import argparse
 import json
 import os
+import re
+import time
+
+import numpy as np
 import requests
 
+import publish
+from fetch_env_data import AOI_BOUNDS
+
 # In a real production environment, we would fetch the full CPAD GeoJSON.
 # However, CPAD is >100MB, so we will simulate it with a simplified GeoJSON 
 # of major NorCal public lands for this demo.
+#
+# With a downloaded CPAD export, --source streams it instead: features are
+# decoded one at a time from a fixed-size read buffer, polygons outside
+# AOI_BOUNDS are dropped, the rest are simplified (Douglas-Peucker) and
+# written straight to the output, so memory stays bounded by the largest
+# single feature rather than the file.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_PATH = os.path.join(SCRIPT_DIR, "../client/public/data/layers/public-lands.json")
+SIMPLIFY_TOLERANCE_DEG = 0.0005 # ~50 m
+COORD_DECIMALS = 5 # ~1 m
+READ_CHUNK_BYTES = 1 << 20
+
+# Output property -> source fields tried in order (ours, then CPAD's)
+PROPERTY_FIELDS = {
+    "name": ["name", "UNIT_NAME", "SITE_NAME"],
+    "agency": ["agency", "AGNCY_NAME", "MNG_AGENCY"],
+    "access": ["access", "ACCESS_TYP"]
+}
 
 PUBLIC_LANDS = {
     "type": "FeatureCollection",
@@ -68,17 +95,166 @@ PUBLIC_LANDS = {
     ]
 }
 
+FEATURES_KEY = re.compile(r'"features"\s*:\s*\[')
+
+def iter_features(path, chunk_bytes=READ_CHUNK_BYTES):
+    """Yields the features of a GeoJSON FeatureCollection one at a time."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = None
+        eof = False
+        while pos is None:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                raise ValueError(f"{path} has no features array")
+            buffer += chunk
+            match = FEATURES_KEY.search(buffer)
+            if match:
+                pos = match.end()
+            else:
+                buffer = buffer[-64:] # Keep enough to match a key split across chunks
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                if pos >= len(buffer):
+                    raise ValueError("need more data")
+                feature, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if eof:
+                    raise ValueError(f"{path} ends inside the features array")
+                # Read at least as much again as is pending, so a feature
+                # much bigger than a chunk isn't re-decoded from its start every chunk
+                chunk = f.read(max(chunk_bytes, len(buffer) - pos))
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield feature
+            pos = end
+
+def simplify_ring(ring, tolerance):
+    """Douglas-Peucker simplification of a closed ring; None if it collapses below a triangle."""
+    points = np.asarray(ring, dtype=float)[:, :2]
+    if tolerance > 0 and len(points) > 4:
+        keep = np.zeros(len(points), dtype=bool)
+        keep[[0, -1]] = True
+        stack = [(0, len(points) - 1)]
+        while stack:
+            first, last = stack.pop()
+            if last - first < 2:
+                continue
+            a, b = points[first], points[last]
+            inner = points[first + 1:last]
+            dx, dy = b - a
+            length = np.hypot(dx, dy)
+            if length == 0: # The closing segment of a ring: distance to the shared endpoint
+                distances = np.hypot(*(inner - a).T)
+            else:
+                distances = np.abs(dx * (inner[:, 1] - a[1]) - dy * (inner[:, 0] - a[0])) / length
+            farthest = int(np.argmax(distances))
+            if distances[farthest] > tolerance:
+                split = first + 1 + farthest
+                keep[split] = True
+                stack += [(first, split), (split, last)]
+        points = points[keep]
+    points = np.round(points, COORD_DECIMALS)
+    points = points[np.r_[True, np.any(points[1:] != points[:-1], axis=1)]] # Repeats left by rounding
+    if len(points) < 4:
+        return None
+    return points.tolist()
+
+def simplify_geometry(geometry, tolerance):
+    """Simplified Polygon/MultiPolygon; holes that collapse are dropped, polygons whose outer ring does are too."""
+    if not geometry or geometry.get("type") not in ("Polygon", "MultiPolygon"):
+        return None
+    polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+    simplified = []
+    for rings in polygons:
+        outer = simplify_ring(rings[0], tolerance) if rings else None
+        if outer is None:
+            continue
+        holes = [hole for hole in (simplify_ring(ring, tolerance) for ring in rings[1:]) if hole is not None]
+        simplified.append([outer] + holes)
+    if not simplified:
+        return None
+    if len(simplified) == 1:
+        return {"type": "Polygon", "coordinates": simplified[0]}
+    return {"type": "MultiPolygon", "coordinates": simplified}
+
+def geometry_bbox(geometry):
+    coords = np.array([c[:2] for polygon in (geometry["coordinates"] if geometry["type"] == "MultiPolygon"
+                                           else [geometry["coordinates"]]) for c in polygon[0]], dtype=float)
+    return coords[:, 0].min(), coords[:, 1].min(), coords[:, 0].max(), coords[:, 1].max()
+
+def pick_properties(properties):
+    picked = {}
+    for name, fields in PROPERTY_FIELDS.items():
+        picked[name] = next((properties[field] for field in fields if properties.get(field) not in (None, "")), None)
+    return picked
+
+def ingest(source_path, output_path=OUTPUT_PATH, tolerance=SIMPLIFY_TOLERANCE_DEG, bounds=AOI_BOUNDS):
+    """Streams source_path into a simplified public lands layer; returns counts."""
+    stats = {"read": 0, "written": 0, "outside": 0, "degenerate": 0, "vertices_in": 0, "vertices_out": 0}
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w") as out:
+        out.write('{"type": "FeatureCollection", "features": [')
+        for feature in iter_features(source_path):
+            stats["read"] += 1
+            geometry = feature.get("geometry")
+            if not geometry or geometry.get("type") not in ("Polygon", "MultiPolygon"):
+                stats["degenerate"] += 1
+                continue
+            west, south, east, north = geometry_bbox(geometry)
+            if west > bounds["east"] or east < bounds["west"] or south > bounds["north"] or north < bounds["south"]:
+                stats["outside"] += 1
+                continue
+            simplified = simplify_geometry(geometry, tolerance)
+            if simplified is None:
+                stats["degenerate"] += 1
+                continue
+            stats["vertices_in"] += count_vertices(geometry)
+            stats["vertices_out"] += count_vertices(simplified)
+            out.write(("\n" if stats["written"] == 0 else ",\n") + json.dumps({
+                "type": "Feature",
+                "properties": pick_properties(feature.get("properties") or {}),
+                "geometry": simplified
+            }))
+            stats["written"] += 1
+        out.write("\n]}\n")
+    os.replace(tmp_path, output_path)
+    publish.record([output_path], os.path.dirname(os.path.dirname(os.path.abspath(output_path))))
+    return stats
+
+def count_vertices(geometry):
+    polygons = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [geometry["coordinates"]]
+    return sum(len(ring) for rings in polygons for ring in rings)
+
 def main():
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    output_dir = os.path.join(script_dir, "../client/public/data/layers")
-    os.makedirs(output_dir, exist_ok=True)
+    parser = argparse.ArgumentParser(description="Write the public lands layer, simulated or from a CPAD export.")
+    parser.add_argument("--source", help="CPAD (or any) public lands GeoJSON FeatureCollection to stream in")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--tolerance", type=float, default=SIMPLIFY_TOLERANCE_DEG,
+                        help="simplification tolerance in degrees (0 keeps every vertex)")
+    args = parser.parse_args()
     
-    output_path = os.path.join(output_dir, "public-lands.json")
+    if args.source:
+        started = time.perf_counter()
+        stats = ingest(args.source, args.output, args.tolerance)
+        print(f"Ingested {stats['written']} of {stats['read']} features from {args.source} in "
+              f"{time.perf_counter() - started:.1f}s ({stats['outside']} outside the AOI, {stats['degenerate']} "
+              f"without usable polygons); vertices {stats['vertices_in']} -> {stats['vertices_out']}")
+        print(f"Wrote {args.output}")
+        return
     
-    with open(output_path, "w") as f:
-        json.dump(PUBLIC_LANDS, f, indent=2)
+    publish.publish(args.output, json.dumps(PUBLIC_LANDS, indent=2),
+                    os.path.dirname(os.path.dirname(os.path.abspath(args.output))))
         
-    print(f"Generated simulated Public Lands layer at {output_path}")
+    print(f"Generated simulated Public Lands layer at {args.output}")
 
 if __name__ == "__main__":
     main()
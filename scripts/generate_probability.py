@@ -1,11 +1,38 @@
 import json
-import csv
-import random
 import os
-import math
-import requests
-from datetime import datetime, timedelta
-from math import radians, cos, sin, asin, sqrt, atan2, degrees
+import argparse
+import itertools
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from datetime import date, datetime, timedelta
+
+from geo_utils import haversine
+from host_index import HostIndex
+import vector_scoring
+import raster_output
+import build_manifest
+import run_report
+import host_store
+import terrain
+import habitat_mask
+import host_density
+import observation_ingest
+import publish
+import layer_encoding
+from land_index import PublicLandIndex, PUBLIC_LANDS_PATH
+from geocoder import get_geocoder
+from fetch_env_data import AOI_BOUNDS
+from weather_client import get_weather_client
+from weather_series import get_weather_series, cell_coords, parse_day
+from weather_lattice import WeatherLattice, FIELDS as LATTICE_FIELDS, LATTICE_SPACING_DEG, METHODS as LATTICE_METHODS
+from weather_cache import cell_key, weather_window, get_weather_cache, DEFAULT_TTL_HOURS
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OBSERVATIONS_PATH = os.path.join(SCRIPT_DIR, "data", "gather_guild_data.csv")
+HOST_DIR = os.path.join(SCRIPT_DIR, "../client/public/data/hosts")
+LAYERS_DIR = os.path.join(SCRIPT_DIR, "../client/public/data/layers")
 
 # Configuration
 GUILDS = [
@@ -47,94 +74,142 @@ SEASONALITY = {
     "Burn Morel": [4, 5, 6]
 }
 
-# Simple Geocoding Lookup
-LOCATION_LOOKUP = {
-    "Salt Point State Park": (38.5667, -123.3333),
-    "Sonoma County": (38.5780, -122.9888),
-    "Castle Crags": (41.1533, -122.3278),
-    "Bay Area": (37.7749, -122.4194),
-    "Orick": (41.2876, -124.0612),
-    "Fort Bragg": (39.4457, -123.8053),
-    "Inverness": (38.1010, -122.8569),
-    "Jenner": (38.4499, -123.1156),
-    "Jackson Demonstration State Forest": (39.3667, -123.6500),
-    "The Sea Ranch": (38.7082, -123.4544),
-    "Gary Giacomini Open Space Preserve": (37.9950, -122.6300),
-    "Lagunitas-Forest Knolls": (38.0130, -122.6930),
-    "Shasta-Trinity National Forest": (40.8333, -122.5000),
-    "Mill Valley": (37.9060, -122.5450),
-    "Baltimore Canyon Open Space Preserve": (37.9300, -122.5500),
-    "Big Sur": (36.2704, -121.8081),
-    "Willits": (39.4096, -123.3556),
-    "Mendocino": (39.3077, -123.7995),
-    "Arcata": (40.8665, -124.0828),
-    "Point Reyes": (38.0691, -122.8069),
-    "Headwaters Trail, Eureka": (40.7500, -124.1500),
-    "Chester": (40.3063, -121.2311),
-    "Santa Cruz": (36.9741, -122.0308),
-    "Oakland Hills": (37.8044, -122.2712),
-    "Marin Watershed": (37.9600, -122.5800)
-}
+# Host trees within this distance (km) count toward the host bonus
+HOST_RADIUS_KM = 5.0
+
+# Factor order in each feature's "factors" dict
+FACTOR_NAMES = ["weather", "host", "season", "aspect", "habitat"]
+
+# Gridded output: lattice spacing in degrees (~1.1 km at 0.01)
+RASTER_RESOLUTION_DEG = 0.01
+
+# Raster cells share weather from a coarser grid; Open-Meteo's archive
+# reanalysis is ~0.25 deg, so finer weather spacing adds requests, not signal
+RASTER_WEATHER_STEP_DEG = 0.25
 
-# Cache for weather data to avoid API spam
+# In-process cache for weather data to avoid API spam; backed by the
+# on-disk weather_cache so reruns skip the network too
 WEATHER_CACHE = {}
 
-def haversine(lon1, lat1, lon2, lat2):
-    R = 6371
-    dlon = radians(lon2 - lon1)
-    dlat = radians(lat2 - lat1)
-    a = sin(dlat / 2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2)**2
-    c = 2 * asin(sqrt(a))
-    return R * c
+# Set by --weather-lattice: point weather is then interpolated from a
+# coarse WeatherLattice instead of being looked up per point
+WEATHER_LATTICE = None
+
+# Set by --dem: aspect then comes from the DEM's aspect classes instead of
+# being simulated
+TERRAIN = None
+
+# Set by --land-cover: points on known non-habitat land cover are masked
+LAND_COVER = None
+
+# Set by --host-density: host scoring then looks points up in precomputed
+# HostDensity grids, built whenever host trees are loaded, instead of
+# searching the host lists
+HOST_DENSITY = None
+
+# Set from --public-lands (PUBLIC_LANDS_PATH on first use otherwise): every
+# feature is tagged with the public land it falls in, so publicOnly
+# filtering doesn't need a lookup per request
+PUBLIC_LANDS = None
+
+# Set by --coord-precision, --binary-layers and --precompress: how layers
+# are encoded (see layer_encoding.LayerWriter); None writes plain GeoJSON
+LAYER_ENCODING = None
+
+# Days of daily weather kept before the scoring window, for lag queries
+SERIES_LAG_DAYS = max(t["optimal_lag"] for t in GUILD_THRESHOLDS.values())
+
+def series_weather(coords, start_date, end_date):
+    """
+    Window aggregates for [(lat, lng)] from the daily series store, which
+    first fetches whatever days its cells are missing. History is kept back
+    to the longest optimal_lag so lagged windows never need the network.
+    """
+    store = get_weather_series()
+    cells = [cell_key(lat, lng) for lat, lng in coords]
+    history_start = datetime.strptime(start_date, "%Y-%m-%d") - timedelta(days=SERIES_LAG_DAYS)
+    store.update(cells, history_start.date(), end_date, get_weather_client())
+    return store.load(cells, start_date, end_date).aggregates()
 
 def fetch_hyperlocal_weather(lat, lng):
     """Fetches real historical weather for specific coords."""
-    key = f"{lat:.3f},{lng:.3f}"
+    key = cell_key(lat, lng)
     if key in WEATHER_CACHE:
         return WEATHER_CACHE[key]
+    if WEATHER_LATTICE is not None:
+        prefetch_weather([lat], [lng])
+        return WEATHER_CACHE[key]
         
-    end_date = datetime.now().strftime("%Y-%m-%d")
-    start_date = (datetime.now() - timedelta(days=14)).strftime("%Y-%m-%d")
-    
-    url = "https://archive-api.open-meteo.com/v1/archive"
-    params = {
-        "latitude": lat,
-        "longitude": lng,
-        "start_date": start_date,
-        "end_date": end_date,
-        "daily": ["precipitation_sum", "soil_temperature_0_to_7cm_mean", "soil_moisture_0_to_7cm_mean"],
-        "timezone": "America/Los_Angeles"
-    }
-    
-    try:
-        response = requests.get(url, params=params)
-        data = response.json()
+    start_date, end_date = weather_window()
+    disk_cache = get_weather_cache()
+    result = disk_cache.get(lat, lng, start_date, end_date)
+    if result is None:
+        result = series_weather([(lat, lng)], start_date, end_date)[0]
+        if result is not None:
+            disk_cache.set(lat, lng, start_date, end_date, result)
+    WEATHER_CACHE[key] = result
+    return result
+
+def fetch_cell_weather(coords):
+    """
+    Aggregates for [(lat, lng)] from the on-disk cache, with every miss
+    filled in one batched pass through the series store.
+    """
+    start_date, end_date = weather_window()
+    disk_cache = get_weather_cache()
+    results = [disk_cache.get(lat, lng, start_date, end_date) for lat, lng in coords]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if not missing:
+        return results
         
-        if "daily" not in data:
-            return None
-            
-        precip_total = sum(data["daily"]["precipitation_sum"]) / 25.4 # mm to inches
-        avg_soil_temp = sum(data["daily"]["soil_temperature_0_to_7cm_mean"]) / len(data["daily"]["soil_temperature_0_to_7cm_mean"])
-        avg_soil_moisture = sum(data["daily"]["soil_moisture_0_to_7cm_mean"]) / len(data["daily"]["soil_moisture_0_to_7cm_mean"])
+    fetched = series_weather([coords[i] for i in missing], start_date, end_date)
+    for i, result in zip(missing, fetched):
+        results[i] = result
+    disk_cache.set_many([(*coords[i], results[i]) for i in missing if results[i] is not None], start_date, end_date)
+    return results
+
+def prefetch_weather(lats, lngs):
+    """
+    Warms WEATHER_CACHE for every distinct cell in one batched, concurrent
+    pass, so the per-point lookups that follow never block on the network.
+    With a weather lattice, each cell is interpolated at its key's
+    coordinates, so every engine sees the same value for a cell.
+    """
+    missing = {}
+    for lat, lng in zip(lats, lngs):
+        key = cell_key(lat, lng)
+        if key not in WEATHER_CACHE and key not in missing:
+            missing[key] = (float(lat), float(lng))
+    if not missing:
+        return
         
-        result = {
-            "precip_14d_in": precip_total,
-            "soil_temp_c": avg_soil_temp,
-            "soil_moisture_m3": avg_soil_moisture
-        }
+    if WEATHER_LATTICE is not None:
+        cell_lats, cell_lngs = np.array([cell_coords(key) for key in missing]).T
+        weather = WEATHER_LATTICE.interpolate(cell_lats, cell_lngs)
+        for i, key in enumerate(missing):
+            WEATHER_CACHE[key] = {field: float(weather[k, i]) for k, field in enumerate(LATTICE_FIELDS)}
+        return
+    for key, result in zip(missing, fetch_cell_weather(list(missing.values()))):
         WEATHER_CACHE[key] = result
-        return result
-        
-    except Exception as e:
-        print(f"Error fetching weather: {e}")
-        return None
+
+def weather_lattice_cells(cells):
+    """Lattice node cells the weather of the given point cells comes from."""
+    if not cells:
+        return set()
+    lats, lngs = np.array([cell_coords(key) for key in cells]).T
+    return WEATHER_LATTICE.node_cells(lats, lngs)
 
 def get_aspect_score(lat, lng):
     """
-    Simulates Aspect (Slope Direction) calculation.
-    In production, this would query an Elevation API grid.
-    For now, we simulate North/East facing slopes being wetter.
+    Aspect (Slope Direction) weight. Uses the DEM aspect classes when a DEM
+    is loaded and covers the point; otherwise simulates North/East facing
+    slopes being wetter.
     """
+    if TERRAIN is not None:
+        weight = TERRAIN.aspect_weights([lat], [lng])[0]
+        if not np.isnan(weight):
+            return float(weight)
+        
     # Randomly assign an aspect for simulation purposes
     # 0=N, 90=E, 180=S, 270=W
     # We want to favor N (0) and E (90)
@@ -181,31 +256,44 @@ def calculate_weather_score(lat, lng, guild_name):
             
     return rain_score * moisture_score * shock_score
 
-def calculate_host_bonus(lat, lng, guild_name, host_data):
+def host_within_range(lat, lng, host_type, host_data, host_index=None):
+    """True if any host_type observation is within HOST_RADIUS_KM."""
+    if host_index is not None:
+        return host_index.any_within(host_type, lng, lat, HOST_RADIUS_KM)
+    for host_coord in host_data.get(host_type, []):
+        dist = haversine(lng, lat, host_coord[0], host_coord[1])
+        if dist < HOST_RADIUS_KM: return True
+    return False
+
+def calculate_host_bonus(lat, lng, guild_name, host_data, host_index=None):
+    """
+    Host tree proximity bonus. Pass a HostIndex built from host_data to
+    avoid scanning every host observation; without one this falls back
+    to the brute-force scan.
+    """
     clean_name = guild_name.split(" (")[0]
     if clean_name not in GUILD_HOSTS:
         return 1.0
         
     hosts = GUILD_HOSTS[clean_name]
+    if HOST_DENSITY is not None:
+        host_near = HOST_DENSITY.sample(hosts["primary"] + hosts["secondary"], [lat], [lng])
+        return float(calculate_host_bonus_array(guild_name, host_near, 1)[0])
     
     # Check Primary Hosts (1.5x)
     for host_type in hosts["primary"]:
-        if host_type in host_data:
-            for host_coord in host_data[host_type]:
-                dist = haversine(lng, lat, host_coord[0], host_coord[1])
-                if dist < 5.0: return 1.5
+        if host_within_range(lat, lng, host_type, host_data, host_index):
+            return 1.5
                 
     # Check Secondary Hosts (1.2x)
     for host_type in hosts["secondary"]:
-        if host_type in host_data:
-            for host_coord in host_data[host_type]:
-                dist = haversine(lng, lat, host_coord[0], host_coord[1])
-                if dist < 5.0: return 1.2
+        if host_within_range(lat, lng, host_type, host_data, host_index):
+            return 1.2
     
     return 0.8
 
-def calculate_seasonality_score(guild_name):
-    current_month = datetime.now().month
+def calculate_seasonality_score(guild_name, month=None):
+    current_month = month or datetime.now().month
     clean_name = guild_name.split(" (")[0]
     if clean_name in SEASONALITY:
         if current_month in SEASONALITY[clean_name]:
@@ -215,116 +303,889 @@ def calculate_seasonality_score(guild_name):
     return 1.0
 
 def check_land_cover_habitat(lat, lng):
-    return 1.0
+    if LAND_COVER is None:
+        return 1.0
+    return float(LAND_COVER.habitat_weights([lat], [lng])[0])
 
-def load_observations():
-    observations = []
-    try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        data_path = os.path.join(script_dir, "data", "gather_guild_data.csv")
-        with open(data_path, "r") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                observations.append(row)
-    except FileNotFoundError:
-        print(f"Warning: {data_path} not found.")
-    return observations
-
-def load_host_trees():
+def habitat_weights(lats, lngs):
+    """Vectorized check_land_cover_habitat."""
+    if LAND_COVER is None:
+        return np.ones(len(lats))
+    return LAND_COVER.habitat_weights(lats, lngs)
+
+def get_public_lands():
+    global PUBLIC_LANDS
+    if PUBLIC_LANDS is None:
+        PUBLIC_LANDS = PublicLandIndex.load(PUBLIC_LANDS_PATH)
+    return PUBLIC_LANDS
+
+def public_land_names(lats, lngs):
+    """Name of the public land containing each point, or None."""
+    return np.array(get_public_lands().find_names(lngs, lats), dtype=object).reshape(-1)
+
+def load_observations(data_path=OBSERVATIONS_PATH):
+    """
+    Guild observation rows as compact records, streamed from the CSV on
+    each pass; see observation_ingest.py.
+    """
+    return observation_ingest.ObservationSource(data_path, GUILDS)
+
+def load_host_trees(host_dir=HOST_DIR, store_dir=host_store.STORE_DIR):
+    """
+    {host name: (n, 2) array of [lng, lat]}, memory-mapped from the host
+    stores, which are rebuilt from the GeoJSON files when those change.
+    """
     hosts = {}
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    host_dir = os.path.join(script_dir, "../client/public/data/hosts")
-    for filename in os.listdir(host_dir):
+    for filename in sorted(os.listdir(host_dir)):
         if filename.endswith(".json"):
             name = filename.replace(".json", "")
-            with open(os.path.join(host_dir, filename), "r") as f:
-                data = json.load(f)
-                coords = []
-                for feature in data["features"]:
-                    coords.append(feature["geometry"]["coordinates"])
-                hosts[name] = coords
+            hosts[name] = host_store.load_store(os.path.join(host_dir, filename), store_dir)["coords"]
+    if HOST_DENSITY is not None:
+        HOST_DENSITY.build(hosts)
     return hosts
 
 def geocode_location(loc_str):
-    clean_loc = loc_str.replace("'", "").replace('"', "").strip()
-    for key, coords in LOCATION_LOOKUP.items():
-        if key in clean_loc:
-            lat = coords[0] + random.uniform(-0.03, 0.03)
-            lng = coords[1] + random.uniform(-0.03, 0.03)
-            return lat, lng
-    return None
-
-def generate_heatmap(guild_name, observations, host_data):
-    features = []
+    """Gazetteer lookup with fixed per-location jitter; see geocoder.py."""
+    return get_geocoder().geocode(loc_str)
+
+def iter_guild_locations(guild_name, observations):
+    """Yields (location name, (lat, lng)) for every geocodable guild location."""
+    for obs in observations:
+        if guild_name in obs.subject:
+            for name in obs.locations:
+                coords = geocode_location(name)
+                if coords:
+                    yield name, coords
+
+def make_feature(lat, lng, intensity, factors, location, public_land=None):
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [lng, lat]
+        },
+        "properties": {
+            "intensity": float(f"{intensity:.2f}"),
+            "factors": {name: float(f"{value:.2f}") for name, value in factors.items()},
+            "location": location,
+            "public_land": public_land
+        }
+    }
+
+def generate_heatmap(guild_name, observations, host_data, host_index=None):
+    return {
+        "type": "FeatureCollection",
+        "features": list(iter_heatmap_features(guild_name, observations, host_data, host_index))
+    }
+
+def iter_heatmap_features(guild_name, observations, host_data, host_index=None):
+    """Yields generate_heatmap's features one location at a time."""
+    if host_index is None:
+        host_index = HostIndex(host_data)
     season_score = calculate_seasonality_score(guild_name)
     
+    for location, (lat, lng) in iter_guild_locations(guild_name, observations):
+        # 1. Hyperlocal Weather
+        weather_w = calculate_weather_score(lat, lng, guild_name)
+        
+        # 2. Host Tree Bonus
+        host_w = calculate_host_bonus(lat, lng, guild_name, host_data, host_index)
+        
+        # 3. Aspect (Slope Direction) - NEW!
+        aspect_w = get_aspect_score(lat, lng)
+        
+        # 4. Habitat Mask
+        habitat_mask = check_land_cover_habitat(lat, lng)
+        
+        final_intensity = weather_w * host_w * season_score * aspect_w * habitat_mask
+        final_intensity = min(max(final_intensity, 0.1), 5.0)
+        
+        factors = {
+            "weather": weather_w,
+            "host": host_w,
+            "season": season_score,
+            "aspect": aspect_w,
+            "habitat": habitat_mask
+        }
+        public_land = get_public_lands().find_name(lng, lat)
+        yield make_feature(lat, lng, final_intensity, factors, location, public_land)
+
+def fetch_weather_arrays(lats, lngs):
+    """
+    Looks up hyperlocal weather for every point. Returns precip, soil
+    moisture and soil temp arrays with NaN where no data is available.
+    """
+    prefetch_weather(lats, lngs)
+    weather = np.full((3, len(lats)), np.nan)
+    for i, (lat, lng) in enumerate(zip(lats, lngs)):
+        result = fetch_hyperlocal_weather(float(lat), float(lng))
+        if result:
+            weather[0, i] = result["precip_14d_in"]
+            weather[1, i] = result["soil_moisture_m3"]
+            weather[2, i] = result["soil_temp_c"]
+    return weather
+
+def aspect_weights(lats, lngs):
+    """Vectorized get_aspect_score."""
+    weights = vector_scoring.aspect_scores(lats, lngs)
+    if TERRAIN is not None:
+        dem_weights = TERRAIN.aspect_weights(lats, lngs)
+        weights = np.where(np.isnan(dem_weights), weights, dem_weights)
+    return weights
+
+def guild_host_types(guilds):
+    types = set()
+    for guild in guilds:
+        hosts = GUILD_HOSTS.get(guild.split(" (")[0], {"primary": [], "secondary": []})
+        types.update(hosts["primary"] + hosts["secondary"])
+    return sorted(types)
+
+def compute_location_factors(lats, lngs, host_index, weather=None, guilds=GUILDS, host_near=None,
+                             public_land=True):
+    """
+    Guild-independent factors for arrays of coordinates: weather aggregates,
+    per-species host presence, aspect, habitat and public land. Computed once and then
+    weighted per guild by score_guild.
+    weather is an optional (precip, moisture, soil_temp) array stack as
+    returned by fetch_weather_arrays; it is fetched when omitted. host_near
+    takes precomputed presence masks, in which case host_index is unused;
+    so is it with HOST_DENSITY, which supplies them (or densities) itself.
+    public_land=False skips public land tagging, for output that has no
+    per-point properties.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    if weather is None:
+        weather = fetch_weather_arrays(lats, lngs)
+    if host_near is None and HOST_DENSITY is not None:
+        host_near = HOST_DENSITY.sample(guild_host_types(guilds), lats, lngs)
+    elif host_near is None:
+        host_near = {
+            host_type: host_index.within_mask(host_type, lngs, lats, HOST_RADIUS_KM)
+            for host_type in guild_host_types(guilds)
+        }
+    factors = {
+        "weather": np.asarray(weather, dtype=float),
+        "host_near": host_near,
+        "aspect": aspect_weights(lats, lngs),
+        "habitat": habitat_weights(lats, lngs)
+    }
+    if public_land:
+        factors["public_land"] = public_land_names(lats, lngs)
+    return factors
+
+def calculate_host_bonus_array(guild_name, host_near, size):
+    """
+    Vectorized calculate_host_bonus from per-species presence masks, or
+    from host densities with the graded --host-density curve.
+    """
+    clean_name = guild_name.split(" (")[0]
+    if clean_name not in GUILD_HOSTS:
+        return np.ones(size)
+        
+    hosts = GUILD_HOSTS[clean_name]
+    if HOST_DENSITY is not None and HOST_DENSITY.curve == "graded":
+        primary = sum((host_near[host_type] for host_type in hosts["primary"]), np.zeros(size))
+        secondary = sum((host_near[host_type] for host_type in hosts["secondary"]), np.zeros(size))
+        return host_density.graded_bonus(primary, secondary)
+    primary = np.zeros(size, dtype=bool)
+    secondary = np.zeros(size, dtype=bool)
+    for host_type in hosts["primary"]:
+        primary |= host_near[host_type]
+    for host_type in hosts["secondary"]:
+        secondary |= host_near[host_type]
+    return np.where(primary, 1.5, np.where(secondary, 1.2, 0.8))
+
+def score_guild(guild_name, location_factors, idx=None, months=None):
+    """
+    Applies one guild's weighting to shared location factors, optionally
+    restricted to the location indices in idx. Returns a dict of factor
+    arrays plus the clamped "intensity", and "public_land" names when the
+    factors have them.
+    With a (3, dates, locations) weather stack from fetch_date_weather,
+    months gives each date's month; the date dependent factors then have a
+    leading date axis.
+    """
+    def take(values):
+        return values if idx is None else values[..., idx]
+    
+    weather = take(location_factors["weather"])
+    size = weather.shape[-1]
+    clean_name = guild_name.split(" (")[0]
+    thresholds = GUILD_THRESHOLDS.get(clean_name, {"min_rain": 1.0, "optimal_lag": 14, "needs_shock": False})
+    host_near = {host_type: take(mask) for host_type, mask in location_factors["host_near"].items()}
+    
+    weather_w = vector_scoring.weather_scores(weather[0], weather[1], weather[2], thresholds)
+    host_w = calculate_host_bonus_array(guild_name, host_near, size)
+    if months is None:
+        season_w = np.full(size, calculate_seasonality_score(guild_name))
+    else:
+        seasons = np.array([calculate_seasonality_score(guild_name, month) for month in months])
+        season_w = np.broadcast_to(seasons[:, None], weather.shape[1:])
+    aspect_w = take(location_factors["aspect"])
+    habitat_w = take(location_factors["habitat"])
+    
+    intensity = vector_scoring.clamp_intensity(weather_w * host_w * season_w * aspect_w * habitat_w)
+    scores = {
+        "intensity": intensity,
+        "weather": weather_w,
+        "host": host_w,
+        "season": season_w,
+        "aspect": aspect_w,
+        "habitat": habitat_w
+    }
+    if "public_land" in location_factors:
+        scores["public_land"] = take(location_factors["public_land"])
+    return scores
+
+def score_points(guild_name, lats, lngs, host_index, weather=None):
+    """Batch scoring engine: evaluates every factor for arrays of coordinates."""
+    location_factors = compute_location_factors(lats, lngs, host_index, weather, guilds=[guild_name])
+    return score_guild(guild_name, location_factors)
+
+def build_location_table(observations, guilds=GUILDS):
+    """
+    Reads the observations once and geocodes each distinct location once.
+    Returns (locations, guild_refs): locations is a list of
+    (name, (lat, lng)), and guild_refs maps each guild to the indices of
+    the locations it references, in observation order.
+    """
+    index_by_name = {}
+    locations = []
+    guild_refs = {guild: [] for guild in guilds}
     for obs in observations:
-        if guild_name in obs["Subject"]:
-            loc_list_str = obs["Recent Locations"]
-            locations = loc_list_str.strip("[]").split(",")
-            
-            for loc in locations:
-                coords = geocode_location(loc)
+        row_guilds = [guild for guild in guilds if guild in obs.subject]
+        if not row_guilds:
+            continue
+        for name in obs.locations:
+            if name not in index_by_name:
+                coords = geocode_location(name)
+                index_by_name[name] = len(locations) if coords else None
                 if coords:
-                    lat, lng = coords
-                    
-                    # 1. Hyperlocal Weather
-                    weather_w = calculate_weather_score(lat, lng, guild_name)
-                    
-                    # 2. Host Tree Bonus
-                    host_w = calculate_host_bonus(lat, lng, guild_name, host_data)
-                    
-                    # 3. Aspect (Slope Direction) - NEW!
-                    aspect_w = get_aspect_score(lat, lng)
-                    
-                    # 4. Habitat Mask
-                    habitat_mask = check_land_cover_habitat(lat, lng)
-                    
-                    final_intensity = weather_w * host_w * season_score * aspect_w * habitat_mask
-                    final_intensity = min(max(final_intensity, 0.1), 5.0)
-                    
-                    feature = {
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Point",
-                            "coordinates": [lng, lat]
-                        },
-                        "properties": {
-                            "intensity": float(f"{final_intensity:.2f}"),
-                            "factors": {
-                                "weather": float(f"{weather_w:.2f}"),
-                                "host": float(f"{host_w:.2f}"),
-                                "season": float(f"{season_score:.2f}"),
-                                "aspect": float(f"{aspect_w:.2f}"),
-                                "habitat": float(f"{habitat_mask:.2f}")
-                            },
-                            "location": loc.strip().replace("'", "").replace('"', "")
-                        }
-                    }
-                    features.append(feature)
-                
+                    locations.append((name, coords))
+            idx = index_by_name[name]
+            if idx is not None:
+                for guild in row_guilds:
+                    guild_refs[guild].append(idx)
+    return locations, guild_refs
+
+def generate_all_heatmaps(observations, host_data, host_index=None, guilds=GUILDS):
+    """
+    Single-pass engine: builds the location table, computes the shared
+    factors once per distinct location and then scores each guild against
+    its own subset. Returns {guild: FeatureCollection}.
+    """
+    layers = stream_all_heatmaps(observations, host_data, host_index, guilds)
+    return {guild: {"type": "FeatureCollection", "features": list(layers[guild])} for guild in guilds}
+
+def stream_all_heatmaps(observations, host_data, host_index=None, guilds=GUILDS):
+    """
+    generate_all_heatmaps without the FeatureCollections: every guild is
+    scored up front, and {guild: feature iterator} builds each feature only
+    as it is consumed, so a layer can be written as it goes.
+    """
+    if host_index is None:
+        host_index = HostIndex(host_data)
+    locations, guild_refs = build_location_table(observations, guilds)
+    lats = [coords[0] for _, coords in locations]
+    lngs = [coords[1] for _, coords in locations]
+    location_factors = compute_location_factors(lats, lngs, host_index, guilds=guilds)
+    
+    layers = {}
+    for guild in guilds:
+        idx = np.asarray(guild_refs[guild], dtype=np.intp)
+        layers[guild] = iter_guild_features(guild, [locations[i] for i in idx], score_guild(guild, location_factors, idx))
+    return layers
+
+def guild_features(guild_name, locations, scores):
+    """Features for (name, (lat, lng)) locations scored by score_guild, in order."""
+    return list(iter_guild_features(guild_name, locations, scores))
+
+def iter_guild_features(guild_name, locations, scores):
+    """Yields guild_features one at a time."""
+    # Plain lists: formatting Python floats is much cheaper than NumPy scalars
+    columns = {name: np.asarray(values).tolist() for name, values in scores.items()}
+    for i, (location, (lat, lng)) in enumerate(locations):
+        factors = {name: columns[name][i] for name in FACTOR_NAMES}
+        yield make_feature(lat, lng, columns["intensity"][i], factors, location, columns["public_land"][i])
+
+def fetch_weather_grid(lats, lngs, step=RASTER_WEATHER_STEP_DEG):
+    """
+    Weather arrays for many points, fetched once per step-sized cell and
+    shared by every point that falls inside it.
+    """
+    cell_lats = (np.floor(np.asarray(lats) / step) + 0.5) * step
+    cell_lngs = (np.floor(np.asarray(lngs) / step) + 0.5) * step
+    cells, inverse = np.unique(np.stack([cell_lats, cell_lngs], axis=1), axis=0, return_inverse=True)
+    weather = fetch_weather_arrays(cells[:, 0], cells[:, 1])
+    return weather[:, inverse.ravel()]
+
+def generate_rasters(host_index, guilds=GUILDS, bounds=AOI_BOUNDS, resolution=RASTER_RESOLUTION_DEG):
+    """
+    Evaluates the guild model over a regular lattice covering bounds.
+    Returns {guild: 2D intensity array}, north row first, NaN where the
+    habitat mask rules a cell out.
+    """
+    lats, lngs = raster_output.lattice(bounds, resolution)
+    flat_lats = lats.ravel()
+    flat_lngs = lngs.ravel()
+    weather = fetch_weather_grid(flat_lats, flat_lngs)
+    location_factors = compute_location_factors(flat_lats, flat_lngs, host_index, weather, guilds,
+                                                public_land=False)
+    masked = location_factors["habitat"] == 0
     return {
-        "type": "FeatureCollection",
-        "features": features
+        guild: np.where(masked, np.nan, score_guild(guild, location_factors)["intensity"]).reshape(lats.shape)
+        for guild in guilds
+    }
+
+# --dates: layers for a range of days in one pass. Location factors are
+# computed once, every day's weather window comes out of one load of the
+# daily series store, and each guild is scored as a (dates, locations)
+# array. A day's layers match what a run on that day would write.
+
+DATES_DIR = "dates" # Under the output dir, one subdirectory per day
+DATES_INDEX = "index.json"
+
+def parse_dates(spec, today=None):
+    """
+    Days for --dates: "YYYY-MM-DD", "START:END" (inclusive), "+N" for
+    today and the N - 1 days after it, or "-N" for the N days ending today.
+    """
+    today = today or date.today()
+    if spec[:1] in "+-":
+        count = int(spec[1:])
+        if count < 1:
+            raise ValueError(f"--dates {spec}: need at least one day")
+        first = today if spec[0] == "+" else today - timedelta(days=count - 1)
+        return [first + timedelta(days=i) for i in range(count)]
+    first, _, last = spec.partition(":")
+    first = parse_day(first)
+    last = parse_day(last) if last else first
+    if last < first:
+        raise ValueError(f"--dates {spec}: end is before start")
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+def date_windows(dates):
+    """weather_window for each day."""
+    return [weather_window(datetime.combine(day, datetime.min.time())) for day in dates]
+
+def series_date_weather(coords, dates):
+    """
+    (3, dates, coords) precip, moisture and soil temp stack: each day's
+    weather window at [(lat, lng)], as series_weather gives it (to the last
+    float bit or so, since windows are differences of running sums over a
+    longer table), from one update and one load of the series store. The
+    archive has nothing past today, so forecast days' windows only count
+    the days already stored.
+    """
+    store = get_weather_series()
+    cells = [cell_key(lat, lng) for lat, lng in coords]
+    windows = date_windows(dates)
+    start, end = min(w[0] for w in windows), max(w[1] for w in windows)
+    history_start = parse_day(start) - timedelta(days=SERIES_LAG_DAYS)
+    store.update(cells, history_start, min(parse_day(end), date.today()), get_weather_client())
+    table = store.load(cells, start, end)
+    window_days = (parse_day(windows[0][1]) - parse_day(windows[0][0])).days + 1
+    lags = [(parse_day(end) - parse_day(window_end)).days for _, window_end in windows]
+    return table.aggregate_stack(lags, window_days)
+
+def fetch_date_weather(lats, lngs, dates):
+    """
+    fetch_weather_arrays for many days at once: (3, dates, points), NaN
+    where there is no data. Looked up once per distinct cell, or per
+    lattice node with a weather lattice.
+    """
+    keys = [cell_key(lat, lng) for lat, lng in zip(lats, lngs)]
+    position = {}
+    inverse = np.array([position.setdefault(key, len(position)) for key in keys], dtype=np.intp)
+    cells = list(position)
+    if WEATHER_LATTICE is None:
+        weather = series_date_weather([cell_coords(key) for key in cells], dates)
+        return weather[:, :, inverse]
+        
+    # Interpolated at each cell's key coordinates, as prefetch_weather does
+    cell_lats, cell_lngs = np.array([cell_coords(key) for key in cells]).reshape(-1, 2).T
+    nodes = sorted(WEATHER_LATTICE.node_cells(cell_lats, cell_lngs)) if cells else []
+    node_stack = series_date_weather([cell_coords(key) for key in nodes], dates)
+    node_weather = {key: node_stack[:, :, i] for i, key in enumerate(nodes)}
+    weather = np.full((len(LATTICE_FIELDS), len(dates), len(cells)), np.nan)
+    for k in range(len(dates)):
+        def fetch(coords, k=k):
+            values = [node_weather[cell_key(lat, lng)][:, k] for lat, lng in coords]
+            return [None if np.isnan(v[0]) else dict(zip(LATTICE_FIELDS, v.tolist())) for v in values]
+        lattice = WeatherLattice(fetch, **WEATHER_LATTICE.describe())
+        weather[:, k] = lattice.interpolate(cell_lats, cell_lngs)
+        WEATHER_LATTICE.loaded |= lattice.loaded
+        WEATHER_LATTICE.fallback_nodes += lattice.fallback_nodes
+    return weather[:, :, inverse]
+
+def generate_date_heatmaps(observations, host_data, dates, host_index=None, guilds=GUILDS):
+    """
+    generate_all_heatmaps for each of dates. Yields (day, {guild: feature
+    iterator}) in date order; scoring happens up front, features are built
+    as each day's iterators are consumed.
+    """
+    if host_index is None:
+        host_index = HostIndex(host_data)
+    locations, guild_refs = build_location_table(observations, guilds)
+    lats = np.array([coords[0] for _, coords in locations], dtype=float)
+    lngs = np.array([coords[1] for _, coords in locations], dtype=float)
+    weather = fetch_date_weather(lats, lngs, dates)
+    location_factors = compute_location_factors(lats, lngs, host_index, weather, guilds)
+    months = [day.month for day in dates]
+    scores = {
+        guild: score_guild(guild, location_factors, np.asarray(guild_refs[guild], dtype=np.intp), months)
+        for guild in guilds
+    }
+    for k, day in enumerate(dates):
+        layers = {}
+        for guild in guilds:
+            day_scores = {name: values[k] if np.ndim(values) == 2 else values for name, values in scores[guild].items()}
+            layers[guild] = iter_guild_features(guild, [locations[i] for i in guild_refs[guild]], day_scores)
+        yield day, layers
+
+def update_dates_index(dates_dir, counts):
+    """
+    Merges {day: {layer: feature count}} into the dates index, which lists
+    the layer names once and each day's counts in that order.
+    """
+    path = os.path.join(dates_dir, DATES_INDEX)
+    merged = {}
+    try:
+        with open(path, "r") as f:
+            index = json.load(f)
+        merged = {day: dict(zip(index["layers"], day_counts)) for day, day_counts in index["dates"].items()}
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    for day, day_counts in counts.items():
+        merged[day] = day_counts
+    layers = sorted({layer for day_counts in merged.values() for layer in day_counts})
+    index = {
+        "layers": layers,
+        "dates": {day: [merged[day].get(layer) for layer in layers] for day in sorted(merged)}
+    }
+    publish.write_atomic(path, json.dumps(index, separators=(",", ":")))
+    return path
+
+# --workers: guild layers and location chunks fan out to a process pool.
+# Each worker opens the memory-mapped host stores itself, so host data is
+# shared through the page cache instead of being pickled per task. Weather
+# is fetched once in the parent. Chunk results are merged in submission
+# order, so the output is byte-identical to a serial run.
+
+PARALLEL_CHUNK_SIZE = 20_000
+
+_worker_state = {}
+
+def _init_worker(host_dir, store_dir, dem_path, land_cover_path, public_lands_path, host_density_curve):
+    global TERRAIN, LAND_COVER, PUBLIC_LANDS, HOST_DENSITY
+    HOST_DENSITY = host_density.HostDensity(host_density_curve, radius_km=HOST_RADIUS_KM) if host_density_curve else None
+    PUBLIC_LANDS = PublicLandIndex.load(public_lands_path)
+    TERRAIN = terrain.load_terrain(dem_path)
+    LAND_COVER = habitat_mask.load_land_cover(land_cover_path)
+    host_data = load_host_trees(host_dir, store_dir)
+    _worker_state["host_data"] = host_data
+    _worker_state["host_index"] = HostIndex(host_data)
+
+def _host_near_task(lats, lngs, host_types):
+    host_index = _worker_state["host_index"]
+    return {host_type: host_index.within_mask(host_type, lngs, lats, HOST_RADIUS_KM) for host_type in host_types}
+
+def _features_task(guild_name, locations, factors):
+    # factors are already restricted to these locations
+    return guild_features(guild_name, locations, score_guild(guild_name, factors))
+
+def _scalar_layer_task(guild_name, observations, weather):
+    WEATHER_CACHE.update(weather)
+    return generate_heatmap(guild_name, observations, _worker_state["host_data"], _worker_state["host_index"])["features"]
+
+def take_factors(location_factors, idx):
+    """location_factors restricted to the location indices in idx."""
+    return {
+        "weather": location_factors["weather"][:, idx],
+        "host_near": {host_type: mask[idx] for host_type, mask in location_factors["host_near"].items()},
+        "aspect": location_factors["aspect"][idx],
+        "habitat": location_factors["habitat"][idx],
+        "public_land": location_factors["public_land"][idx]
+    }
+
+def generate_layers_parallel(observations, guilds, engine, workers, host_dir=HOST_DIR,
+                             store_dir=host_store.STORE_DIR, chunk_size=PARALLEL_CHUNK_SIZE, dem_path=None,
+                             land_cover_path=None, public_lands_path=PUBLIC_LANDS_PATH):
+    """Process-pool version of the layer build; returns {guild: feature iterator}."""
+    locations, guild_refs = build_location_table(observations, guilds)
+    lats = np.array([coords[0] for _, coords in locations], dtype=float)
+    lngs = np.array([coords[1] for _, coords in locations], dtype=float)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(host_dir, store_dir, dem_path, land_cover_path, public_lands_path,
+                                       HOST_DENSITY.curve if HOST_DENSITY is not None else None)) as pool:
+        if engine == "scalar":
+            prefetch_weather(lats, lngs)
+            futures = {}
+            for guild in guilds:
+                rows = [obs for obs in observations if guild in obs.subject]
+                weather = {cell_key(*locations[i][1]): WEATHER_CACHE.get(cell_key(*locations[i][1]))
+                           for i in guild_refs[guild]}
+                futures[guild] = pool.submit(_scalar_layer_task, guild, rows, weather)
+            return {guild: iter(futures[guild].result()) for guild in guilds}
+
+        weather = fetch_weather_arrays(lats, lngs)
+        host_types = guild_host_types(guilds)
+        if HOST_DENSITY is not None:
+            # Grid lookups are cheap enough to do here
+            load_host_trees(host_dir, store_dir)
+            host_near = None
+        else:
+            starts = range(0, len(locations), chunk_size)
+            parts = [pool.submit(_host_near_task, lats[s:s + chunk_size], lngs[s:s + chunk_size], host_types)
+                     for s in starts]
+            parts = [part.result() for part in parts]
+            host_near = {
+                host_type: np.concatenate([part[host_type] for part in parts]) if parts else np.zeros(0, dtype=bool)
+                for host_type in host_types
+            }
+        location_factors = compute_location_factors(lats, lngs, None, weather, guilds, host_near=host_near)
+
+        futures = {}
+        for guild in guilds:
+            idx = np.asarray(guild_refs[guild], dtype=np.intp)
+            futures[guild] = [
+                pool.submit(_features_task, guild, [locations[i] for i in idx[s:s + chunk_size]],
+                            take_factors(location_factors, idx[s:s + chunk_size]))
+                for s in range(0, len(idx), chunk_size)
+            ]
+        return {guild: itertools.chain.from_iterable(future.result() for future in futures[guild]) for guild in guilds}
+
+def layer_name(guild):
+    return guild.split(" (")[0].lower().replace(" ", "-")
+
+def write_layer(path, features, cells=None):
+    """
+    Streams features into the layer at path, encoded as LAYER_ENCODING
+    says, adding each feature's weather cell to cells if given. Returns
+    (feature count, paths written or removed).
+    """
+    encoding = LAYER_ENCODING or {}
+    with layer_encoding.LayerWriter(path, encoding.get("precision"), encoding.get("binary", False),
+                                    encoding.get("compress", False)) as writer:
+        for feature in features:
+            if cells is not None:
+                lng, lat = feature["geometry"]["coordinates"]
+                cells.add(cell_key(lat, lng))
+            writer.add(feature)
+    return writer.count, writer.paths
+
+def generate_heatmap_vectorized(guild_name, observations, host_data, host_index=None):
+    """Same output as generate_heatmap, scored as whole arrays at once."""
+    return generate_all_heatmaps(observations, host_data, host_index, guilds=[guild_name])[guild_name]
+
+def layer_inputs(guild, rows_digest, manifest, layer_key, month, window, host_dir=HOST_DIR):
+    """Fingerprints of everything a guild layer is built from, for the build manifest."""
+    clean_name = guild.split(" (")[0]
+    hosts = GUILD_HOSTS.get(clean_name, {"primary": [], "secondary": []})
+    host_paths = {name: os.path.join(host_dir, f"{name}.json") for name in hosts["primary"] + hosts["secondary"]}
+    config = {
+        "hosts": GUILD_HOSTS.get(clean_name),
+        "thresholds": GUILD_THRESHOLDS.get(clean_name),
+        "seasonality": SEASONALITY.get(clean_name),
+        "host_radius_km": HOST_RADIUS_KM,
+        "factors": FACTOR_NAMES,
+        "gazetteer": get_geocoder().fingerprint()
+    }
+    if WEATHER_LATTICE is not None:
+        config["weather_lattice"] = WEATHER_LATTICE.describe()
+    if TERRAIN is not None:
+        config["terrain"] = TERRAIN.fingerprint()
+    if LAND_COVER is not None:
+        config["land_cover"] = LAND_COVER.fingerprint()
+    if HOST_DENSITY is not None:
+        config["host_density"] = HOST_DENSITY.describe()
+    if get_public_lands().fingerprint is not None:
+        config["public_lands"] = get_public_lands().fingerprint
+    if LAYER_ENCODING is not None:
+        config["encoding"] = LAYER_ENCODING
+    return {
+        "rows": rows_digest,
+        "config": build_manifest.digest(config),
+        "month": month,
+        "hosts": manifest.host_fingerprints(layer_key, host_paths),
+        "window": list(window)
     }
 
-def main():
+# Functions timed by --instrument; haversine calls are counted separately
+INSTRUMENTED_FUNCTIONS = [
+    "load_observations", "load_host_trees", "geocode_location", "build_location_table",
+    "fetch_hyperlocal_weather", "prefetch_weather", "fetch_weather_arrays",
+    "calculate_weather_score", "calculate_host_bonus", "host_within_range", "calculate_seasonality_score",
+    "get_aspect_score", "aspect_weights", "check_land_cover_habitat", "habitat_weights",
+    "public_land_names", "compute_location_factors", "score_guild", "fetch_date_weather", "generate_date_heatmaps",
+    "generate_heatmap", "generate_all_heatmaps", "generate_rasters", "layer_inputs"
+]
+
+def enable_instrumentation(profile=False):
+    run_report.enable(profile)
+    module = sys.modules[__name__]
+    index_module = sys.modules[HostIndex.__module__]
+    run_report.instrument(module, INSTRUMENTED_FUNCTIONS)
+    for target in (module, index_module):
+        run_report.count_calls(target, "haversine", "haversine_evaluations")
+    run_report.count_calls(index_module, "haversine_array", "haversine_evaluations", lambda result: result.size)
+
+def build_layers(args, disk_cache, observations):
+    """Rebuilds the stale layers (and rasters if asked); returns {layer: feature count} written."""
+    written = {}
     print("Generating HYPERLOCAL probability heatmaps...")
-    observations = load_observations()
-    host_data = load_host_trees()
+    with run_report.stage("load_observations"):
+        # One streaming pass validates the rows and fingerprints each guild's share
+        rows_digests = observation_ingest.guild_digests(observations, GUILDS)
+    print(observations.report.summary())
+    output_dir = args.output_dir
+    
+    # Work out which layers are stale before loading anything heavy
+    with run_report.stage("plan"):
+        manifest = build_manifest.BuildManifest.load(args.manifest)
+        month = datetime.now().month
+        window = weather_window()
+        
+        def weather_check(cells, cell_window):
+            return disk_cache.digest_cells(cells, cell_window[0], cell_window[1])
+        
+        plan = {}
+        for guild in GUILDS:
+            output_path = os.path.join(output_dir, f"{layer_name(guild)}.json")
+            layer_key = os.path.relpath(output_path, SCRIPT_DIR)
+            inputs = layer_inputs(guild, rows_digests[guild], manifest, layer_key, month, window, args.host_dir)
+            if args.force:
+                reasons = ["--force"]
+            else:
+                reasons = manifest.stale_reasons(layer_key, inputs, output_path, weather_check)
+            plan[guild] = (output_path, layer_key, inputs, reasons)
+            status = f"rebuild ({'; '.join(reasons)})" if reasons else "up to date"
+            print(f"  {layer_name(guild)}: {status}")
+    
+    if args.dry_run:
+        return written
+    
+    stale = [guild for guild in GUILDS if plan[guild][3]]
+    if not stale and not args.raster:
+        print("All layers up to date.")
+        return written
     
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    output_dir = os.path.join(script_dir, "../client/public/data/layers")
     os.makedirs(output_dir, exist_ok=True)
+    parallel = args.workers > 1 and bool(stale)
+    if not parallel or args.raster:
+        with run_report.stage("load_host_trees"):
+            host_data = load_host_trees(args.host_dir, args.host_store_dir)
+        with run_report.stage("host_index"):
+            index = HostIndex(host_data)
+    
+    with run_report.stage("score"):
+        if parallel:
+            outputs = generate_layers_parallel(observations, stale, args.engine, args.workers,
+                                               args.host_dir, args.host_store_dir, dem_path=args.dem,
+                                               land_cover_path=args.land_cover, public_lands_path=args.public_lands)
+        elif args.engine == "vector" and stale:
+            outputs = stream_all_heatmaps(observations, host_data, index, guilds=stale)
+        else:
+            outputs = {guild: iter_heatmap_features(guild, observations, host_data, index) for guild in stale}
     
-    for guild in GUILDS:
-        safe_name = guild.split(" (")[0].lower().replace(" ", "-")
-        geojson = generate_heatmap(guild, observations, host_data)
+    published = []
+    for guild in stale:
+        output_path, layer_key, inputs, _ = plan[guild]
+        cells = set()
+        with run_report.stage("write_layers"):
+            # Features are built as they are written; scalar layers are scored here too
+            count, paths = write_layer(output_path, outputs[guild], cells)
+        published.extend(paths)
+        print(f"Generated {output_path} with {count} points")
+        written[layer_name(guild)] = count
         
-        output_path = f"{output_dir}/{safe_name}.json"
-        with open(output_path, "w") as f:
-            json.dump(geojson, f)
-        print(f"Generated {output_path} with {len(geojson['features'])} points")
+        with run_report.stage("manifest"):
+            cells = cells if WEATHER_LATTICE is None else weather_lattice_cells(cells)
+            weather_digest, missing = disk_cache.digest_cells(cells, window[0], window[1])
+            manifest.record(layer_key, inputs, cells, weather_digest, missing)
+    with run_report.stage("manifest"):
+        manifest.save()
+        publish.record(published, os.path.dirname(os.path.abspath(output_dir)))
+    
+    if args.raster:
+        with run_report.stage("rasters"):
+            raster_dir = os.path.join(SCRIPT_DIR, "../client/public/data/rasters")
+            rasters = generate_rasters(index, resolution=args.raster_resolution)
+            for guild, intensity in rasters.items():
+                valid = ~np.isnan(intensity)
+                pixels = raster_output.quantize(np.where(valid, intensity, vector_scoring.MIN_INTENSITY),
+                                                vector_scoring.MIN_INTENSITY, vector_scoring.MAX_INTENSITY, valid)
+                header = raster_output.write_raster(raster_dir, layer_name(guild), pixels, AOI_BOUNDS,
+                                                    args.raster_resolution, vector_scoring.MIN_INTENSITY,
+                                                    vector_scoring.MAX_INTENSITY, {"guild": guild})
+                print(f"Generated {raster_dir}/{layer_name(guild)}.png ({header['width']}x{header['height']})")
+            publish.record([os.path.join(raster_dir, f"{layer_name(guild)}{ext}") for guild in rasters
+                            for ext in (".png", ".json")], os.path.dirname(raster_dir))
+    return written
+
+def build_date_layers(args, dates, observations):
+    """--dates: writes every guild layer for each day under output_dir/dates/<day>, plus the dates index."""
+    written = {}
+    print(f"Generating probability heatmaps for {len(dates)} days, {dates[0]} to {dates[-1]}...")
+    with run_report.stage("load_host_trees"):
+        host_data = load_host_trees(args.host_dir, args.host_store_dir)
+    with run_report.stage("host_index"):
+        index = HostIndex(host_data)
+    
+    dates_dir = os.path.join(args.output_dir, DATES_DIR)
+    counts = {}
+    published = []
+    days = generate_date_heatmaps(observations, host_data, dates, index)
+    while True:
+        # Every day is scored on the first step; later steps build that day's features
+        with run_report.stage("score"):
+            step = next(days, None)
+        if step is None:
+            break
+        if not counts:
+            print(observations.report.summary())
+        day, layers = step
+        day_dir = os.path.join(dates_dir, day.isoformat())
+        os.makedirs(day_dir, exist_ok=True)
+        counts[day.isoformat()] = {}
+        with run_report.stage("write_layers"):
+            for guild, features in layers.items():
+                count, paths = write_layer(os.path.join(day_dir, f"{layer_name(guild)}.json"), features)
+                published.extend(paths)
+                counts[day.isoformat()][layer_name(guild)] = count
+                written[f"{day.isoformat()}/{layer_name(guild)}"] = count
+    with run_report.stage("manifest"):
+        index_path = update_dates_index(dates_dir, counts)
+        publish.record(published + [index_path], os.path.dirname(os.path.abspath(args.output_dir)))
+    print(f"Generated {len(GUILDS)} layers for each of {len(dates)} days under {dates_dir} (index {index_path})")
+    return written
+
+def parse_args(argv=None):
+    """(args, --dates days or None) for main; exits with usage on bad arguments."""
+    parser = argparse.ArgumentParser(description="Generate guild probability layers.")
+    parser.add_argument("--engine", choices=["vector", "scalar"], default="vector",
+                        help="vector scores all guilds in one pass as NumPy arrays; scalar scores point by point")
+    parser.add_argument("--weather-cache-ttl", type=float, default=DEFAULT_TTL_HOURS,
+                        help="hours before an on-disk weather cache entry is refetched")
+    parser.add_argument("--weather-lattice", type=float, nargs="?", const=LATTICE_SPACING_DEG, default=None,
+                        metavar="DEG", help="fetch weather once per node of a lattice this coarse "
+                        f"(default {LATTICE_SPACING_DEG}) and interpolate each point's value")
+    parser.add_argument("--weather-interpolation", choices=LATTICE_METHODS, default="bilinear",
+                        help="how --weather-lattice interpolates between nodes")
+    parser.add_argument("--dem", default=terrain.DEM_PATH,
+                        help="DEM (GeoTIFF or raw-grid JSON header) for aspect; simulated aspect when missing")
+    parser.add_argument("--land-cover", default=habitat_mask.LAND_COVER_PATH,
+                        help="NLCD-style class raster for the habitat mask; no masking when missing")
+    parser.add_argument("--host-density", nargs="?", const="step", choices=host_density.CURVES, default=None,
+                        metavar="CURVE", help="score hosts from cached density grids instead of host list searches: "
+                        "step keeps the within-radius thresholds (the default), graded scales the bonus with density")
+    parser.add_argument("--public-lands", default=PUBLIC_LANDS_PATH,
+                        help="public lands GeoJSON features are tagged from (see fetch_public_lands.py)")
+    parser.add_argument("--dates", metavar="SPEC",
+                        help="write layers for a range of days instead of today: YYYY-MM-DD, START:END, "
+                        "+N (today and the next N - 1 days) or -N (the N days ending today)")
+    parser.add_argument("--raster", action="store_true",
+                        help="also write a quantized probability grid per guild covering AOI_BOUNDS")
+    parser.add_argument("--raster-resolution", type=float, default=RASTER_RESOLUTION_DEG,
+                        help="raster lattice spacing in degrees")
+    parser.add_argument("--output-dir", default=LAYERS_DIR, help="directory the guild layers are written to")
+    parser.add_argument("--coord-precision", type=int, default=None, metavar="DIGITS",
+                        help="round layer coordinates to this many decimals (5 is ~1 m); full precision by default")
+    parser.add_argument("--binary-layers", action="store_true",
+                        help="also write each layer in the compact binary encoding (<layer>.bin, see layer_encoding.py)")
+    parser.add_argument("--precompress", action="store_true",
+                        help="also write .gz (and, with the brotli module, .br) copies of each layer for static serving")
+    parser.add_argument("--force", action="store_true", help="rebuild every layer even if its inputs are unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="report which layers would rebuild and why, then exit")
+    parser.add_argument("--observations", default=OBSERVATIONS_PATH, help="guild observations CSV")
+    parser.add_argument("--host-dir", default=HOST_DIR, help="directory of host tree GeoJSON files")
+    parser.add_argument("--host-store-dir", default=host_store.STORE_DIR,
+                        help="where the memory-mapped host stores are kept")
+    parser.add_argument("--manifest", default=build_manifest.MANIFEST_PATH, help="build manifest path")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="score guild layers and location chunks on this many processes")
+    parser.add_argument("--instrument", action="store_true",
+                        help="time every stage and factor function and write a run report")
+    parser.add_argument("--profile", action="store_true", help="also dump cProfile stats next to the run report")
+    parser.add_argument("--report", default=None,
+                        help="run report path (default: run_report.json beside the output dir)")
+    args = parser.parse_args(argv)
+    dates = None
+    if args.dates:
+        try:
+            dates = parse_dates(args.dates)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.engine == "scalar" or args.raster or args.workers > 1:
+            parser.error("--dates scores every day in one vectorized pass; it can't be combined with "
+                         "--engine scalar, --raster or --workers")
+    return args, dates
+
+def main(argv=None):
+    args, dates = parse_args(argv)
+    # A process may call main repeatedly (refresh_daemon.py): each run starts
+    # uninstrumented and with fresh HTTP counters
+    run_report.reset()
+    get_weather_client().reset_stats()
+    if args.instrument or args.profile:
+        enable_instrumentation(args.profile)
+    disk_cache = get_weather_cache(ttl_hours=args.weather_cache_ttl)
+    # Cells are read from the disk cache again on every run, so a process
+    # that calls main repeatedly picks up refreshed weather
+    WEATHER_CACHE.clear()
+    global WEATHER_LATTICE, TERRAIN, LAND_COVER, PUBLIC_LANDS, HOST_DENSITY, LAYER_ENCODING
+    WEATHER_LATTICE = None
+    LAYER_ENCODING = None
+    if args.coord_precision is not None or args.binary_layers or args.precompress:
+        LAYER_ENCODING = {"precision": args.coord_precision, "binary": args.binary_layers,
+                          "compress": args.precompress, "brotli": layer_encoding.brotli is not None}
+    TERRAIN = terrain.load_terrain(args.dem)
+    LAND_COVER = habitat_mask.load_land_cover(args.land_cover)
+    if PUBLIC_LANDS is None or not PUBLIC_LANDS.is_current(args.public_lands):
+        # Kept across calls while the file is unchanged, as on refresh_daemon.py cycles
+        PUBLIC_LANDS = PublicLandIndex.load(args.public_lands)
+    HOST_DENSITY = host_density.HostDensity(args.host_density, radius_km=HOST_RADIUS_KM) if args.host_density else None
+    if args.weather_lattice:
+        WEATHER_LATTICE = WeatherLattice(fetch_cell_weather, AOI_BOUNDS, args.weather_lattice, args.weather_interpolation)
+    
+    observations = load_observations(args.observations)
+    written = {}
+    try:
+        written = build_date_layers(args, dates, observations) if dates else build_layers(args, disk_cache, observations)
+    finally:
+        stats = disk_cache.stats()
+        print(f"Weather cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries, {stats['size_bytes']} bytes")
+        if WEATHER_LATTICE is not None:
+            lattice_stats = WEATHER_LATTICE.stats()
+            print(f"Weather lattice: {lattice_stats['nodes_fetched']} of {lattice_stats['nodes']} nodes used, "
+                  f"{lattice_stats['fallback_nodes']} from regional fallback")
+        if HOST_DENSITY is not None:
+            density_stats = HOST_DENSITY.stats()
+            print(f"Host density: {density_stats['species']} species on a {density_stats['shape'][0]}x"
+                  f"{density_stats['shape'][1]} grid, {density_stats['built']} built, {density_stats['loaded']} from cache")
+        if run_report.ENABLED:
+            client = get_weather_client()
+            report_path = args.report or os.path.join(os.path.dirname(os.path.abspath(args.output_dir)), "run_report.json")
+            run_report.write(report_path, {
+                "argv": sys.argv[1:] if argv is None else list(argv),
+                "engine": args.engine,
+                "layers": written,
+                "weather_cache": stats,
+                "weather_memory_entries": len(WEATHER_CACHE),
+                "weather_lattice": WEATHER_LATTICE.stats() if WEATHER_LATTICE is not None else None,
+                "host_density": HOST_DENSITY.stats() if HOST_DENSITY is not None else None,
+                "observations": observations.report.to_dict(),
+                "http": {
+                    "requests": client.request_count,
+                    "retries": client.retry_count,
+                    "latency": run_report.latency_summary(list(client.latencies))
+                }
+            })
+            print(f"Wrote run report {report_path}")
+    return written
 
 if __name__ == "__main__":
     main()
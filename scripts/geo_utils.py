@@ -0,0 +1,46 @@
+from math import radians, cos, sin, asin, sqrt
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+def haversine(lon1, lat1, lon2, lat2):
+    R = EARTH_RADIUS_KM
+    dlon = radians(lon2 - lon1)
+    dlat = radians(lat2 - lat1)
+    a = sin(dlat / 2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2)**2
+    c = 2 * asin(sqrt(a))
+    return R * c
+
+def haversine_array(lon1, lat1, lon2, lat2):
+    """NumPy haversine; arguments broadcast against each other."""
+    dlon = np.radians(lon2 - lon1)
+    dlat = np.radians(lat2 - lat1)
+    a = np.sin(dlat / 2)**2 + np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.sin(dlon / 2)**2
+    c = 2 * np.arcsin(np.sqrt(a))
+    return EARTH_RADIUS_KM * c
+
+def point_in_polygon(point, vs):
+    """
+    Ray casting point-in-polygon test, same as pointInPolygon in
+    client/src/lib/geoUtils.ts. point is [lng, lat], vs a list of vertices.
+    """
+    x, y = point[0], point[1]
+    inside = False
+    j = len(vs) - 1
+    for i in range(len(vs)):
+        xi, yi = vs[i][0], vs[i][1]
+        xj, yj = vs[j][0], vs[j][1]
+        intersect = ((yi > y) != (yj > y)) and (x < (xj - xi) * (y - yi) / (yj - yi) + xi)
+        if intersect:
+            inside = not inside
+        j = i
+    return inside
+
+def polygon_rings(geometry):
+    """Outer rings of a Polygon or MultiPolygon geometry."""
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"][0]]
+    if geometry["type"] == "MultiPolygon":
+        return [polygon[0] for polygon in geometry["coordinates"]]
+    return []
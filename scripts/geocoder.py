@@ -0,0 +1,177 @@
+import argparse
+import csv
+import hashlib
+import os
+import random
+import time
+from collections import deque
+
+# Gazetteer geocoder for the free-text "Recent Locations" entries. Place
+# names are loaded from data/gazetteer.csv (name,lat,lng) and compiled into
+# an Aho-Corasick automaton, so one pass over a location string finds every
+# place name it contains as whole words (ignoring case), however large the
+# gazetteer. When several names match, the one listed first in the file
+# wins; list specific names (e.g. "Mendocino National Forest") before the
+# broader ones they contain.
+#
+# Each distinct location string gets a fixed jitter around its place,
+# derived from the string itself, so the same location resolves to the
+# same coordinates in every call and every run.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+GAZETTEER_PATH = os.path.join(SCRIPT_DIR, "data", "gazetteer.csv")
+JITTER_DEG = 0.03
+JITTER_SEED = "mushroom-mapper-geocoder-v1" # Change to reshuffle every jittered point
+
+def load_gazetteer(path=GAZETTEER_PATH):
+    """Returns [(name, lat, lng)] in file order."""
+    places = []
+    with open(path, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            places.append((row["name"].strip(), float(row["lat"]), float(row["lng"])))
+    return places
+
+class PlaceMatcher:
+    """Aho-Corasick automaton over case-folded place names, matched on word boundaries."""
+
+    def __init__(self, names):
+        self.lengths = [len(name.casefold()) for name in names]
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]] # Pattern indices ending at each state, including via failure links
+        for rank, name in enumerate(names):
+            state = 0
+            for char in name.casefold():
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.out[state].append(rank)
+
+        # Breadth-first failure links; each state inherits its fail state's matches
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0) if state else 0
+                self.out[child] = sorted(self.out[child] + self.out[self.fail[child]])
+
+    def first_match(self, text):
+        """Index of the earliest-listed name occurring in text as whole words, or None."""
+        text = text.casefold()
+        state = 0
+        found = None
+        for end, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for rank in self.out[state]:
+                if found is not None and rank >= found:
+                    break
+                start = end + 1 - self.lengths[rank]
+                if (start == 0 or not text[start - 1].isalnum()) and \
+                        (end + 1 == len(text) or not text[end + 1].isalnum()):
+                    found = rank
+                    break
+        return found
+
+class Geocoder:
+    def __init__(self, places, jitter_deg=JITTER_DEG, seed=JITTER_SEED):
+        self.places = list(places)
+        self.jitter_deg = jitter_deg
+        self.seed = seed
+        self.matcher = PlaceMatcher([name for name, _, _ in self.places])
+        self._memo = {}
+
+    @classmethod
+    def load(cls, path=GAZETTEER_PATH, **kwargs):
+        return cls(load_gazetteer(path), **kwargs)
+
+    def fingerprint(self):
+        """Digest of the gazetteer and jitter settings; changes whenever output coordinates would."""
+        sha = hashlib.sha256(f"{self.seed}|{self.jitter_deg}".encode())
+        for name, lat, lng in self.places:
+            sha.update(f"\n{name}|{lat!r}|{lng!r}".encode())
+        return sha.hexdigest()
+
+    def match(self, text):
+        """(name, lat, lng) of the gazetteer place named in text, or None."""
+        rank = self.matcher.first_match(text)
+        return None if rank is None else self.places[rank]
+
+    def geocode(self, loc_str):
+        """Jittered (lat, lng) for a location string, or None if no place matches."""
+        clean_loc = loc_str.replace("'", "").replace('"', "").strip()
+        if clean_loc in self._memo:
+            return self._memo[clean_loc]
+        place = self.match(clean_loc)
+        coords = None
+        if place:
+            _, lat, lng = place
+            rng = random.Random(f"{self.seed}|{clean_loc}")
+            coords = (lat + rng.uniform(-self.jitter_deg, self.jitter_deg),
+                      lng + rng.uniform(-self.jitter_deg, self.jitter_deg))
+        self._memo[clean_loc] = coords
+        return coords
+
+_shared_geocoder = None
+
+def get_geocoder(**kwargs):
+    """Process-wide geocoder so the gazetteer is compiled once."""
+    global _shared_geocoder
+    if _shared_geocoder is None:
+        _shared_geocoder = Geocoder.load(**kwargs)
+    return _shared_geocoder
+
+def main():
+    parser = argparse.ArgumentParser(description="Geocode location strings against the gazetteer.")
+    parser.add_argument("locations", nargs="*", help="location strings to resolve")
+    parser.add_argument("--gazetteer", default=GAZETTEER_PATH)
+    parser.add_argument("--benchmark", type=int, default=0, metavar="N",
+                        help="time N lookups against a synthetic gazetteer of N/10 places")
+    args = parser.parse_args()
+
+    geocoder = Geocoder.load(args.gazetteer)
+    print(f"{len(geocoder.places)} places, {len(geocoder.matcher.goto)} automaton states")
+    for loc in args.locations:
+        place = geocoder.match(loc)
+        print(f"{loc!r}: {place[0] if place else None} -> {geocoder.geocode(loc)}")
+
+    if args.benchmark:
+        rng = random.Random(0)
+        places = geocoder.places + [
+            (f"Synthetic Grove {i:06d}", rng.uniform(36.5, 42.0), rng.uniform(-124.5, -119.0))
+            for i in range(args.benchmark // 10)
+        ]
+        names = [name for name, _, _ in places]
+        queries = [f"Trail near {rng.choice(names)}, CA" for _ in range(args.benchmark)]
+        large = Geocoder(places)
+
+        started = time.perf_counter()
+        for query in queries[:1000]:
+            next((name for name in names if name in query), None)
+        linear = (time.perf_counter() - started) / min(len(queries), 1000)
+
+        started = time.perf_counter()
+        for query in queries:
+            large.match(query)
+        automaton = (time.perf_counter() - started) / len(queries)
+
+        for query in queries:
+            large.geocode(query)
+        started = time.perf_counter()
+        for query in queries:
+            large.geocode(query)
+        memoized = (time.perf_counter() - started) / len(queries)
+
+        print(f"{len(places)} places: linear scan {linear * 1e6:.1f} us/lookup, "
+              f"automaton {automaton * 1e6:.1f} us/lookup, memoized {memoized * 1e6:.2f} us/lookup")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from fetch_land_cover import VALID_HABITAT_CODES
+from terrain import open_raster, write_geotiff, write_raw_grid, source_fingerprint
+
+# Habitat masking against a local NLCD-style land cover raster, replacing
+# per-point WMS queries. Drop a single-band class raster reprojected to
+# lat/lng (EPSG:4326) under data/land_cover, in the formats terrain.py
+# reads, e.g.
+#   gdalwarp -t_srs EPSG:4326 -co COMPRESS=NONE -co TILED=NO nlcd_2021.tif nlcd_norcal.tif
+#
+# The raster is turned once into a bit-packed mask cache: two bit planes
+# (class known / class in VALID_HABITAT_CODES) stored in TILE x TILE pixel
+# tiles, so points close together read the same few pages of the memory
+# map. Sampling a batch of points is a handful of array indexing
+# operations, with no per-point work in Python.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LAND_COVER_DIR = os.path.join(SCRIPT_DIR, "data", "land_cover")
+LAND_COVER_PATH = os.path.join(LAND_COVER_DIR, "nlcd_norcal.tif")
+CACHE_DIR = os.path.join(SCRIPT_DIR, "data", "land_cover_cache")
+CACHE_VERSION = 1
+TILE = 256 # Pixels per tile side; one tile plane is TILE * TILE / 8 = 8 KiB
+
+NODATA_CODES = [0, 250] # Unclassified / NLCD fill
+
+HABITAT_WEIGHT = 1.0
+NON_HABITAT_WEIGHT = 0.0 # Developed, water, barren, crops... are masked out
+
+def tile_counts(shape):
+    rows, cols = shape
+    return -(-rows // TILE), -(-cols // TILE)
+
+def build_mask_cache(raster, cache_path, codes=VALID_HABITAT_CODES):
+    """
+    Writes the (2, tile rows, tile cols, TILE, TILE / 8) uint8 cache: the
+    known plane, then the habitat plane. Reads the raster one tile row at a time.
+    """
+    rows, cols = raster.shape
+    tiles_y, tiles_x = tile_counts(raster.shape)
+    nodata = list(NODATA_CODES) + ([raster.nodata] if raster.nodata is not None else [])
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    planes = np.memmap(tmp_path, dtype=np.uint8, mode="w+", shape=(2, tiles_y, tiles_x, TILE, TILE // 8))
+    for ty in range(tiles_y):
+        block = np.asarray(raster.values[ty * TILE:(ty + 1) * TILE])
+        known = np.zeros((TILE, tiles_x * TILE), dtype=bool)
+        habitat = np.zeros((TILE, tiles_x * TILE), dtype=bool)
+        known[:len(block), :cols] = ~np.isin(block, nodata)
+        habitat[:len(block), :cols] = np.isin(block, codes)
+        for plane, bits in enumerate([known, habitat]):
+            # (TILE, tiles_x * TILE) -> (tiles_x, TILE, TILE) -> packed along each tile row
+            tiles = bits.reshape(TILE, tiles_x, TILE).transpose(1, 0, 2)
+            planes[plane, ty] = np.packbits(tiles, axis=-1)
+    planes.flush()
+    del planes
+    os.replace(tmp_path, cache_path)
+
+class LandCover:
+    """Bit-packed habitat mask over a class raster, plus the raster itself for class lookups."""
+
+    def __init__(self, raster, planes, header):
+        self.raster = raster
+        self.bounds = raster.bounds
+        self.known = planes[0]
+        self.habitat = planes[1]
+        self.header = header
+
+    @classmethod
+    def load(cls, path=LAND_COVER_PATH, cache_dir=CACHE_DIR):
+        """Opens the mask cache for path, rebuilding it if the raster changed."""
+        raster = open_raster(path)
+        name = os.path.splitext(os.path.basename(path))[0]
+        cache_path = os.path.join(cache_dir, f"{name}.habitat")
+        header_path = cache_path + ".json"
+        header = {
+            "version": CACHE_VERSION,
+            "source": source_fingerprint(path),
+            "shape": list(raster.shape),
+            "bounds": raster.bounds,
+            "tile": TILE,
+            "codes": VALID_HABITAT_CODES
+        }
+        try:
+            with open(header_path, "r") as f:
+                fresh = json.load(f) == header and os.path.exists(cache_path)
+        except (FileNotFoundError, ValueError):
+            fresh = False
+        if not fresh:
+            print(f"Building habitat mask for {path} ({raster.shape[0]}x{raster.shape[1]})...")
+            build_mask_cache(raster, cache_path)
+            with open(header_path, "w") as f:
+                json.dump(header, f, indent=2)
+        tiles_y, tiles_x = tile_counts(raster.shape)
+        planes = np.memmap(cache_path, dtype=np.uint8, mode="r", shape=(2, tiles_y, tiles_x, TILE, TILE // 8))
+        return cls(raster, planes, header)
+
+    def fingerprint(self):
+        """Identifies the raster and codes the mask came from."""
+        return self.header
+
+    def pixels(self, lats, lngs):
+        """(row, col, inside) raster pixel of each point; row/col are only meaningful where inside."""
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        rows, cols = self.raster.shape
+        row = np.floor((self.bounds["north"] - lats) / (self.bounds["north"] - self.bounds["south"]) * rows)
+        col = np.floor((lngs - self.bounds["west"]) / (self.bounds["east"] - self.bounds["west"]) * cols)
+        inside = (row >= 0) & (row < rows) & (col >= 0) & (col < cols)
+        return np.where(inside, row, 0).astype(np.intp), np.where(inside, col, 0).astype(np.intp), inside
+
+    def sample(self, lats, lngs):
+        """(known, habitat) bool arrays; points outside the raster are unknown."""
+        row, col, inside = self.pixels(lats, lngs)
+        shift = 7 - (col & 7) # packbits is big-endian within a byte
+        index = (row // TILE, col // TILE, row % TILE, (col % TILE) >> 3)
+        known = ((self.known[index] >> shift) & 1).astype(bool) & inside
+        habitat = ((self.habitat[index] >> shift) & 1).astype(bool) & known
+        return known, habitat
+
+    def habitat_weights(self, lats, lngs):
+        """NON_HABITAT_WEIGHT where the class is known and not habitat, HABITAT_WEIGHT elsewhere."""
+        known, habitat = self.sample(lats, lngs)
+        return np.where(known & ~habitat, NON_HABITAT_WEIGHT, HABITAT_WEIGHT)
+
+    def class_codes(self, lats, lngs):
+        """Raw land cover class at each point; 0 (unclassified) outside the raster."""
+        row, col, inside = self.pixels(lats, lngs)
+        codes = np.asarray(self.raster.values[row, col]).astype(int)
+        return np.where(inside, codes, 0)
+
+def load_land_cover(path=LAND_COVER_PATH, cache_dir=CACHE_DIR):
+    """LandCover for path, or None when there is no raster there."""
+    if not path or not os.path.exists(path):
+        return None
+    return LandCover.load(path, cache_dir)
+
+_shared_land_cover = None # False once a lookup has found no raster
+
+def get_land_cover_raster():
+    """Process-wide LandCover for LAND_COVER_PATH (None without a raster)."""
+    global _shared_land_cover
+    if _shared_land_cover is None:
+        _shared_land_cover = load_land_cover() or False
+    return _shared_land_cover or None
+
+def synthetic_land_cover(rows, cols, patch=40, seed=0):
+    """Test raster: square patches of random NLCD classes, habitat and not, with some nodata."""
+    rng = np.random.default_rng(seed)
+    classes = np.array(VALID_HABITAT_CODES + [11, 21, 22, 23, 24, 31, 71, 81, 82, 0])
+    patches = rng.choice(classes, size=(-(-rows // patch), -(-cols // patch)))
+    return np.repeat(np.repeat(patches, patch, axis=0), patch, axis=1)[:rows, :cols].astype(np.uint8)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the habitat mask cache and sample it at points.")
+    parser.add_argument("--land-cover", default=LAND_COVER_PATH, help="class raster (GeoTIFF or raw-grid JSON header)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--synthetic", metavar="PATH",
+                        help="first write a synthetic class raster fixture to PATH (.tif or .json) and use it")
+    parser.add_argument("--synthetic-size", type=int, default=2000, help="fixture rows and columns")
+    parser.add_argument("--benchmark", type=int, default=0, metavar="N", help="time sampling N random points")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        bounds = {"north": 42.0, "south": 36.5, "west": -124.5, "east": -119.0}
+        classes = synthetic_land_cover(args.synthetic_size, args.synthetic_size)
+        os.makedirs(os.path.dirname(os.path.abspath(args.synthetic)), exist_ok=True)
+        writer = write_raw_grid if args.synthetic.endswith(".json") else write_geotiff
+        writer(args.synthetic, classes, bounds, dtype="u1")
+        args.land_cover = args.synthetic
+
+    land_cover = load_land_cover(args.land_cover, args.cache_dir)
+    if land_cover is None:
+        print(f"No land cover raster at {args.land_cover}")
+        return
+    rows, cols = land_cover.raster.shape
+    print(f"{args.land_cover}: {rows}x{cols} pixels, {land_cover.known.shape[0]}x{land_cover.known.shape[1]} tiles")
+
+    if args.benchmark:
+        rng = np.random.default_rng(1)
+        b = land_cover.bounds
+        lats = rng.uniform(b["south"] - 0.1, b["north"] + 0.1, args.benchmark)
+        lngs = rng.uniform(b["west"] - 0.1, b["east"] + 0.1, args.benchmark)
+        started = time.perf_counter()
+        weights = land_cover.habitat_weights(lats, lngs)
+        elapsed = time.perf_counter() - started
+
+        # Cross-check the packed mask against the class raster itself
+        codes = land_cover.class_codes(lats, lngs)
+        expected = np.where(np.isin(codes, NODATA_CODES) | np.isin(codes, VALID_HABITAT_CODES),
+                            HABITAT_WEIGHT, NON_HABITAT_WEIGHT)
+        mismatches = int(np.count_nonzero(weights != expected))
+        print(f"Sampled {args.benchmark} points in {elapsed:.3f}s: {np.mean(weights == NON_HABITAT_WEIGHT):.1%} "
+              f"masked, {mismatches} mismatches against the class raster")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from fetch_env_data import AOI_BOUNDS
+from geo_utils import EARTH_RADIUS_KM
+
+# Host density rasters. Each host species is binned onto a regular lat/lng
+# grid over the AOI and convolved with two distance kernels:
+#   presence  a disk of HOST_RADIUS_KM, by 2D FFT: the number of hosts
+#             within the radius of each cell, the grid version of
+#             HostIndex.within_mask
+#   density   a Gaussian (sigma HOST_RADIUS_KM / 2), separably by 1D FFTs
+#             along each axis: a kernel-weighted host count for the
+#             graded host curve
+# Grids are cached per species under a hash of the species' coordinates
+# and the grid settings, so host scoring is one array lookup per point.
+# Distances are measured between cell centers with the longitude scale of
+# the grid's middle latitude, so presence is exact only to about a cell.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(SCRIPT_DIR, "data", "host_density_cache")
+CACHE_VERSION = 1
+RESOLUTION_DEG = 0.01 # ~1.1 km cells, matching the raster output default
+HOST_RADIUS_KM = 5.0 # As generate_probability.HOST_RADIUS_KM
+GAUSSIAN_TRUNCATE = 3.0 # Gaussian kernel is cut off at this many sigmas
+
+CURVES = ["step", "graded"]
+GRADED_SCALE = 1.0 # Kernel-weighted host count at which the graded bonus is ~63% of the way up
+
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+
+def graded_bonus(primary, secondary, scale=GRADED_SCALE):
+    """
+    Graded version of the host bonus step: 0.8 with no hosts nearby,
+    rising toward 1.5 with primary host density and toward 1.2 with
+    secondary host density, whichever is higher.
+    """
+    primary_bonus = 0.8 + 0.7 * (1 - np.exp(-np.asarray(primary, dtype=float) / scale))
+    secondary_bonus = 0.8 + 0.4 * (1 - np.exp(-np.asarray(secondary, dtype=float) / scale))
+    return np.maximum(primary_bonus, secondary_bonus)
+
+def fft_convolve(grid, kernel, axes):
+    """'same' size linear convolution of grid with an odd-sized kernel along axes."""
+    shape = [grid.shape[axis] + kernel.shape[axis] - 1 for axis in axes]
+    spectrum = np.fft.rfftn(grid, shape, axes=axes) * np.fft.rfftn(kernel, shape, axes=axes)
+    full = np.fft.irfftn(spectrum, shape, axes=axes)
+    index = [slice(None)] * grid.ndim
+    for axis in axes:
+        half = kernel.shape[axis] // 2
+        index[axis] = slice(half, half + grid.shape[axis])
+    return full[tuple(index)]
+
+class HostDensity:
+    """
+    Presence and density grids for host species over bounds, padded so
+    hosts just outside the AOI still count. Row 0 is the southern edge.
+    build() computes (or loads) the grids for a host_data dict; sample()
+    then looks points up.
+    """
+
+    def __init__(self, curve="step", bounds=AOI_BOUNDS, resolution=RESOLUTION_DEG, radius_km=HOST_RADIUS_KM,
+                 cache_dir=None):
+        if curve not in CURVES:
+            raise ValueError(f"unknown host curve {curve!r}")
+        self.curve = curve
+        self.resolution = resolution
+        self.radius_km = radius_km
+        self.sigma_km = radius_km / 2
+        self.cache_dir = cache_dir or CACHE_DIR
+        self.grids = {}
+        self.built = 0
+        self.loaded = 0
+
+        reach_km = max(radius_km, GAUSSIAN_TRUNCATE * self.sigma_km)
+        mid_lat = (bounds["north"] + bounds["south"]) / 2
+        self.cell_y_km = resolution * KM_PER_DEG
+        self.cell_x_km = self.cell_y_km * math.cos(math.radians(mid_lat))
+        pad_y = math.ceil(reach_km / self.cell_y_km)
+        pad_x = math.ceil(reach_km / self.cell_x_km)
+        self.south = bounds["south"] - pad_y * resolution
+        self.west = bounds["west"] - pad_x * resolution
+        self.rows = int(math.ceil((bounds["north"] - bounds["south"]) / resolution - 1e-9)) + 2 * pad_y
+        self.cols = int(math.ceil((bounds["east"] - bounds["west"]) / resolution - 1e-9)) + 2 * pad_x
+
+    def describe(self):
+        """Settings that change the grids or the bonus, for cache keys and the build manifest."""
+        return {
+            "version": CACHE_VERSION,
+            "curve": self.curve,
+            "origin": [self.south, self.west],
+            "shape": [self.rows, self.cols],
+            "resolution": self.resolution,
+            "radius_km": self.radius_km,
+            "sigma_km": self.sigma_km,
+            "graded_scale": GRADED_SCALE
+        }
+
+    def _offsets_km(self, half_y, half_x):
+        dy = np.arange(-half_y, half_y + 1) * self.cell_y_km
+        dx = np.arange(-half_x, half_x + 1) * self.cell_x_km
+        return dy, dx
+
+    def rasterize(self, coords):
+        """Host count per grid cell."""
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        row = np.floor((coords[:, 1] - self.south) / self.resolution).astype(np.int64)
+        col = np.floor((coords[:, 0] - self.west) / self.resolution).astype(np.int64)
+        inside = (row >= 0) & (row < self.rows) & (col >= 0) & (col < self.cols)
+        counts = np.bincount(row[inside] * self.cols + col[inside], minlength=self.rows * self.cols)
+        return counts.reshape(self.rows, self.cols).astype(float)
+
+    def compute(self, coords):
+        """(2, rows, cols) float32 stack: presence counts, then Gaussian density."""
+        counts = self.rasterize(coords)
+        if not counts.any():
+            return np.zeros((2, self.rows, self.cols), dtype=np.float32)
+
+        dy, dx = self._offsets_km(math.ceil(self.radius_km / self.cell_y_km), math.ceil(self.radius_km / self.cell_x_km))
+        disk = ((dy[:, None] ** 2 + dx[None, :] ** 2) <= self.radius_km ** 2).astype(float)
+        presence = fft_convolve(counts, disk, axes=(0, 1))
+
+        reach = GAUSSIAN_TRUNCATE * self.sigma_km
+        dy, dx = self._offsets_km(math.ceil(reach / self.cell_y_km), math.ceil(reach / self.cell_x_km))
+        gauss_y = np.exp(-0.5 * (dy / self.sigma_km) ** 2)[:, None]
+        gauss_x = np.exp(-0.5 * (dx / self.sigma_km) ** 2)[None, :]
+        density = fft_convolve(fft_convolve(counts, gauss_y, axes=(0,)), gauss_x, axes=(1,))
+
+        # FFT round-off leaves tiny nonzero values where there are no hosts
+        stack = np.stack([np.round(presence), np.where(density < 1e-9, 0.0, density)])
+        return stack.astype(np.float32)
+
+    def _cache_key(self, coords):
+        # The grids don't depend on the curve, so both curves share a cache entry
+        settings = {key: value for key, value in self.describe().items() if key not in ("curve", "graded_scale")}
+        digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+        digest.update(np.ascontiguousarray(coords, dtype="<f8").tobytes())
+        return digest.hexdigest()[:20]
+
+    def build(self, host_data):
+        """Loads or computes the grids for every species in host_data."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for name, coords in host_data.items():
+            coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+            key = self._cache_key(coords)
+            if self.grids.get(name, (None,))[0] == key:
+                continue
+            path = os.path.join(self.cache_dir, f"{name}-{key}.npy")
+            if os.path.exists(path):
+                grid = np.load(path, mmap_mode="r")
+                self.loaded += 1
+            else:
+                grid = self.compute(coords)
+                # Worker processes may build the same grid at once; each writes its own file
+                tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+                np.save(tmp_path, grid)
+                os.replace(tmp_path, path)
+                for stale in glob.glob(os.path.join(self.cache_dir, f"{name}-{'?' * len(key)}.npy")):
+                    if stale != path:
+                        os.remove(stale)
+                self.built += 1
+            self.grids[name] = (key, grid)
+
+    def cells(self, lats, lngs):
+        """(row, col, inside) grid cell of each point."""
+        row = np.floor((np.asarray(lats, dtype=float) - self.south) / self.resolution)
+        col = np.floor((np.asarray(lngs, dtype=float) - self.west) / self.resolution)
+        inside = (row >= 0) & (row < self.rows) & (col >= 0) & (col < self.cols)
+        return np.where(inside, row, 0).astype(np.intp), np.where(inside, col, 0).astype(np.intp), inside
+
+    def sample(self, names, lats, lngs):
+        """
+        {name: per-point host factor}: presence masks for the step curve,
+        Gaussian densities for the graded one. Species without data are
+        absent everywhere.
+        """
+        row, col, inside = self.cells(lats, lngs)
+        plane = 0 if self.curve == "step" else 1
+        factors = {}
+        for name in names:
+            if name in self.grids:
+                values = np.where(inside, self.grids[name][1][plane][row, col], 0.0)
+            else:
+                values = np.zeros(row.shape)
+            factors[name] = values > 0.5 if self.curve == "step" else values.astype(float)
+        return factors
+
+    def stats(self):
+        return {"species": len(self.grids), "built": self.built, "loaded": self.loaded,
+                "shape": [self.rows, self.cols]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Build host density grids and check them against exact host lookups.")
+    parser.add_argument("--host-dir", default=os.path.join(SCRIPT_DIR, "../client/public/data/hosts"))
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--resolution", type=float, default=RESOLUTION_DEG)
+    parser.add_argument("--compare", type=int, default=0, metavar="N",
+                        help="compare step presence with HostIndex.within_mask at N random points")
+    args = parser.parse_args()
+
+    from generate_probability import load_host_trees
+    from host_index import HostIndex
+    host_data = load_host_trees(args.host_dir)
+    density = HostDensity("step", resolution=args.resolution, cache_dir=args.cache_dir)
+    started = time.perf_counter()
+    density.build(host_data)
+    elapsed = time.perf_counter() - started
+    print(f"{len(host_data)} species on a {density.rows}x{density.cols} grid in {elapsed:.2f}s: {density.stats()}")
+    for name, (key, grid) in sorted(density.grids.items()):
+        print(f"  {name}: {len(host_data[name])} hosts, {np.mean(grid[0] > 0.5):.1%} of cells within "
+              f"{density.radius_km:g} km, peak density {float(grid[1].max()):.1f} ({key})")
+
+    if args.compare:
+        rng = np.random.default_rng(0)
+        lats = rng.uniform(AOI_BOUNDS["south"], AOI_BOUNDS["north"], args.compare)
+        lngs = rng.uniform(AOI_BOUNDS["west"], AOI_BOUNDS["east"], args.compare)
+        index = HostIndex(host_data)
+        started = time.perf_counter()
+        presence = density.sample(sorted(host_data), lats, lngs)
+        grid_s = time.perf_counter() - started
+        started = time.perf_counter()
+        exact = {name: index.within_mask(name, lngs, lats, density.radius_km) for name in sorted(host_data)}
+        exact_s = time.perf_counter() - started
+        agreement = np.mean([np.mean(presence[name] == exact[name]) for name in exact])
+        print(f"{args.compare} points: grid lookup {grid_s:.3f}s, exact {exact_s:.3f}s, {agreement:.2%} agreement")
+
+if __name__ == "__main__":
+    main()
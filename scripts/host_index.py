@@ -0,0 +1,207 @@
+import math
+import random
+from collections import defaultdict
+
+import numpy as np
+
+from geo_utils import haversine, haversine_array, EARTH_RADIUS_KM
+
+# Cell size in degrees. 0.05 deg is ~5.5 km north/south, so a 5 km
+# proximity query only ever touches a 3x3 (or 3x4) block of cells.
+CELL_SIZE_DEG = 0.05
+
+# Upper bound on point x candidate distance matrix entries per batch
+MAX_BATCH_PAIRS = 1_000_000
+
+# Bounding boxes are padded by a hair so float rounding can never drop
+# an edge point.
+BBOX_PAD_DEG = 1e-9
+
+class HostIndex:
+    """
+    Grid-bucket spatial index over host tree observations (or any named
+    lists of [lng, lat, ...] points). Points are bucketed by (lng, lat) cell; a radius query only runs the
+    exact haversine check against points in cells overlapping the query's
+    great-circle bounding box, so results match a brute-force scan.
+    """
+
+    def __init__(self, host_data, cell_size=CELL_SIZE_DEG):
+        self.cell_size = cell_size
+        self.grids = {}
+        self._cell_arrays = {}
+        for name, coords in host_data.items():
+            if isinstance(coords, np.ndarray):
+                # Column store rows bucket straight into per-cell arrays
+                self.grids[name] = self._bucket_array(coords)
+                self._cell_arrays[name] = self.grids[name]
+                continue
+            grid = defaultdict(list)
+            for coord in coords:
+                grid[self._cell(coord[0], coord[1])].append(coord)
+            self.grids[name] = dict(grid)
+
+    def _bucket_array(self, coords):
+        if not len(coords):
+            return {}
+        cx = np.floor(coords[:, 0] / self.cell_size).astype(np.int64)
+        cy = np.floor(coords[:, 1] / self.cell_size).astype(np.int64)
+        order = np.lexsort((cy, cx)) # Stable, so each cell keeps source order
+        breaks = np.flatnonzero((np.diff(cx[order]) != 0) | (np.diff(cy[order]) != 0)) + 1
+        return {
+            (int(cx[group[0]]), int(cy[group[0]])): coords[group]
+            for group in np.split(order, breaks)
+        }
+
+    def __contains__(self, name):
+        return name in self.grids
+
+    def _cell(self, lng, lat):
+        return (math.floor(lng / self.cell_size), math.floor(lat / self.cell_size))
+
+    def _bounding_box(self, lng, lat, radius_km):
+        # haversine(d) >= R * |dlat|, so this latitude band is exact.
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        # Longitude band from hav(d) >= cos(lat1) * cos(lat2) * hav(dlon),
+        # using the lowest cos(lat2) inside the latitude band.
+        far_lat = min(abs(lat) + dlat, 90.0)
+        c = math.sqrt(max(math.cos(math.radians(lat)) * math.cos(math.radians(far_lat)), 0.0))
+        s = math.sin(radius_km / (2 * EARTH_RADIUS_KM))
+        if c <= s:
+            dlng = 180.0
+        else:
+            dlng = math.degrees(2 * math.asin(s / c))
+        pad = BBOX_PAD_DEG
+        return lng - dlng - pad, lat - dlat - pad, lng + dlng + pad, lat + dlat + pad
+
+    def candidates(self, name, lng, lat, radius_km):
+        """Yields host coords in every cell the query radius can reach."""
+        grid = self.grids.get(name)
+        if not grid:
+            return
+        west, south, east, north = self._bounding_box(lng, lat, radius_km)
+        x0, y0 = self._cell(west, south)
+        x1, y1 = self._cell(east, north)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                for coord in grid.get((x, y), ()):
+                    yield coord
+
+    def any_within(self, name, lng, lat, radius_km):
+        for coord in self.candidates(name, lng, lat, radius_km):
+            if haversine(lng, lat, coord[0], coord[1]) < radius_km:
+                return True
+        return False
+
+    def _arrays(self, name):
+        # Per-cell (n, columns) arrays, built lazily for batch queries.
+        if name not in self._cell_arrays:
+            self._cell_arrays[name] = {
+                cell: np.asarray(coords, dtype=float)
+                for cell, coords in self.grids.get(name, {}).items()
+            }
+        return self._cell_arrays[name]
+
+    def warm(self):
+        """Builds every per-cell array up front instead of on first query."""
+        for name in self.grids:
+            self._arrays(name)
+
+    def candidate_array(self, name, lng, lat, radius_km):
+        """Rows of every point in cells the query radius can reach, as one array."""
+        cells = self._arrays(name)
+        west, south, east, north = self._bounding_box(lng, lat, radius_km)
+        x0, y0 = self._cell(west, south)
+        x1, y1 = self._cell(east, north)
+        rows = [
+            cells[(x, y)]
+            for x in range(x0, x1 + 1)
+            for y in range(y0, y1 + 1)
+            if (x, y) in cells
+        ]
+        if not rows:
+            return None
+        return np.concatenate(rows)
+
+    def within_mask(self, name, lngs, lats, radius_km):
+        """
+        Batch version of any_within. Query points are grouped by grid cell
+        and each group is checked against the union of its candidate cells
+        with one NumPy distance matrix.
+        """
+        lngs = np.asarray(lngs, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        mask = np.zeros(lngs.shape, dtype=bool)
+        cells = self._arrays(name)
+        if not cells or lngs.size == 0:
+            return mask
+
+        # Same bounding box as _bounding_box, per point
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        far_lat = np.minimum(np.abs(lats) + dlat, 90.0)
+        c = np.sqrt(np.maximum(np.cos(np.radians(lats)) * np.cos(np.radians(far_lat)), 0.0))
+        s = math.sin(radius_km / (2 * EARTH_RADIUS_KM))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dlng = np.where(c <= s, 180.0, np.degrees(2 * np.arcsin(np.minimum(s / c, 1.0))))
+        x0 = np.floor((lngs - dlng - BBOX_PAD_DEG) / self.cell_size).astype(np.int64)
+        x1 = np.floor((lngs + dlng + BBOX_PAD_DEG) / self.cell_size).astype(np.int64)
+        y0 = np.floor((lats - dlat - BBOX_PAD_DEG) / self.cell_size).astype(np.int64)
+        y1 = np.floor((lats + dlat + BBOX_PAD_DEG) / self.cell_size).astype(np.int64)
+
+        home = np.stack([np.floor(lngs / self.cell_size), np.floor(lats / self.cell_size)], axis=1)
+        _, group_ids = np.unique(home, axis=0, return_inverse=True)
+        group_ids = group_ids.ravel()
+        order = np.argsort(group_ids, kind="stable")
+        splits = np.flatnonzero(np.diff(group_ids[order])) + 1
+
+        for idx in np.split(order, splits):
+            candidates = [
+                cells[(x, y)]
+                for x in range(x0[idx].min(), x1[idx].max() + 1)
+                for y in range(y0[idx].min(), y1[idx].max() + 1)
+                if (x, y) in cells
+            ]
+            if not candidates:
+                continue
+            candidates = np.concatenate(candidates)
+            step = max(1, MAX_BATCH_PAIRS // len(candidates))
+            for start in range(0, len(idx), step):
+                sub = idx[start:start + step]
+                dist = haversine_array(lngs[sub, None], lats[sub, None],
+                                       candidates[None, :, 0], candidates[None, :, 1])
+                mask[sub] = (dist < radius_km).any(axis=1)
+        return mask
+
+def main():
+    # Compares the indexed host bonus against the brute-force scan.
+    from fetch_env_data import AOI_BOUNDS
+    from generate_probability import GUILDS, load_host_trees, calculate_host_bonus
+
+    host_data = load_host_trees()
+    host_index = HostIndex(host_data)
+    rng = random.Random(42)
+
+    points = []
+    for _ in range(2000):
+        points.append((rng.uniform(AOI_BOUNDS["south"], AOI_BOUNDS["north"]),
+                       rng.uniform(AOI_BOUNDS["west"], AOI_BOUNDS["east"])))
+    # Points right around the 5 km edge of real host observations
+    for coords in host_data.values():
+        for lng, lat in coords[rng.sample(range(len(coords)), min(len(coords), 200))].tolist():
+            bearing = rng.uniform(0, 2 * math.pi)
+            offset = rng.uniform(4.9, 5.1) / 111.195
+            points.append((lat + offset * math.cos(bearing),
+                           lng + offset * math.sin(bearing) / math.cos(math.radians(lat))))
+
+    mismatches = 0
+    for guild in GUILDS:
+        for lat, lng in points:
+            brute = calculate_host_bonus(lat, lng, guild, host_data)
+            indexed = calculate_host_bonus(lat, lng, guild, host_data, host_index)
+            if brute != indexed:
+                mismatches += 1
+                print(f"Mismatch for {guild} at ({lat}, {lng}): {brute} vs {indexed}")
+
+    print(f"Checked {len(points) * len(GUILDS)} host bonuses, {mismatches} mismatches")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import struct
+import time
+from datetime import date
+
+import numpy as np
+
+# Columnar binary store for host tree observations, one file per species,
+# so the generator memory-maps coordinates instead of parsing GeoJSON on
+# every run. Layout:
+#   8 bytes   magic "HOSTST01"
+#   4 bytes   little-endian uint32 header length
+#   header    JSON: count, source fingerprint, column dtype/shape/offset
+#   columns   raw little-endian arrays, each 8-byte aligned; header
+#             offsets are relative to the first column
+# A store is rebuilt whenever its source GeoJSON's size or mtime changes.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(SCRIPT_DIR, "data", "host_store")
+MAGIC = b"HOSTST01"
+STORE_VERSION = 1
+ALIGN = 8
+NO_DATE = -2**31 # observed_on missing or unparseable
+
+def source_fingerprint(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def date_to_days(value):
+    """Days since 1970-01-01 for an ISO date string, NO_DATE otherwise."""
+    try:
+        return (date.fromisoformat(value[:10]) - date(1970, 1, 1)).days
+    except (TypeError, ValueError):
+        return NO_DATE
+
+def days_to_date(days):
+    if days == NO_DATE:
+        return None
+    return date.fromordinal(date(1970, 1, 1).toordinal() + int(days)).isoformat()
+
+def build_store(source_path, store_path):
+    """Converts a host GeoJSON FeatureCollection into a columnar store file."""
+    with open(source_path, "r") as f:
+        features = json.load(f)["features"]
+    count = len(features)
+    columns = {
+        "coords": np.array([f["geometry"]["coordinates"][:2] for f in features], dtype="<f8").reshape(count, 2),
+        "id": np.array([f["properties"].get("id") or 0 for f in features], dtype="<i8"),
+        "observed_on": np.array([date_to_days(f["properties"].get("observed_on")) for f in features], dtype="<i4")
+    }
+
+    header = {"version": STORE_VERSION, "count": count, "source": source_fingerprint(source_path), "columns": {}}
+    offset = 0
+    for name, array in columns.items():
+        header["columns"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes + -array.nbytes % ALIGN
+    header_bytes = json.dumps(header).encode()
+    prefix = MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes
+
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    # Worker processes may rebuild the same store at once; each writes its own temp file
+    tmp_path = f"{store_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(prefix + b"\0" * (-len(prefix) % ALIGN))
+        for array in columns.values():
+            f.write(array.tobytes() + b"\0" * (-array.nbytes % ALIGN))
+    os.replace(tmp_path, store_path)
+    return header
+
+def read_header(store_path):
+    with open(store_path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{store_path} is not a host store")
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length))
+    prefix = len(MAGIC) + 4 + length
+    header["data_offset"] = prefix + -prefix % ALIGN
+    return header
+
+def open_store(store_path, header=None):
+    """Memory-maps every column of a store; returns {column: array}."""
+    header = header or read_header(store_path)
+    columns = {}
+    for name, column in header["columns"].items():
+        if not header["count"]:
+            columns[name] = np.zeros(column["shape"], dtype=column["dtype"])
+            continue
+        mapped = np.memmap(store_path, dtype=column["dtype"], mode="r",
+                           offset=header["data_offset"] + column["offset"], shape=tuple(column["shape"]))
+        columns[name] = np.asarray(mapped)
+    return columns
+
+def load_store(source_path, store_dir=STORE_DIR):
+    """Opens the store for a host GeoJSON file, rebuilding it first if stale."""
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    store_path = os.path.join(store_dir, f"{name}.bin")
+    try:
+        header = read_header(store_path)
+        if header["version"] != STORE_VERSION or header["source"] != source_fingerprint(source_path):
+            header = None
+    except (FileNotFoundError, ValueError, struct.error):
+        header = None
+    if header is None:
+        build_store(source_path, store_path)
+        header = read_header(store_path)
+    return open_store(store_path, header)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build host stores and compare load time against GeoJSON parsing.")
+    parser.add_argument("sources", nargs="*", help="host GeoJSON files (default: every file in the hosts dir)")
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    args = parser.parse_args()
+
+    host_dir = os.path.join(SCRIPT_DIR, "../client/public/data/hosts")
+    sources = args.sources or sorted(
+        os.path.join(host_dir, name) for name in os.listdir(host_dir) if name.endswith(".json")
+    )
+    for path in sources:
+        load_store(path, args.store_dir) # Build or refresh
+
+        started = time.perf_counter()
+        with open(path, "r") as f:
+            coords = [feature["geometry"]["coordinates"] for feature in json.load(f)["features"]]
+        parse_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        columns = load_store(path, args.store_dir)
+        store_ms = (time.perf_counter() - started) * 1000
+
+        match = np.array_equal(columns["coords"], np.asarray(coords, dtype=float).reshape(-1, 2))
+        print(f"{os.path.basename(path)}: {len(coords)} points, GeoJSON {parse_ms:.1f} ms, "
+              f"store {store_ms:.2f} ms, coords {'match' if match else 'DIFFER'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+
+import requests
+
+from fetch_env_data import AOI_BOUNDS
+
+# Load test for hotspot_server.py. Fires random radius queries across the
+# AOI from several threads and reports throughput and latency percentiles.
+# Without --url it starts a local instance on a free port first.
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def run_load(url, requests_total, concurrency, radius_miles, public_only, seed=0):
+    latencies = []
+    server_ms = []
+    errors = [0]
+    lock = threading.Lock()
+    per_thread = requests_total // concurrency
+
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        session = requests.Session()
+        for _ in range(per_thread):
+            params = {
+                "lat": rng.uniform(AOI_BOUNDS["south"], AOI_BOUNDS["north"]),
+                "lng": rng.uniform(AOI_BOUNDS["west"], AOI_BOUNDS["east"]),
+                "radius_miles": radius_miles,
+                "public_only": int(public_only)
+            }
+            started = time.perf_counter()
+            try:
+                response = session.get(url, params=params, timeout=10)
+                response.raise_for_status()
+                took = response.json()["took_ms"]
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                server_ms.append(took)
+        session.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3)
+        } if latencies else None,
+        "server_ms_mean": round(statistics.mean(server_ms), 3) if server_ms else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the hotspot query service.")
+    parser.add_argument("--url", help="hotspots endpoint (default: start a local instance)")
+    parser.add_argument("--layers-dir", help="layers dir for the local instance")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--radius-miles", type=float, default=10)
+    parser.add_argument("--public-only", action="store_true")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        from hotspot_server import make_server, LAYERS_DIR
+        server, _ = make_server(port=0, layers_dir=args.layers_dir or LAYERS_DIR, reload_interval=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/hotspots"
+        print(f"Started local hotspot service at {url}")
+
+    report = run_load(url, args.requests, args.concurrency, args.radius_miles, args.public_only)
+    print(json.dumps(report, indent=2))
+    if server:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from geo_utils import haversine_array
+from host_index import HostIndex
+from land_index import PublicLandIndex
+
+# Local hotspot query service behind the HotspotFinder widget. Answers
+# "top-N hotspots within R miles of (lat, lng), optionally public only"
+# from an in-memory grid index over every scored point in the layer files.
+# Layers are reloaded automatically whenever the generator rewrites them.
+#
+#   GET /hotspots?lat=38.57&lng=-123.33&radius_miles=10&public_only=1&limit=10&layer=golden-chanterelle
+#   GET /health
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LAYERS_DIR = os.path.join(SCRIPT_DIR, "../client/public/data/layers")
+PUBLIC_LANDS_FILE = "public-lands.json"
+
+DEFAULT_PORT = 8765
+RELOAD_INTERVAL_SECONDS = 2.0
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 500
+MAX_RADIUS_MILES = 100
+KM_PER_MILE = 1.609344
+INDEX_CELL_SIZE_DEG = 0.1
+
+def layer_mtimes(layers_dir):
+    return {
+        name: os.path.getmtime(os.path.join(layers_dir, name))
+        for name in os.listdir(layers_dir)
+        if name.endswith(".json")
+    }
+
+class LayerSnapshot:
+    """Query-ready, read-only view of the layer files at one point in time."""
+
+    def __init__(self, layers_dir):
+        self.mtimes = layer_mtimes(layers_dir)
+        self.lands = PublicLandIndex.load(os.path.join(layers_dir, PUBLIC_LANDS_FILE))
+        self.layers = {}
+        rows = {}
+        for name in sorted(self.mtimes):
+            if name == PUBLIC_LANDS_FILE:
+                continue
+            layer = name[:-len(".json")]
+            with open(os.path.join(layers_dir, name), "r") as f:
+                features = json.load(f)["features"]
+            coords = [f["geometry"]["coordinates"] for f in features]
+            rows[layer] = [[c[0], c[1], i] for i, c in enumerate(coords)]
+            # Layers written by generate_probability carry their public land
+            # tag; older ones are tagged once per load, not per request
+            public_land = [f["properties"]["public_land"] if "public_land" in f["properties"]
+                           else self.lands.find_name(c[0], c[1]) for f, c in zip(features, coords)]
+            self.layers[layer] = {
+                "lng": np.array([c[0] for c in coords], dtype=float),
+                "lat": np.array([c[1] for c in coords], dtype=float),
+                "intensity": np.array([f["properties"].get("intensity", 1.0) for f in features], dtype=float),
+                "location": [f["properties"].get("location") for f in features],
+                "public_land": public_land,
+                "is_public": np.array([bool(name) for name in public_land], dtype=bool)
+            }
+        self.index = HostIndex(rows, cell_size=INDEX_CELL_SIZE_DEG)
+        self.index.warm()
+        self.loaded_at = time.time()
+
+    def query(self, lat, lng, radius_miles, public_only=False, limit=DEFAULT_LIMIT, layers=None):
+        radius_km = radius_miles * KM_PER_MILE
+        layer_names, found_layer, found_idx, found_dist, found_intensity = [], [], [], [], []
+        for layer in layers or self.layers:
+            if layer not in self.layers:
+                continue
+            candidates = self.index.candidate_array(layer, lng, lat, radius_km)
+            if candidates is None:
+                continue
+            dist = haversine_array(lng, lat, candidates[:, 0], candidates[:, 1])
+            keep = dist < radius_km
+            idx = candidates[:, 2].astype(np.intp)
+            if public_only:
+                keep &= self.layers[layer]["is_public"][idx]
+            found_layer.append(np.full(keep.sum(), len(layer_names)))
+            found_idx.append(idx[keep])
+            found_dist.append(dist[keep])
+            found_intensity.append(self.layers[layer]["intensity"][idx[keep]])
+            layer_names.append(layer)
+        if not sum(len(idx) for idx in found_idx):
+            return []
+
+        found_layer = np.concatenate(found_layer)
+        found_idx = np.concatenate(found_idx)
+        found_dist = np.concatenate(found_dist)
+        intensity = np.concatenate(found_intensity)
+        # Highest intensity first, nearest first among ties
+        order = np.lexsort((found_dist, -intensity))[:limit]
+        results = []
+        for k in order:
+            layer, i, d = layer_names[found_layer[k]], found_idx[k], found_dist[k]
+            data = self.layers[layer]
+            results.append({
+                "layer": layer,
+                "lat": float(data["lat"][i]),
+                "lng": float(data["lng"][i]),
+                "intensity": float(data["intensity"][i]),
+                "distance_miles": round(float(d) / KM_PER_MILE, 2),
+                "location": data["location"][i],
+                "public_land": data["public_land"][i]
+            })
+        return results
+
+class HotspotService:
+    """Holds the current snapshot and swaps in a new one when layers change."""
+
+    def __init__(self, layers_dir=LAYERS_DIR, reload_interval=RELOAD_INTERVAL_SECONDS):
+        self.layers_dir = layers_dir
+        self.reload_interval = reload_interval
+        self.snapshot = LayerSnapshot(layers_dir)
+        self.reloads = 0
+        self._stop = threading.Event()
+        if reload_interval:
+            threading.Thread(target=self._watch, daemon=True).start()
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            self.reload_if_changed()
+
+    def reload_if_changed(self):
+        try:
+            if layer_mtimes(self.layers_dir) == self.snapshot.mtimes:
+                return False
+            # Build fully before swapping so queries never see a partial index
+            snapshot = LayerSnapshot(self.layers_dir)
+        except (OSError, ValueError, KeyError) as e:
+            # Most likely a layer caught mid-write; retry on the next poll
+            print(f"Layer reload skipped: {e}")
+            return False
+        self.snapshot = snapshot
+        self.reloads += 1
+        print(f"Reloaded {len(snapshot.layers)} layers")
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+class HotspotHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        snapshot = self.service.snapshot
+
+        if url.path == "/health":
+            self._send_json(200, {
+                "layers": {name: len(data["intensity"]) for name, data in snapshot.layers.items()},
+                "public_lands": len(snapshot.lands.features),
+                "loaded_at": snapshot.loaded_at,
+                "reloads": self.service.reloads
+            })
+            return
+        if url.path != "/hotspots":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        try:
+            lat = float(query["lat"][0])
+            lng = float(query["lng"][0])
+            radius = min(float(query.get("radius_miles", ["10"])[0]), MAX_RADIUS_MILES)
+            limit = min(int(query.get("limit", [str(DEFAULT_LIMIT)])[0]), MAX_LIMIT)
+        except (KeyError, ValueError):
+            self._send_json(400, {"error": "lat and lng are required numbers"})
+            return
+        public_only = query.get("public_only", ["0"])[0].lower() in ("1", "true", "yes")
+        layers = query.get("layer") or None
+
+        started = time.perf_counter()
+        results = snapshot.query(lat, lng, radius, public_only, limit, layers)
+        self._send_json(200, {
+            "results": results,
+            "took_ms": round((time.perf_counter() - started) * 1000, 3)
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, layers_dir=LAYERS_DIR, reload_interval=RELOAD_INTERVAL_SECONDS):
+    service = HotspotService(layers_dir, reload_interval)
+    handler = type("Handler", (HotspotHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler), service
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve hotspot radius queries over the generated layers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--layers-dir", default=LAYERS_DIR)
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL_SECONDS,
+                        help="seconds between layer change checks (0 disables hot reload)")
+    args = parser.parse_args()
+
+    server, service = make_server(args.host, args.port, args.layers_dir, args.reload_interval)
+    print(f"Hotspot service on http://{args.host}:{server.server_address[1]}/hotspots "
+          f"({len(service.snapshot.layers)} layers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+
+from geo_utils import point_in_polygon, polygon_rings
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_LANDS_PATH = os.path.join(SCRIPT_DIR, "../client/public/data/layers/public-lands.json")
+
+STR_NODE_CAPACITY = 16
+BATCH_POINTS = 50_000 # find_names works through points in blocks this size
+
+def ranges(starts, counts):
+    """Concatenation of arange(start, start + count) for each pair, as one array."""
+    counts = np.asarray(counts, dtype=np.intp)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(np.asarray(starts, dtype=np.intp), counts) + offsets
+
+def file_source(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+class STRTree:
+    """
+    Packed R-tree over (west, south, east, north) boxes, bulk-loaded with
+    Sort-Tile-Recursive: boxes are sorted into vertical slices by center
+    x, then by center y within each slice, and packed node_capacity to a
+    leaf. Upper levels pack consecutive nodes the same way. Queries run
+    level by level for whole arrays of points at once.
+    """
+
+    def __init__(self, boxes, node_capacity=STR_NODE_CAPACITY):
+        self.capacity = node_capacity
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        self.order = self._str_order(boxes)
+        self.boxes = boxes[self.order] # In tree order
+        self.levels = [] # Node boxes per level, leaves first, root level last
+        level = self.boxes
+        while len(level) > 1 or not self.levels:
+            level = self._pack(level)
+            self.levels.append(level)
+        # Plain lists of the same boxes, root level first, for single-point walks
+        self._walk_levels = [node_boxes.tolist() for node_boxes in reversed(self.levels)] + [self.boxes.tolist()]
+
+    def _str_order(self, boxes):
+        count = len(boxes)
+        if count == 0:
+            return np.zeros(0, dtype=np.intp)
+        slices = int(math.ceil(math.sqrt(math.ceil(count / self.capacity))))
+        per_slice = slices * self.capacity
+        cx = (boxes[:, 0] + boxes[:, 2]) / 2
+        cy = (boxes[:, 1] + boxes[:, 3]) / 2
+        by_x = np.argsort(cx, kind="stable")
+        parts = []
+        for start in range(0, count, per_slice):
+            part = by_x[start:start + per_slice]
+            parts.append(part[np.argsort(cy[part], kind="stable")])
+        return np.concatenate(parts)
+
+    def _pack(self, boxes):
+        """Bounding boxes of consecutive groups of capacity boxes."""
+        count = len(boxes)
+        groups = -(-count // self.capacity) if count else 0
+        padded = np.full((groups * self.capacity, 4), np.nan)
+        padded[:count] = boxes
+        padded = padded.reshape(groups, self.capacity, 4)
+        return np.stack([
+            np.nanmin(padded[:, :, 0], axis=1), np.nanmin(padded[:, :, 1], axis=1),
+            np.nanmax(padded[:, :, 2], axis=1), np.nanmax(padded[:, :, 3], axis=1)
+        ], axis=1) if groups else np.zeros((0, 4))
+
+    def query_point(self, lng, lat):
+        """Indices of the boxes containing one point, without array overhead."""
+        nodes = [i for i, (w, s, e, n) in enumerate(self._walk_levels[0]) if w <= lng <= e and s <= lat <= n]
+        for boxes in self._walk_levels[1:]:
+            children = []
+            for node in nodes:
+                for child in range(node * self.capacity, min((node + 1) * self.capacity, len(boxes))):
+                    w, s, e, n = boxes[child]
+                    if w <= lng <= e and s <= lat <= n:
+                        children.append(child)
+            nodes = children
+        return [int(self.order[node]) for node in nodes]
+
+    def query_points(self, lngs, lats):
+        """(point index, box index) pairs for every box containing a point."""
+        lngs = np.asarray(lngs, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+
+        def contained(points, boxes):
+            return (boxes[:, 0] <= lngs[points]) & (lngs[points] <= boxes[:, 2]) & \
+                   (boxes[:, 1] <= lats[points]) & (lats[points] <= boxes[:, 3])
+
+        top = self.levels[-1]
+        points = np.repeat(np.arange(len(lngs)), len(top))
+        nodes = np.tile(np.arange(len(top)), len(lngs))
+        keep = contained(points, top[nodes])
+        points, nodes = points[keep], nodes[keep]
+        # Walk down: each surviving node expands into its children; level -1 is the boxes themselves
+        for level in range(len(self.levels) - 2, -2, -1):
+            boxes = self.levels[level] if level >= 0 else self.boxes
+            children = (nodes[:, None] * self.capacity + np.arange(self.capacity)).ravel()
+            points = np.repeat(points, self.capacity)
+            keep = children < len(boxes)
+            points, nodes = points[keep], children[keep]
+            keep = contained(points, boxes[nodes])
+            points, nodes = points[keep], nodes[keep]
+        return points, self.order[nodes]
+
+class PublicLandIndex:
+    """
+    Public land polygons indexed by an STRTree of their bounding boxes. A
+    lookup only runs the ray casting test against polygons whose bbox
+    contains the point. Like checkPublicLand on the client, only outer
+    rings are considered.
+    """
+
+    def __init__(self, geojson, fingerprint=None, source=None):
+        self.features = []
+        self.rings = []
+        boxes = []
+        for feature in geojson.get("features", []):
+            rings = polygon_rings(feature["geometry"])
+            if not rings:
+                continue
+            lngs = [c[0] for ring in rings for c in ring]
+            lats = [c[1] for ring in rings for c in ring]
+            self.features.append(feature)
+            self.rings.append(rings)
+            boxes.append((min(lngs), min(lats), max(lngs), max(lats)))
+        self.boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        self.tree = STRTree(self.boxes)
+        self.fingerprint = fingerprint
+        self.source = source # (path, size, mtime) of the file it was loaded from
+
+        # Every ring's vertices in one array for batch tests; rings of a
+        # polygon are consecutive, and each vertex knows its predecessor
+        ring_lengths = [len(ring) for rings in self.rings for ring in rings]
+        self.ring_counts = np.array([len(rings) for rings in self.rings], dtype=np.intp)
+        self.ring_firsts = np.cumsum(self.ring_counts) - self.ring_counts
+        self.ring_polygon = np.repeat(np.arange(len(self.rings)), self.ring_counts)
+        self.ring_lengths = np.array(ring_lengths, dtype=np.intp)
+        self.ring_starts = np.cumsum(self.ring_lengths) - self.ring_lengths
+        self.vertices = np.array([c[:2] for rings in self.rings for ring in rings for c in ring],
+                                 dtype=float).reshape(-1, 2)
+        self.previous = np.arange(len(self.vertices)) - 1
+        self.previous[self.ring_starts[self.ring_lengths > 0]] += self.ring_lengths[self.ring_lengths > 0]
+
+    @classmethod
+    def load(cls, path=PUBLIC_LANDS_PATH):
+        """Index of the GeoJSON at path; fingerprint is the file's sha256."""
+        try:
+            source = file_source(path)
+            with open(path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            print(f"Warning: {path} not found.")
+            return cls({"features": []})
+        return cls(json.loads(raw), hashlib.sha256(raw).hexdigest(), source)
+
+    def is_current(self, path):
+        """Whether the file at path is still the one this index was loaded from."""
+        try:
+            return self.source is not None and self.source == file_source(path)
+        except FileNotFoundError:
+            return False
+
+    def candidates(self, lng, lat):
+        """Indices of the polygons whose bbox contains the point, in file order."""
+        return sorted(self.tree.query_point(lng, lat))
+
+    def find(self, lng, lat):
+        """Feature of the public land containing the point, or None."""
+        for i in self.candidates(lng, lat):
+            if any(point_in_polygon([lng, lat], ring) for ring in self.rings[i]):
+                return self.features[i]
+        return None
+
+    def find_name(self, lng, lat):
+        feature = self.find(lng, lat)
+        return feature["properties"].get("name") if feature else None
+
+    def find_names(self, lngs, lats):
+        """
+        find_name for arrays of points. Candidate (point, polygon) pairs
+        from the STR-tree are expanded to every ring edge and ray cast as one
+        array, with the same arithmetic as point_in_polygon.
+        """
+        lngs = np.asarray(lngs, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        none = len(self.features)
+        found = np.full(len(lngs), none)
+        for block in range(0, len(lngs), BATCH_POINTS):
+            points, polygons = self.tree.query_points(lngs[block:block + BATCH_POINTS], lats[block:block + BATCH_POINTS])
+            points += block
+            # (point, ring) pairs, then (pair, edge) rows
+            pair_points = np.repeat(points, self.ring_counts[polygons])
+            pair_rings = ranges(self.ring_firsts[polygons], self.ring_counts[polygons])
+            edge_pairs = np.repeat(np.arange(len(pair_rings)), self.ring_lengths[pair_rings])
+            edges = ranges(self.ring_starts[pair_rings], self.ring_lengths[pair_rings])
+            xi, yi = self.vertices[edges].T
+            xj, yj = self.vertices[self.previous[edges]].T
+            x, y = lngs[pair_points[edge_pairs]], lats[pair_points[edge_pairs]]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                crossings = ((yi > y) != (yj > y)) & (x < (xj - xi) * (y - yi) / (yj - yi) + xi)
+            inside = np.bincount(edge_pairs, weights=crossings, minlength=len(pair_rings)) % 2 == 1
+            # The first polygon in file order wins, as in find()
+            np.minimum.at(found, pair_points[inside], self.ring_polygon[pair_rings[inside]])
+        return [self.features[i]["properties"].get("name") if i < none else None for i in found]
@@ -0,0 +1,432 @@
+import argparse
+import array
+import gc
+import glob
+import gzip
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import publish
+
+try:
+    import brotli
+except ImportError: # Optional: without it no .br siblings are written
+    brotli = None
+
+# Streaming writer for the guild point layers. Features are written as
+# they come, to temp files that close() publishes atomically, so a layer
+# never has to be held in memory as one FeatureCollection. Alongside the
+# GeoJSON it can write:
+#
+#   <layer>.bin        a compact binary encoding (below)
+#   <file>.gz, .br     precompressed copies of each file for static serving
+#                      (gzip_static / brotli_static); .br needs the brotli
+#                      module
+#
+# Binary layer format, columnar in the spirit of Geobuf and FlatGeobuf:
+# the magic bytes, a format version byte, a little-endian uint32 header
+# length and a JSON header, then one little-endian array per column:
+#   {"precision": 5, "scale": 100, "count": 1234,
+#    "properties": [["intensity", "number"], ["factors", ["weather", ...]],
+#                   ["location", "string"], ["public_land", "string"]],
+#    "strings": ["Salt Point State Park", ...],
+#    "columns": ["<i4", "<i4", "<i2", ...]}
+# The columns are, in order: longitude and latitude as deltas from the
+# previous feature of the coordinates times 10^precision; each "number"
+# property, and each member of a group, times scale; and for each "string"
+# property, 0 for null or k for strings[k - 1]. Every column is stored in
+# the narrowest integer type its values fit, listed in "columns", so it
+# loads with one numpy.frombuffer. Repeated location and public land names
+# are stored once per layer. Values on the layers are already rounded to
+# two decimals, so scale 100 keeps them exactly; coordinates are rounded
+# to the precision.
+#
+# The schema is taken from the first feature. Features are reduced to
+# integer columns as they are added and the file is laid out on close, so
+# a layer's binary costs a few bytes per feature to hold, not a dict.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LAYERS_DIR = os.path.join(SCRIPT_DIR, "../client/public/data/layers")
+SKIP_LAYERS = ["public-lands.json"] # Polygons, not a guild layer
+
+BINARY_MAGIC = b"MLYR"
+BINARY_VERSION = 1
+BINARY_EXT = ".bin"
+BINARY_PRECISION = 6 # ~0.1 m; used when no coordinate precision is given
+VALUE_SCALE = 100
+COLUMN_TYPES = ["<i1", "<i2", "<i4", "<i8"]
+COMPRESSED_EXTS = [".gz", ".br"]
+GZIP_LEVEL = 6 # 9 takes ~4x as long for ~7% less on layer GeoJSON
+BROTLI_QUALITY = 11
+FLUSH_BYTES = 1 << 16
+
+def property_schema(properties):
+    """Binary schema for a feature's properties: numbers, groups of numbers and strings."""
+    schema = []
+    for key, value in properties.items():
+        if isinstance(value, dict):
+            schema.append([key, list(value)])
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            schema.append([key, "number"])
+        elif value is None or isinstance(value, str):
+            schema.append([key, "string"])
+        else:
+            raise ValueError(f"can't encode property {key!r} of type {type(value).__name__}")
+    return schema
+
+def column_type(values):
+    """Narrowest COLUMN_TYPES entry holding every value."""
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for dtype in COLUMN_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    raise ValueError("binary layer value out of range")
+
+class BinaryEncoder:
+    """Collects features as integer columns; encode() lays out the binary layer."""
+
+    def __init__(self, precision=BINARY_PRECISION, scale=VALUE_SCALE):
+        self.precision = precision
+        self.factor = 10 ** precision
+        self.scale = scale
+        self.schema = None
+        self.columns = None
+        self.strings = {}
+        self.count = 0
+        self.last = (0, 0)
+
+    def add(self, feature):
+        properties = feature["properties"]
+        if self.schema is None:
+            self.schema = property_schema(properties)
+            width = 2 + sum(1 if isinstance(kind, str) else len(kind) for _, kind in self.schema)
+            self.columns = [array.array("q") for _ in range(width)]
+        lng, lat = feature["geometry"]["coordinates"][:2]
+        x, y = round(lng * self.factor), round(lat * self.factor)
+        row = [x - self.last[0], y - self.last[1]]
+        self.last = (x, y)
+        for key, kind in self.schema:
+            value = properties[key]
+            if kind == "number":
+                row.append(round(value * self.scale))
+            elif kind == "string":
+                row.append(0 if value is None else self.strings.setdefault(value, len(self.strings) + 1))
+            else:
+                row.extend(round(value[name] * self.scale) for name in kind)
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        self.count += 1
+
+    def encode(self):
+        columns = [np.frombuffer(column, dtype=np.int64) for column in self.columns or []]
+        types = [column_type(column) for column in columns]
+        header = json.dumps({
+            "precision": self.precision, "scale": self.scale, "count": self.count,
+            "properties": self.schema or [], "strings": list(self.strings), "columns": types
+        }).encode()
+        parts = [BINARY_MAGIC, bytes([BINARY_VERSION]), len(header).to_bytes(4, "little"), header]
+        parts.extend(column.astype(dtype).tobytes() for column, dtype in zip(columns, types))
+        return b"".join(parts)
+
+def decode_columns(data):
+    """(header, [column arrays]) of a binary layer, coordinates already summed and scaled."""
+    if data[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+        raise ValueError("not a binary layer")
+    pos = len(BINARY_MAGIC)
+    if data[pos] != BINARY_VERSION:
+        raise ValueError(f"unsupported binary layer version {data[pos]}")
+    length = int.from_bytes(data[pos + 1:pos + 5], "little")
+    pos += 5
+    header = json.loads(data[pos:pos + length])
+    pos += length
+    columns = []
+    for dtype in header["columns"]:
+        column = np.frombuffer(data, dtype=dtype, count=header["count"], offset=pos)
+        pos += column.nbytes
+        columns.append(column)
+    if columns:
+        factor = 10 ** header["precision"]
+        columns[0] = np.cumsum(columns[0], dtype=np.int64) / factor
+        columns[1] = np.cumsum(columns[1], dtype=np.int64) / factor
+    return header, columns
+
+def decode_binary(data):
+    """FeatureCollection for a binary layer's bytes, matching the GeoJSON written with it."""
+    header, columns = decode_columns(data)
+    if not columns:
+        return {"type": "FeatureCollection", "features": []}
+    scale = header["scale"]
+    names = [None] + header["strings"]
+    values = []
+    at = 2
+    for key, kind in header["properties"]:
+        if kind == "number":
+            values.append((columns[at] / scale).tolist())
+            at += 1
+        elif kind == "string":
+            values.append([names[ref] for ref in columns[at].tolist()])
+            at += 1
+        else:
+            group = [(columns[at + j] / scale).tolist() for j in range(len(kind))]
+            values.append([dict(zip(kind, row)) for row in zip(*group)])
+            at += len(kind)
+    keys = [key for key, _ in header["properties"]]
+    return {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lng, lat]},
+         "properties": dict(zip(keys, row))}
+        for lng, lat, *row in zip(columns[0].tolist(), columns[1].tolist(), *values)
+    ]}
+
+class _Output:
+    """One output file and its compressed siblings, all written to temp files until commit()."""
+
+    def __init__(self, path, compress):
+        self.path = path
+        self.file = publish.AtomicFile(path)
+        self.siblings = []
+        if compress:
+            self.gzip_file = publish.AtomicFile(path + ".gz")
+            self.gzip = gzip.GzipFile(filename="", mode="wb", fileobj=self.gzip_file, compresslevel=GZIP_LEVEL, mtime=0)
+            self.siblings.append(self.gzip_file)
+        else:
+            self.gzip = None
+        if compress and brotli is not None:
+            self.brotli_file = publish.AtomicFile(path + ".br")
+            self.brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.siblings.append(self.brotli_file)
+        else:
+            self.brotli = None
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= FLUSH_BYTES:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        self.file.write(data)
+        if self.gzip is not None:
+            self.gzip.write(data)
+        if self.brotli is not None:
+            self.brotli_file.write(self.brotli.process(data))
+
+    def commit(self):
+        """Publishes the compressed copies, then the file itself; returns their paths."""
+        self.flush()
+        if self.gzip is not None:
+            self.gzip.close()
+        if self.brotli is not None:
+            self.brotli_file.write(self.brotli.finish())
+        for sibling in self.siblings:
+            sibling.commit()
+        self.file.commit()
+        return [sibling.path for sibling in self.siblings] + [self.path]
+
+    def discard(self):
+        for atomic in [self.file] + self.siblings:
+            atomic.discard()
+
+class LayerWriter:
+    """
+    Streams point features into a GeoJSON FeatureCollection at path and,
+    with binary, into the binary encoding next to it; compress adds .gz
+    (and .br) copies of each. precision rounds GeoJSON coordinates to that
+    many decimals, and sets the binary precision. Nothing is visible until
+    close(), which also removes siblings this writer didn't produce, so a
+    stale .gz never outlives its layer. Usable as a context manager.
+    """
+
+    def __init__(self, path, precision=None, binary=False, compress=False):
+        self.path = path
+        self.precision = precision
+        self.count = 0
+        self.paths = [] # Files written or removed, set by close()
+        self.json = _Output(path, compress)
+        self.json.write(b'{"type": "FeatureCollection", "features": [')
+        self.binary = None
+        if binary:
+            self.binary = _Output(os.path.splitext(path)[0] + BINARY_EXT, compress)
+            self.encoder = BinaryEncoder(BINARY_PRECISION if precision is None else precision)
+
+    def add(self, feature):
+        if self.precision is not None:
+            lng, lat = feature["geometry"]["coordinates"][:2]
+            geojson_feature = dict(feature, geometry={
+                "type": "Point", "coordinates": [round(lng, self.precision), round(lat, self.precision)]
+            })
+        else:
+            geojson_feature = feature
+        self.json.write(((", " if self.count else "") + json.dumps(geojson_feature)).encode())
+        if self.binary is not None:
+            self.encoder.add(feature)
+        self.count += 1
+
+    def close(self):
+        """Publishes every file; returns the paths written or removed, for publish.record."""
+        self.json.write(b"]}")
+        written = []
+        if self.binary is not None:
+            self.binary.write(self.encoder.encode())
+            written = self.binary.commit()
+        written += self.json.commit()
+        stem = os.path.splitext(self.path)[0]
+        candidates = [self.path + ext for ext in COMPRESSED_EXTS] + \
+                     [stem + BINARY_EXT + ext for ext in [""] + COMPRESSED_EXTS]
+        removed = [path for path in candidates if path not in written and os.path.exists(path)]
+        for path in removed:
+            os.remove(path)
+        self.paths = written + removed
+        return self.paths
+
+    def abort(self):
+        self.json.discard()
+        if self.binary is not None:
+            self.binary.discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+def write_layer(path, features, precision=None, binary=False, compress=False):
+    """Writes an iterable of features with a LayerWriter; returns (feature count, paths)."""
+    with LayerWriter(path, precision, binary, compress) as writer:
+        for feature in features:
+            writer.add(feature)
+    return writer.count, writer.paths
+
+def synthetic_layer(count, seed=0):
+    """make_feature-shaped features at count points spread over a few hundred named locations."""
+    from fetch_env_data import AOI_BOUNDS
+    rng = random.Random(seed)
+    places = [(f"Synthetic Place {i}", rng.uniform(AOI_BOUNDS["south"], AOI_BOUNDS["north"]),
+               rng.uniform(AOI_BOUNDS["west"], AOI_BOUNDS["east"])) for i in range(max(1, count // 50))]
+    lands = [None, None, "Synthetic State Forest", "Synthetic National Forest"]
+    features = []
+    for _ in range(count):
+        name, lat, lng = rng.choice(places)
+        factors = {"weather": rng.uniform(0.5, 2), "host": rng.choice([0.8, 1.2, 1.5]), "season": 1.2,
+                   "aspect": rng.choice([0.7, 1.0, 1.3]), "habitat": 1.0}
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lng + rng.gauss(0, 0.01), lat + rng.gauss(0, 0.01)]},
+            "properties": {
+                "intensity": round(rng.uniform(0.1, 5.0), 2),
+                "factors": {key: round(value, 2) for key, value in factors.items()},
+                "location": name,
+                "public_land": rng.choice(lands)
+            }
+        })
+    return features
+
+def timed(fn, repeat):
+    """(best seconds, result) of repeat calls, with garbage collection off as timeit does."""
+    best, result = None, None
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        gc.enable()
+    return best, result
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def compare_layer(name, features, precision, repeat, work_dir):
+    """Prints sizes and timings of each encoding of features; returns whether the binary round trip matched."""
+    plain = os.path.join(work_dir, "plain", f"{name}.json")
+    packed = os.path.join(work_dir, "packed", f"{name}.json")
+    write_plain, _ = timed(lambda: write_layer(plain, features, compress=True), repeat)
+    write_packed, _ = timed(lambda: write_layer(packed, features, precision, binary=True, compress=True), repeat)
+    packed_bin = os.path.splitext(packed)[0] + BINARY_EXT
+
+    base = os.path.getsize(plain)
+    print(f"{name}: {len(features)} features; wrote plain in {write_plain * 1000:.1f} ms, "
+          f"with --coord-precision {precision} --binary-layers in {write_packed * 1000:.1f} ms")
+    print(f"  {'encoding':<24}{'raw':>20}{'.gz':>20}{'.br':>20}   decode raw / .gz")
+    for label, path, decode in [("geojson", plain, json.loads),
+                                (f"geojson, {precision} digits", packed, json.loads),
+                                (f"binary, {precision} digits", packed_bin, decode_binary)]:
+        sizes = []
+        for ext in [""] + COMPRESSED_EXTS:
+            if os.path.exists(path + ext):
+                size = os.path.getsize(path + ext)
+                sizes.append(f"{size:,} ({size / base:.0%})")
+            else:
+                sizes.append("-")
+        data, compressed = read_bytes(path), read_bytes(path + ".gz")
+        decode_raw, _ = timed(lambda: decode(data), repeat)
+        decode_gz, _ = timed(lambda: decode(gzip.decompress(compressed)), repeat)
+        print(f"  {label:<24}" + "".join(f"{size:>20}" for size in sizes)
+              + f"   {decode_raw * 1000:.1f} / {decode_gz * 1000:.1f} ms")
+    data = read_bytes(packed_bin)
+    decode_arrays, _ = timed(lambda: decode_columns(data), repeat)
+    print(f"  {'binary as arrays':<24}{'':>60}   {decode_arrays * 1000:.1f} ms")
+
+    # Binary decodes to what the quantized GeoJSON holds, up to float formatting of the coordinates
+    expected = json.loads(read_bytes(packed))["features"]
+    decoded = decode_binary(read_bytes(packed_bin))["features"]
+    tolerance = 0.51 * 10 ** -precision
+    mismatched = sum(
+        1 for a, b in zip(expected, decoded)
+        if a["properties"] != b["properties"] or any(abs(x - y) > tolerance for x, y in
+                                                     zip(a["geometry"]["coordinates"], b["geometry"]["coordinates"]))
+    ) + abs(len(expected) - len(decoded))
+    if mismatched:
+        print(f"  binary round trip: {mismatched} features differ")
+    return not mismatched
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare layer sizes and decode times across encodings.")
+    parser.add_argument("paths", nargs="*", help=f"layer GeoJSON files (default: {LAYERS_DIR}/*.json)")
+    parser.add_argument("--precision", type=int, default=5, help="coordinate decimals for the quantized encodings")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N",
+                        help="also compare a generated layer of N features")
+    parser.add_argument("--repeat", type=int, default=3, help="timings are the best of this many runs")
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(path for path in glob.glob(os.path.join(LAYERS_DIR, "*.json"))
+                                 if os.path.basename(path) not in SKIP_LAYERS)
+    layers = []
+    for path in paths:
+        with open(path, "r") as f:
+            layers.append((os.path.splitext(os.path.basename(path))[0], json.load(f)["features"]))
+    if args.synthetic:
+        layers.append((f"synthetic-{args.synthetic}", synthetic_layer(args.synthetic)))
+    if brotli is None:
+        print("brotli module not installed: no .br sizes")
+
+    work_dir = tempfile.mkdtemp(prefix="layer-encodings-")
+    ok = True
+    try:
+        for name, features in layers:
+            ok = compare_layer(name, features, args.precision, args.repeat, work_dir) and ok
+    finally:
+        shutil.rmtree(work_dir)
+    if not ok:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import argparse
+import ast
+import csv
+import hashlib
+import json
+import os
+import re
+import resource
+import time
+from collections import Counter, defaultdict
+
+# Streaming ingest for guild observation exports (data/gather_guild_data.csv
+# and its multi-GB big siblings). Rows are read one at a time, validated,
+# and reduced to compact Observation records (Subject plus the normalized
+# "Recent Locations" names); every other column is dropped as soon as the
+# row is parsed. Rows that can't be used, and unusable entries dropped from
+# rows that can, are counted by reason with a few example line numbers,
+# instead of being silently skipped or failing the run.
+#
+# "Recent Locations" cells come as JSON lists, Python list literals with
+# either quote style (names like "Orick, CA" or "O'Neill Park" included),
+# or bare comma-separated text.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OBSERVATIONS_PATH = os.path.join(SCRIPT_DIR, "data", "gather_guild_data.csv")
+SUBJECT_COLUMN = "Subject"
+LOCATIONS_COLUMN = "Recent Locations"
+MAX_LOCATION_CHARS = 200 # Longer entries are notes pasted into the wrong column
+MAX_EXAMPLES = 5 # Example line numbers kept per rejection reason
+CHUNK_ROWS = 10_000
+
+WHITESPACE = re.compile(r"\s+")
+# A list of quoted strings without escapes, in either quote style: the
+# common case, split without the cost of json or ast
+QUOTED_ITEM = r"'[^'\\]*'|" + r'"[^"\\]*"'
+QUOTED_ITEMS = re.compile(QUOTED_ITEM)
+QUOTED_LIST = re.compile(rf"\[\s*(?:(?:{QUOTED_ITEM})\s*(?:,\s*|(?=\])))*\]")
+
+class Observation:
+    """One usable row: its line in the file, Subject and location names."""
+
+    __slots__ = ("line", "subject", "locations")
+
+    def __init__(self, line, subject, locations):
+        self.line = line
+        self.subject = subject
+        self.locations = locations
+
+    def key(self):
+        """What the layers are built from, for digests."""
+        return [self.subject, list(self.locations)]
+
+class IngestReport:
+    """
+    Counts for one pass over a file: rejected rows and dropped location
+    entries are grouped by reason.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.records = 0
+        self.locations = 0
+        self.unmatched = 0 # Rows for subjects no guild covers; not errors
+        self.rejected = Counter()
+        self.dropped = Counter()
+        self.examples = defaultdict(list)
+
+    def _example(self, reason, line):
+        if len(self.examples[reason]) < MAX_EXAMPLES:
+            self.examples[reason].append(line)
+
+    def reject(self, reason, line):
+        """A row left out entirely."""
+        self.rejected[reason] += 1
+        self._example(reason, line)
+
+    def drop(self, reason, line, count=1):
+        """Location entries left out of a row."""
+        self.dropped[reason] += count
+        self._example(reason, line)
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "records": self.records,
+            "locations": self.locations,
+            "unmatched": self.unmatched,
+            "rejected": dict(self.rejected),
+            "dropped": dict(self.dropped),
+            "examples": {reason: lines for reason, lines in self.examples.items()}
+        }
+
+    def summary(self):
+        text = (f"Observations: {self.rows} rows, {self.records} used ({self.locations} locations), "
+                f"{self.unmatched} for other subjects, {sum(self.rejected.values())} rejected")
+        if self.dropped:
+            text += f", {sum(self.dropped.values())} locations dropped"
+        for reason, count in self.rejected.most_common() + self.dropped.most_common():
+            lines = ", ".join(str(line) for line in self.examples[reason])
+            text += f"\n  {reason}: {count} (e.g. line {lines})"
+        return text
+
+def normalize_location(name):
+    """Trims quotes and brackets left over from loose quoting and collapses whitespace."""
+    return " ".join(str(name).split()).strip("'\"[] ")
+
+def parse_location_list(text):
+    """Location names in a "Recent Locations" cell, in order, without blanks or repeats."""
+    text = (text or "").strip()
+    items = None
+    if QUOTED_LIST.fullmatch(text):
+        items = [item[1:-1] for item in QUOTED_ITEMS.findall(text)]
+    elif text.startswith("["):
+        try:
+            items = json.loads(text)
+        except ValueError:
+            try:
+                items = ast.literal_eval(text)
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                items = None
+        if not isinstance(items, (list, tuple)):
+            items = None
+    if items is None:
+        items = text.strip("[]").split(",")
+    names = [normalize_location(item) for item in items if isinstance(item, (str, int, float))]
+    return tuple(dict.fromkeys(filter(None, names)))
+
+def iter_observations(path, report=None, guilds=None):
+    """
+    Yields an Observation per usable row of the CSV at path, in file order,
+    counting everything else in report. With guilds, rows whose Subject
+    names none of them are counted as unmatched and skipped.
+    """
+    report = report if report is not None else IngestReport()
+    with open(path, "r", newline="", encoding="utf-8", errors="replace") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [name.strip().lstrip("﻿") for name in header]
+        missing = [name for name in (SUBJECT_COLUMN, LOCATIONS_COLUMN) if name not in header]
+        if missing:
+            raise ValueError(f"{path} has no {', '.join(missing)} column")
+        subject_at = header.index(SUBJECT_COLUMN)
+        locations_at = header.index(LOCATIONS_COLUMN)
+        needed = max(subject_at, locations_at) + 1
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error:
+                report.rows += 1
+                report.reject("malformed CSV", reader.line_num)
+                continue
+            if not row:
+                continue
+            report.rows += 1
+            if len(row) < needed:
+                report.reject("missing columns", reader.line_num)
+                continue
+            subject = WHITESPACE.sub(" ", row[subject_at]).strip()
+            if not subject:
+                report.reject("no subject", reader.line_num)
+                continue
+            if guilds is not None and not any(guild in subject for guild in guilds):
+                report.unmatched += 1
+                continue
+            locations = parse_location_list(row[locations_at])
+            kept = tuple(name for name in locations if len(name) <= MAX_LOCATION_CHARS)
+            if len(kept) < len(locations):
+                report.drop("overlong location", reader.line_num, len(locations) - len(kept))
+            if not kept:
+                report.reject("no locations", reader.line_num)
+                continue
+            report.records += 1
+            report.locations += len(kept)
+            yield Observation(reader.line_num, subject, kept)
+
+class ObservationSource:
+    """
+    Re-iterable observations file: every pass streams and validates it
+    again, so nothing but the current row is held. report describes the
+    last complete pass.
+    """
+
+    def __init__(self, path=OBSERVATIONS_PATH, guilds=None):
+        self.path = path
+        self.guilds = guilds
+        self.report = IngestReport()
+        self.exists = os.path.exists(path)
+        if not self.exists:
+            print(f"Warning: {path} not found.")
+
+    def __iter__(self):
+        if not self.exists:
+            return
+        report = IngestReport()
+        yield from iter_observations(self.path, report, self.guilds)
+        self.report = report
+
+    def chunks(self, size=CHUNK_ROWS):
+        """The same records in lists of up to size."""
+        chunk = []
+        for obs in self:
+            chunk.append(obs)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def guild_digests(observations, guilds):
+    """{guild: sha256 of the records naming it}, in one pass."""
+    hashes = {guild: hashlib.sha256() for guild in guilds}
+    for obs in observations:
+        line = None
+        for guild in guilds:
+            if guild in obs.subject:
+                line = line or (json.dumps(obs.key()) + "\n").encode()
+                hashes[guild].update(line)
+    return {guild: h.hexdigest() for guild, h in hashes.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate an observations export and report on its rows.")
+    parser.add_argument("path", nargs="?", default=OBSERVATIONS_PATH)
+    parser.add_argument("--all-subjects", action="store_true", help="keep rows for subjects no guild covers")
+    parser.add_argument("--show", type=int, default=0, metavar="N", help="print the first N records")
+    args = parser.parse_args()
+
+    guilds = None
+    if not args.all_subjects:
+        from generate_probability import GUILDS
+        guilds = GUILDS
+    source = ObservationSource(args.path, guilds)
+    started = time.perf_counter()
+    shown = 0
+    for obs in source:
+        if shown < args.show:
+            print(f"  line {obs.line}: {obs.subject}: {list(obs.locations)}")
+            shown += 1
+    elapsed = time.perf_counter() - started
+    print(source.report.summary())
+    size_mb = os.path.getsize(args.path) / 1e6 if source.exists else 0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{size_mb:.1f} MB in {elapsed:.2f}s ({size_mb / max(elapsed, 1e-9):.1f} MB/s), peak RSS {peak_mb:.0f} MB")
+
+if __name__ == "__main__":
+    main()
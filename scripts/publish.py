@@ -0,0 +1,188 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+# Publishing for everything the web app and hotspot server read from
+# client/public/data. Files are written to a temp file in the same
+# directory and renamed over the old one, so a reader sees either the
+# old file or the new one, never a partial write. The manifest
+# (manifest.json at the data root) lists every published file with its
+# sha256 and the manifest version it last changed in; the version goes
+# up by one whenever any published file changes. Writers in different
+# processes take turns through a lock file next to the manifest.
+#
+# The manifest is committed with the data, so the version carries over from
+# one CI run to the next (the workflow runs publish.py before committing).
+# It holds nothing machine-specific: the size and mtime each file had when
+# it was last hashed go in a local stat cache next to it (not committed),
+# so unchanged files aren't hashed again. A fresh checkout has no cache and
+# hashes everything once; the manifest is only rewritten when some content
+# changed.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_ROOT = os.path.join(SCRIPT_DIR, "../client/public/data")
+MANIFEST_FILE = "manifest.json"
+STAT_CACHE_FILE = ".manifest-stat.json"
+MANIFEST_FORMAT = 1
+FILE_MODE = 0o644 # mkstemp creates files only the owner can read
+
+class AtomicFile:
+    """
+    Binary file written in pieces to a temp file next to path; commit()
+    renames it over path, discard() throws it away.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, data):
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def commit(self):
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            os.chmod(self.tmp_path, FILE_MODE)
+            os.replace(self.tmp_path, self.path)
+        except BaseException:
+            self.discard()
+            raise
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+def write_atomic(path, data):
+    """Replaces the file at path with data (str or bytes) in one rename."""
+    atomic = AtomicFile(path)
+    try:
+        atomic.write(data.encode() if isinstance(data, str) else data)
+    except BaseException:
+        atomic.discard()
+        raise
+    atomic.commit()
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def manifest_path(root=DATA_ROOT):
+    return os.path.join(root, MANIFEST_FILE)
+
+def load_manifest(root=DATA_ROOT):
+    try:
+        with open(manifest_path(root), "r") as f:
+            manifest = json.load(f)
+        if manifest.get("format") == MANIFEST_FORMAT:
+            return manifest
+    except (FileNotFoundError, ValueError):
+        pass
+    return {"format": MANIFEST_FORMAT, "version": 0, "published_at": None, "files": {}}
+
+def stat_cache_path(root=DATA_ROOT):
+    return os.path.join(root, STAT_CACHE_FILE)
+
+def load_stat_cache(root=DATA_ROOT):
+    """{name: [bytes, mtime_ns]} as of each file's last hash; empty when missing."""
+    try:
+        with open(stat_cache_path(root), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+@contextmanager
+def manifest_lock(root=DATA_ROOT):
+    os.makedirs(root, exist_ok=True)
+    with open(manifest_path(root) + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def record(paths, root=DATA_ROOT):
+    """
+    Brings the manifest entries for paths up to date, dropping entries
+    for files that no longer exist. Paths outside root aren't published
+    and are left out. Files whose size and mtime match the stat cache are
+    not hashed again. Returns the manifest version.
+    """
+    root = os.path.abspath(root)
+    with manifest_lock(root):
+        manifest = load_manifest(root)
+        files = manifest["files"]
+        stats = load_stat_cache(root)
+        cached = dict(stats)
+        changed = {}
+        for path in paths:
+            name = os.path.relpath(os.path.abspath(path), root).replace(os.sep, "/")
+            if name.startswith("../"):
+                continue
+            entry = files.get(name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stats.pop(name, None)
+                if entry is not None:
+                    del files[name]
+                    changed[name] = None
+                continue
+            if entry and entry["bytes"] == stat.st_size and stats.get(name) == [stat.st_size, stat.st_mtime_ns]:
+                continue
+            sha256 = file_sha256(path)
+            stats[name] = [stat.st_size, stat.st_mtime_ns]
+            if entry and entry["sha256"] == sha256:
+                continue # Rewritten with the same content
+            changed[name] = {"sha256": sha256, "bytes": stat.st_size}
+        if changed:
+            manifest["version"] += 1
+            manifest["published_at"] = datetime.now().isoformat(timespec="seconds")
+            for name, entry in changed.items():
+                if entry is not None:
+                    files[name] = dict(entry, version=manifest["version"])
+            write_atomic(manifest_path(root), json.dumps(manifest, indent=2, sort_keys=True))
+        if stats != cached:
+            write_atomic(stat_cache_path(root), json.dumps(stats, sort_keys=True))
+        return manifest["version"]
+
+def publish(path, data, root=DATA_ROOT):
+    """write_atomic, then record the file in the manifest; returns the manifest version."""
+    write_atomic(path, data)
+    return record([path], root)
+
+def main():
+    parser = argparse.ArgumentParser(description="Record the published data files in the versioned manifest.")
+    parser.add_argument("--root", default=DATA_ROOT)
+    args = parser.parse_args()
+
+    # Tiles are immutable per version directory; their index.json files stand for them
+    paths = []
+    for directory, dirs, names in os.walk(args.root):
+        if os.path.basename(directory) != "tiles" and "tiles" in os.path.relpath(directory, args.root).split(os.sep):
+            dirs[:] = []
+            names = [name for name in names if name == "index.json"]
+        paths.extend(os.path.join(directory, name) for name in names
+                     if not name.startswith(".") and name != MANIFEST_FILE and not name.endswith(".lock"))
+    version = record(sorted(paths), args.root)
+    manifest = load_manifest(args.root)
+    print(f"{manifest_path(args.root)}: version {version}, {len(manifest['files'])} files")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import json
+import math
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from publish import write_atomic
+
+# Quantized probability surfaces. Each guild raster is an 8-bit grayscale
+# PNG (row 0 = north edge) plus a small JSON header describing the lattice
+# and how to turn pixel values back into intensities:
+#   intensity = min + (pixel - 1) * (max - min) / 254, pixel 0 = no data
+
+NODATA = 0
+LEVELS = 254
+
+def lattice(bounds, resolution):
+    """
+    Cell-center coordinates of a regular lat/lng lattice covering bounds.
+    Returns (lats, lngs) 2D arrays of shape (rows, cols), north row first.
+    """
+    cols = int(math.ceil((bounds["east"] - bounds["west"]) / resolution))
+    rows = int(math.ceil((bounds["north"] - bounds["south"]) / resolution))
+    lngs = bounds["west"] + (np.arange(cols) + 0.5) * resolution
+    lats = bounds["north"] - (np.arange(rows) + 0.5) * resolution
+    return np.meshgrid(lats, lngs, indexing="ij")
+
+def quantize(values, vmin, vmax, valid=None):
+    """Maps values in [vmin, vmax] to 1..255; invalid cells become NODATA."""
+    scaled = (np.clip(values, vmin, vmax) - vmin) / (vmax - vmin)
+    pixels = (1 + np.rint(scaled * LEVELS)).astype(np.uint8)
+    if valid is not None:
+        pixels[~valid] = NODATA
+    return pixels
+
+def dequantize(pixels, vmin, vmax):
+    values = vmin + (pixels.astype(float) - 1) * (vmax - vmin) / LEVELS
+    return np.where(pixels == NODATA, np.nan, values)
+
+def _png_chunk(tag, data):
+    body = tag + data
+    return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+def encode_png_gray(pixels):
+    """Encodes a 2D uint8 array as an 8-bit grayscale PNG."""
+    height, width = pixels.shape
+    raw = np.zeros((height, width + 1), dtype=np.uint8) # Filter byte 0 per row
+    raw[:, 1:] = pixels
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)),
+        _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), 9)),
+        _png_chunk(b"IEND", b"")
+    ])
+
+def write_raster(output_dir, name, pixels, bounds, resolution, vmin, vmax, extra=None):
+    """Writes <name>.png and <name>.json into output_dir; returns the header."""
+    os.makedirs(output_dir, exist_ok=True)
+    rows, cols = pixels.shape
+    header = {
+        "format": "png-gray8",
+        "image": f"{name}.png",
+        "width": cols,
+        "height": rows,
+        "resolution_deg": resolution,
+        # Outer edges of the lattice (cell centers sit half a cell inside)
+        "bounds": {
+            "north": bounds["north"],
+            "south": bounds["north"] - rows * resolution,
+            "west": bounds["west"],
+            "east": bounds["west"] + cols * resolution
+        },
+        "row_order": "north_to_south",
+        "nodata": NODATA,
+        "scale": {"min": vmin, "max": vmax, "levels": LEVELS}
+    }
+    if extra:
+        header.update(extra)
+    # Image first: a reader that sees the new header also sees its image
+    write_atomic(os.path.join(output_dir, f"{name}.png"), encode_png_gray(pixels))
+    write_atomic(os.path.join(output_dir, f"{name}.json"), json.dumps(header, indent=2))
+    return header
@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+
+import fetch_env_data
+import fetch_host_trees
+import generate_probability as gp
+import publish
+import tile_layers
+import weather_client
+from weather_cache import cell_key
+
+# Long-running refresh of everything under client/public/data. Weather,
+# host trees and layers each refresh on their own cadence in one process,
+# so HTTP sessions, the rate budget for each upstream API and the warm
+# caches (weather sqlite caches, geocoder, host stores, public land index)
+# carry over from cycle to cycle. Every output is published with an
+# atomic rename and recorded in the versioned manifest (see publish.py),
+# so the web app and hotspot_server.py never read a half-written file.
+#
+#   weather  rewrites weather_live.json and refreshes the cached weather
+#            of every observed location whose cache entry has expired
+#   hosts    pulls iNaturalist observations newer than each checkpoint and
+#            recompiles only the host files that gained points
+#   layers   runs generate_probability.py, which rebuilds only stale
+#            layers, then retiles the layers it wrote (with --tiles)
+#
+# Weather and layers share generate_probability's module state, so they
+# take turns; hosts runs alongside them. When each job last ran is kept in
+# STATE_PATH, so a restart picks up the cadence instead of redoing
+# everything.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = os.path.join(SCRIPT_DIR, "data", "refresh_state.json")
+
+JOBS = ["weather", "hosts", "layers"]
+DEFAULT_EVERY_MINUTES = {"weather": 180, "hosts": 24 * 60, "layers": 60}
+RETRY_MINUTES = 10 # A failed job runs again after this long, or its interval if shorter
+
+# One budget per upstream API, shared by every job that calls it
+DEFAULT_RATES = {
+    "open-meteo": weather_client.DEFAULT_RATE_PER_SEC,
+    "inaturalist": fetch_host_trees.DEFAULT_RATE_PER_SEC
+}
+
+def log(message):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+class RefreshDaemon:
+    def __init__(self, every_minutes, observations=gp.OBSERVATIONS_PATH, output_dir=gp.LAYERS_DIR,
+                 host_dir=gp.HOST_DIR, layer_args=(), tiles=False, rates=DEFAULT_RATES,
+                 weather_url=weather_client.ARCHIVE_URL, inat_url=fetch_host_trees.INAT_URL, state_path=STATE_PATH):
+        self.every = {job: minutes * 60 for job, minutes in every_minutes.items() if minutes}
+        self.observations = observations
+        self.output_dir = output_dir
+        self.host_dir = host_dir
+        self.data_root = os.path.dirname(os.path.abspath(output_dir)) # Where the manifest lives
+        self.layer_args = list(layer_args)
+        self.tiles = tiles
+        self.state_path = state_path
+        self.state = self._load_state()
+        self.limiters = {api: weather_client.RateLimiter(rate) for api, rate in rates.items()}
+        # Created once: later cycles reuse their pooled connections
+        weather_client._shared_client = weather_client.WeatherClient(weather_url,
+                                                                     rate_limiter=self.limiters["open-meteo"])
+        self.harvester = fetch_host_trees.HostTreeHarvester(inat_url, output_dir=host_dir,
+                                                            rate_limiter=self.limiters["inaturalist"])
+        self.generator_lock = threading.Lock() # generate_probability's globals are one run's state
+        self._state_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self):
+        with self._state_lock:
+            publish.write_atomic(self.state_path, json.dumps(self.state, indent=2, sort_keys=True))
+
+    def refresh_weather(self):
+        data = fetch_env_data.fetch_weather_data()
+        publish.publish(os.path.join(self.data_root, "weather_live.json"), json.dumps(data, indent=2), self.data_root)
+        with self.generator_lock:
+            locations, _ = gp.build_location_table(gp.load_observations(self.observations))
+            cells = {cell_key(lat, lng): (lat, lng) for _, (lat, lng) in locations}
+            results = gp.fetch_cell_weather(list(cells.values()))
+        return f"{sum(1 for r in results if r)} of {len(cells)} cells current"
+
+    def refresh_hosts(self):
+        summary = self.harvester.harvest()
+        incomplete = [name for name, s in summary.items() if not s["complete"]]
+        text = f"{sum(s['pages'] for s in summary.values())} pages, {sum(s['features'] for s in summary.values())} points"
+        if incomplete:
+            raise RuntimeError(f"{text}; incomplete: {', '.join(incomplete)}")
+        return text
+
+    def generator_argv(self):
+        return ["--observations", self.observations, "--output-dir", self.output_dir,
+                "--host-dir", self.host_dir] + self.layer_args
+
+    def refresh_layers(self):
+        with self.generator_lock:
+            written = gp.main(self.generator_argv())
+        if self.tiles:
+            tiles_dir = os.path.join(self.data_root, "tiles")
+            for name in written:
+                tile_layers.tile_layer(os.path.join(self.output_dir, f"{name}.json"), tiles_dir)
+        return f"{len(written)} layers rebuilt" if written else "all layers up to date"
+
+    def run_job(self, job):
+        """Runs one job now, logging and recording the outcome; returns whether it succeeded."""
+        log(f"{job}: refreshing")
+        started = time.time()
+        try:
+            result, error = getattr(self, f"refresh_{job}")(), None
+        except (Exception, SystemExit) as e:
+            # SystemExit too: argparse and friends inside a job must not end its thread
+            result, error = None, f"{type(e).__name__}: {e}"
+        elapsed = time.time() - started
+        with self._state_lock:
+            entry = self.state.setdefault(job, {"runs": 0, "failures": 0})
+            entry["runs"] += 1
+            entry["last_run"] = started
+            entry["seconds"] = round(elapsed, 2)
+            entry["result"] = result
+            entry["error"] = error
+            if error:
+                entry["failures"] += 1
+            else:
+                entry["last_ok"] = started
+        self._save_state()
+        log(f"{job}: {'failed: ' + error if error else result} ({elapsed:.1f}s, manifest version "
+            f"{publish.load_manifest(self.data_root)['version']})")
+        return error is None
+
+    def next_due(self, job):
+        """Epoch seconds at which job should next run."""
+        entry = self.state.get(job)
+        if not entry:
+            return 0
+        if entry.get("error"):
+            return entry["last_run"] + min(RETRY_MINUTES * 60, self.every[job])
+        return entry["last_run"] + self.every[job]
+
+    def _loop(self, job):
+        while not self._stop.is_set():
+            wait = self.next_due(job) - time.time()
+            if wait > 0:
+                self._stop.wait(wait)
+                continue
+            self.run_job(job)
+
+    def run_once(self):
+        """Every scheduled job once, in order; returns whether all succeeded."""
+        return all([self.run_job(job) for job in JOBS if job in self.every])
+
+    def run_forever(self):
+        """Runs each job on its own thread until stop() (or SIGINT/SIGTERM)."""
+        threads = [threading.Thread(target=self._loop, args=(job,), name=f"refresh-{job}") for job in JOBS
+                   if job in self.every]
+        for thread in threads:
+            thread.start()
+        for job in JOBS:
+            if job in self.every:
+                due = max(self.next_due(job), time.time())
+                log(f"{job}: every {self.every[job] / 60:g} min, next at {datetime.fromtimestamp(due):%H:%M:%S}")
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1.0)
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        self.harvester.close()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Refresh weather, host trees and layers on independent cadences, publishing atomically.",
+        epilog="Arguments after -- are passed to generate_probability.py, e.g. -- --host-density --workers 4"
+    )
+    for job in JOBS:
+        parser.add_argument(f"--{job}-every", type=float, default=DEFAULT_EVERY_MINUTES[job], metavar="MINUTES",
+                            help=f"minutes between {job} refreshes (0 disables; default {DEFAULT_EVERY_MINUTES[job]})")
+    parser.add_argument("--once", action="store_true", help="run each enabled job once and exit")
+    parser.add_argument("--open-meteo-rate", type=float, default=DEFAULT_RATES["open-meteo"],
+                        help="requests per second to Open-Meteo across all jobs (0 = unlimited)")
+    parser.add_argument("--inaturalist-rate", type=float, default=DEFAULT_RATES["inaturalist"],
+                        help="requests per second to iNaturalist across all jobs (0 = unlimited)")
+    parser.add_argument("--observations", default=gp.OBSERVATIONS_PATH)
+    parser.add_argument("--output-dir", default=gp.LAYERS_DIR,
+                        help="layers directory; weather_live.json, tiles/ and the manifest go in its parent")
+    parser.add_argument("--host-dir", default=gp.HOST_DIR)
+    parser.add_argument("--tiles", action="store_true", help="retile rebuilt layers (see tile_layers.py)")
+    parser.add_argument("--state", default=STATE_PATH)
+    parser.add_argument("--stub", action="store_true",
+                        help="use local stub Open-Meteo and iNaturalist servers instead of the real APIs")
+    parser.add_argument("layer_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    layer_args = args.layer_args[1:] if args.layer_args[:1] == ["--"] else args.layer_args
+
+    weather_url, inat_url = weather_client.ARCHIVE_URL, fetch_host_trees.INAT_URL
+    if args.stub:
+        _, weather_url = weather_client.start_stub_server(latency=0.0)
+        _, inat_url = fetch_host_trees.start_stub_server()
+    daemon = RefreshDaemon({job: getattr(args, f"{job}_every") for job in JOBS}, args.observations,
+                           args.output_dir, args.host_dir, layer_args, args.tiles,
+                           {"open-meteo": args.open_meteo_rate, "inaturalist": args.inaturalist_rate},
+                           weather_url, inat_url, args.state)
+    try:
+        # Bad generator arguments fail here, with usage, instead of on every layers cycle
+        gp.parse_args(daemon.generator_argv())
+        if args.once:
+            ok = daemon.run_once()
+            raise SystemExit(0 if ok else 1)
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            # Jobs in the middle of a cycle finish it before their threads exit
+            signal.signal(signum, lambda *_: (log("stopping"), daemon.stop()))
+        daemon.run_forever()
+    finally:
+        daemon.close()
+
+if __name__ == "__main__":
+    main()
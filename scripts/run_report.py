@@ -0,0 +1,158 @@
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+# Opt-in instrumentation for generator runs. Nothing here does any work
+# until enable() is called: stage() hands back a shared no-op context and
+# functions are only wrapped by instrument(), so a normal run pays at most
+# a flag check per stage. Function timings are inclusive of nested calls.
+# A process that runs the generator repeatedly (refresh_daemon.py) calls
+# reset() before each run, which puts the original functions back, so
+# wrappers never stack and a run only reports when it asked to.
+
+ENABLED = False
+_report = None
+_profiler = None
+_NULL_CONTEXT = contextlib.nullcontext()
+_originals = {} # (module, name): the function a wrapper replaced
+
+class RunReport:
+    def __init__(self):
+        self.started_at = datetime.now().isoformat()
+        self.started = time.perf_counter()
+        self.stages = defaultdict(lambda: {"calls": 0, "seconds": 0.0})
+        self.functions = defaultdict(lambda: {"calls": 0, "seconds": 0.0})
+        self.counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, table, name, seconds):
+        with self._lock:
+            entry = table[name]
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def to_dict(self):
+        def rounded(table):
+            return {name: {"calls": e["calls"], "seconds": round(e["seconds"], 6)} for name, e in table.items()}
+        return {
+            "started_at": self.started_at,
+            "total_seconds": round(time.perf_counter() - self.started, 6),
+            "stages": rounded(self.stages),
+            "functions": rounded(self.functions),
+            "counters": dict(self.counters)
+        }
+
+def enable(profile=False):
+    """Starts collecting for this process; profile=True also runs cProfile."""
+    global ENABLED, _report, _profiler
+    reset()
+    ENABLED = True
+    _report = RunReport()
+    if profile:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+@contextlib.contextmanager
+def _timed_stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _report.add(_report.stages, name, time.perf_counter() - started)
+
+def stage(name):
+    """Context manager timing one pipeline stage; repeated stages accumulate."""
+    if not ENABLED:
+        return _NULL_CONTEXT
+    return _timed_stage(name)
+
+def count(name, n=1):
+    if ENABLED:
+        _report.count(name, n)
+
+def reset():
+    """Stops collecting and restores every wrapped function."""
+    global ENABLED, _report, _profiler
+    for (module, name), func in _originals.items():
+        setattr(module, name, func)
+    _originals.clear()
+    if _profiler is not None:
+        _profiler.disable()
+    ENABLED = False
+    _report = None
+    _profiler = None
+
+def _wrap(module, name, make_wrapper):
+    """Replaces module.name with make_wrapper(original), unless it is already wrapped."""
+    if (module, name) in _originals:
+        return
+    func = getattr(module, name)
+    _originals[(module, name)] = func
+    setattr(module, name, functools.wraps(func)(make_wrapper(func)))
+
+def instrument(module, names):
+    """Replaces module-level functions with timed, call-counting wrappers."""
+    for name in names:
+        def make_wrapper(func, name=name):
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    _report.add(_report.functions, name, time.perf_counter() - started)
+            return wrapper
+
+        _wrap(module, name, make_wrapper)
+
+def count_calls(module, name, counter, measure=lambda result: 1):
+    """Wraps module.name so every call adds measure(result) to counter."""
+    def make_wrapper(func):
+        def wrapper(*args, **kwargs):
+            result = func(*args, **kwargs)
+            _report.count(counter, measure(result))
+            return result
+        return wrapper
+
+    _wrap(module, name, make_wrapper)
+
+def latency_summary(latencies):
+    """Count and millisecond percentiles of a list of request latencies in seconds."""
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "max_ms": round(ordered[-1] * 1000, 3)
+    }
+
+def write(path, extra=None):
+    """Writes the JSON report (and run_report.prof when profiling) to path's directory."""
+    report = _report.to_dict()
+    if extra:
+        report.update(extra)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if _profiler is not None:
+        _profiler.disable()
+        profile_path = os.path.splitext(path)[0] + ".prof"
+        _profiler.dump_stats(profile_path)
+        report["profile"] = os.path.basename(profile_path)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
@@ -0,0 +1,375 @@
+import argparse
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+# Aspect and slope from a local DEM. Drop a single-band, geographic
+# (lat/lng) elevation grid under data/dem, either as an uncompressed
+# striped GeoTIFF or as a raw little-endian grid with a JSON header:
+#   {"data": "norcal_dem.bin", "dtype": "<f4", "rows": R, "cols": C,
+#    "bounds": {"north": .., "south": .., "west": .., "east": ..}, "nodata": -9999}
+# The DEM is memory-mapped and processed in row blocks, so it never has
+# to fit in RAM. Aspect is derived with Horn's 3x3 gradient kernel and
+# cached as a uint8 aspect-class plane plus a slope plane, rebuilt
+# whenever the DEM file's size or mtime changes. Point lookups read only
+# the cache pages they touch.
+#
+# Convert a compressed or tiled GeoTIFF first, e.g.
+#   gdal_translate -co COMPRESS=NONE -co TILED=NO -ot Float32 in.tif norcal_dem.tif
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEM_DIR = os.path.join(SCRIPT_DIR, "data", "dem")
+DEM_PATH = os.path.join(DEM_DIR, "norcal_dem.tif")
+CACHE_DIR = os.path.join(SCRIPT_DIR, "data", "terrain_cache")
+CACHE_VERSION = 1
+BLOCK_ROWS = 512
+
+METERS_PER_DEG_LAT = 110_540
+METERS_PER_DEG_LNG = 111_320 # At the equator; scaled by cos(lat)
+
+# Aspect classes; slopes gentler than FLAT_SLOPE_DEG face nowhere
+FLAT_SLOPE_DEG = 2.0
+FLAT, NORTH, EAST, SOUTH, WEST = range(5)
+NO_CLASS = 255
+# Weight per class, the N/E/S/W values get_aspect_score uses
+ASPECT_WEIGHTS = np.array([1.0, 1.3, 1.2, 0.7, 0.9])
+
+class RasterGrid:
+    """Single-band grid (north row first, possibly a memmap) with its outer bounds."""
+
+    def __init__(self, values, bounds, nodata=None, path=None):
+        self.values = values
+        self.bounds = bounds
+        self.nodata = nodata
+        self.path = path
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def resolution(self):
+        """(lat, lng) size of one cell in degrees."""
+        rows, cols = self.shape
+        return ((self.bounds["north"] - self.bounds["south"]) / rows,
+                (self.bounds["east"] - self.bounds["west"]) / cols)
+
+# --- Readers -----------------------------------------------------------
+
+# TIFF field type -> (struct code, size)
+TIFF_TYPES = {1: ("B", 1), 2: ("s", 1), 3: ("H", 2), 4: ("I", 4), 11: ("f", 4), 12: ("d", 8), 16: ("Q", 8)}
+TAG_WIDTH, TAG_HEIGHT, TAG_BITS, TAG_COMPRESSION = 256, 257, 258, 259
+TAG_STRIP_OFFSETS, TAG_SAMPLES, TAG_STRIP_BYTES = 273, 277, 279
+TAG_TILE_WIDTH, TAG_SAMPLE_FORMAT = 322, 339
+TAG_PIXEL_SCALE, TAG_TIEPOINT, TAG_GDAL_NODATA = 33550, 33922, 42113
+
+def read_tiff_tags(path):
+    """Tags of a classic TIFF's first image: ({tag: tuple of values}, byte order)."""
+    with open(path, "rb") as f:
+        order = {b"II": "<", b"MM": ">"}.get(f.read(2))
+        if order is None:
+            raise ValueError(f"{path} is not a TIFF file")
+        magic, ifd_offset = struct.unpack(order + "HI", f.read(6))
+        if magic != 42:
+            raise ValueError(f"{path}: only classic (non-BigTIFF) GeoTIFFs are supported")
+        f.seek(ifd_offset)
+        (count,) = struct.unpack(order + "H", f.read(2))
+        entries = [struct.unpack(order + "HHI4s", f.read(12)) for _ in range(count)]
+        tags = {}
+        for tag, field_type, n, raw in entries:
+            if field_type not in TIFF_TYPES:
+                continue
+            code, size = TIFF_TYPES[field_type]
+            if n * size > 4:
+                f.seek(struct.unpack(order + "I", raw)[0])
+                raw = f.read(n * size)
+            if code == "s":
+                tags[tag] = (raw[:n].rstrip(b"\0").decode(),)
+            else:
+                tags[tag] = struct.unpack(f"{order}{n}{code}", raw[:n * size])
+    return tags, order
+
+def read_geotiff(path):
+    """Memory-maps an uncompressed, striped, single-band geographic GeoTIFF."""
+    tags, order = read_tiff_tags(path)
+    if tags.get(TAG_COMPRESSION, (1,))[0] != 1:
+        raise ValueError(f"{path} is compressed; convert it with COMPRESS=NONE")
+    if TAG_TILE_WIDTH in tags:
+        raise ValueError(f"{path} is tiled; convert it with TILED=NO")
+    if tags.get(TAG_SAMPLES, (1,))[0] != 1:
+        raise ValueError(f"{path} has more than one band")
+    cols, rows = tags[TAG_WIDTH][0], tags[TAG_HEIGHT][0]
+    bits = tags[TAG_BITS][0]
+    kind = {1: "u", 2: "i", 3: "f"}[tags.get(TAG_SAMPLE_FORMAT, (1,))[0]]
+    dtype = np.dtype(f"{order}{kind}{bits // 8}")
+
+    offsets, counts = tags[TAG_STRIP_OFFSETS], tags[TAG_STRIP_BYTES]
+    if any(offsets[i] + counts[i] != offsets[i + 1] for i in range(len(offsets) - 1)):
+        raise ValueError(f"{path}: strips are not contiguous")
+    values = np.memmap(path, dtype=dtype, mode="r", offset=offsets[0], shape=(rows, cols))
+
+    scale_x, scale_y = tags[TAG_PIXEL_SCALE][:2]
+    i, j, _, x, y, _ = tags[TAG_TIEPOINT][:6]
+    if scale_x > 1 or scale_y > 1:
+        raise ValueError(f"{path} does not look geographic (pixel size {scale_x} x {scale_y})")
+    west, north = x - i * scale_x, y + j * scale_y
+    bounds = {"north": north, "south": north - rows * scale_y, "west": west, "east": west + cols * scale_x}
+    nodata = float(tags[TAG_GDAL_NODATA][0]) if TAG_GDAL_NODATA in tags else None
+    return RasterGrid(values, bounds, nodata, path)
+
+def read_raw_dem(header_path):
+    """Memory-maps a raw grid described by a JSON header (see the top of this file)."""
+    with open(header_path, "r") as f:
+        header = json.load(f)
+    data_path = os.path.join(os.path.dirname(header_path), header["data"])
+    values = np.memmap(data_path, dtype=np.dtype(header["dtype"]), mode="r",
+                       shape=(header["rows"], header["cols"]))
+    return RasterGrid(values, header["bounds"], header.get("nodata"), header_path)
+
+def open_raster(path):
+    """RasterGrid for a GeoTIFF, or for a raw grid given its JSON header."""
+    return read_raw_dem(path) if path.endswith(".json") else read_geotiff(path)
+
+# --- Writers (fixtures) ------------------------------------------------
+
+def write_geotiff(path, values, bounds, nodata=None, dtype="<f4"):
+    """Writes a grid as an uncompressed, single-strip geographic GeoTIFF."""
+    values = np.asarray(values, dtype=dtype)
+    rows, cols = values.shape
+    scale_x = (bounds["east"] - bounds["west"]) / cols
+    scale_y = (bounds["north"] - bounds["south"]) / rows
+    entries = [
+        (TAG_WIDTH, 4, [cols]), (TAG_HEIGHT, 4, [rows]), (TAG_BITS, 3, [values.dtype.itemsize * 8]), (TAG_COMPRESSION, 3, [1]),
+        (262, 3, [1]), # PhotometricInterpretation: BlackIsZero
+        (TAG_STRIP_OFFSETS, 4, [0]), (TAG_SAMPLES, 3, [1]), (278, 4, [rows]), (TAG_STRIP_BYTES, 4, [values.nbytes]),
+        (TAG_SAMPLE_FORMAT, 3, [{"u": 1, "i": 2, "f": 3}[values.dtype.kind]]),
+        (TAG_PIXEL_SCALE, 12, [scale_x, scale_y, 0.0]),
+        (TAG_TIEPOINT, 12, [0.0, 0.0, 0.0, bounds["west"], bounds["north"], 0.0])
+    ]
+    if nodata is not None:
+        entries.append((TAG_GDAL_NODATA, 2, f"{nodata:g}\0"))
+
+    ifd_size = 2 + 12 * len(entries) + 4
+    extra = b""
+    packed = []
+    for tag, field_type, field_values in entries:
+        code, size = TIFF_TYPES[field_type]
+        data = field_values.encode() if code == "s" else struct.pack(f"<{len(field_values)}{code}", *field_values)
+        packed.append((tag, field_type, len(field_values), data))
+        if len(data) > 4:
+            extra += data + b"\0" * (len(data) % 2)
+    data_offset = 8 + ifd_size + len(extra)
+    extra_offset = 8 + ifd_size
+    ifd = struct.pack("<H", len(packed))
+    for tag, field_type, count, data in packed:
+        if tag == TAG_STRIP_OFFSETS:
+            data = struct.pack("<I", data_offset)
+        if len(data) > 4:
+            value = struct.pack("<I", extra_offset)
+            extra_offset += len(data) + len(data) % 2
+        else:
+            value = data.ljust(4, b"\0")
+        ifd += struct.pack("<HHI", tag, field_type, count) + value
+    with open(path, "wb") as f:
+        f.write(b"II" + struct.pack("<HI", 42, 8) + ifd + struct.pack("<I", 0) + extra)
+        f.write(values.tobytes())
+
+def write_raw_grid(header_path, values, bounds, nodata=None, dtype="<f4"):
+    values = np.asarray(values, dtype=dtype)
+    data_name = os.path.splitext(os.path.basename(header_path))[0] + ".bin"
+    with open(os.path.join(os.path.dirname(header_path), data_name), "wb") as f:
+        f.write(values.tobytes())
+    with open(header_path, "w") as f:
+        json.dump({"data": data_name, "dtype": values.dtype.str, "rows": values.shape[0], "cols": values.shape[1],
+                   "bounds": bounds, "nodata": nodata}, f, indent=2)
+
+def synthetic_dem(bounds, rows, cols, peak_m=1500.0, grade=0.2, plateau_m=1400.0):
+    """
+    Test terrain: a cone centered in bounds with a flat top at plateau_m.
+    Cells north of the center face north, east of it face east, and so on.
+    """
+    lat_res = (bounds["north"] - bounds["south"]) / rows
+    lng_res = (bounds["east"] - bounds["west"]) / cols
+    lats = bounds["north"] - (np.arange(rows) + 0.5) * lat_res
+    lngs = bounds["west"] + (np.arange(cols) + 0.5) * lng_res
+    center_lat = (bounds["north"] + bounds["south"]) / 2
+    center_lng = (bounds["east"] + bounds["west"]) / 2
+    dy = (lats[:, None] - center_lat) * METERS_PER_DEG_LAT
+    dx = (lngs[None, :] - center_lng) * METERS_PER_DEG_LNG * np.cos(np.radians(center_lat))
+    return np.minimum(peak_m - grade * np.hypot(dx, dy), plateau_m).astype(np.float32)
+
+# --- Aspect ------------------------------------------------------------
+
+def horn_gradient(padded, dy_m, dx_m):
+    """
+    East and north elevation gradients (m/m) for the interior of a block
+    padded by one cell on every side. dx_m holds the cell width per row.
+    """
+    a, b, c = padded[:-2, :-2], padded[:-2, 1:-1], padded[:-2, 2:]
+    d, f = padded[1:-1, :-2], padded[1:-1, 2:]
+    g, h, i = padded[2:, :-2], padded[2:, 1:-1], padded[2:, 2:]
+    east = ((c + 2 * f + i) - (a + 2 * d + g)) / (8 * dx_m[:, None])
+    south = ((g + 2 * h + i) - (a + 2 * b + c)) / (8 * dy_m)
+    return east, -south
+
+def classify(east, north):
+    """Aspect classes and slope in degrees from gradients; aspect is the downslope bearing."""
+    slope = np.degrees(np.arctan(np.hypot(east, north)))
+    aspect = np.mod(np.degrees(np.arctan2(-east, -north)), 360)
+    classes = np.select(
+        [slope < FLAT_SLOPE_DEG, (aspect < 45) | (aspect > 315), aspect < 135, aspect < 225],
+        [FLAT, NORTH, EAST, SOUTH],
+        default=WEST
+    ).astype(np.uint8)
+    return classes, slope
+
+def build_aspect_cache(dem, cache_path, block_rows=BLOCK_ROWS):
+    """
+    Writes the (2, rows, cols) uint8 cache: aspect classes, then slope in
+    whole degrees. Works through the DEM block_rows at a time.
+    """
+    rows, cols = dem.shape
+    lat_res, lng_res = dem.resolution
+    dy_m = lat_res * METERS_PER_DEG_LAT
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    planes = np.memmap(tmp_path, dtype=np.uint8, mode="w+", shape=(2, rows, cols))
+    for start in range(0, rows, block_rows):
+        stop = min(start + block_rows, rows)
+        lo, hi = max(start - 1, 0), min(stop + 1, rows)
+        block = np.asarray(dem.values[lo:hi], dtype=float)
+        # Edge cells reuse their own values for the missing neighbours
+        padded = np.pad(block, ((int(start == lo), int(stop == hi)), (1, 1)), mode="edge")
+        invalid = np.isnan(padded)
+        if dem.nodata is not None:
+            invalid |= padded == dem.nodata
+        row_lats = dem.bounds["north"] - (np.arange(start, stop) + 0.5) * lat_res
+        dx_m = lng_res * METERS_PER_DEG_LNG * np.cos(np.radians(row_lats))
+        east, north = horn_gradient(np.where(invalid, 0.0, padded), dy_m, dx_m)
+        classes, slope = classify(east, north)
+        # A cell with any missing neighbour has no aspect
+        window_invalid = np.zeros_like(classes, dtype=bool)
+        for dr in range(3):
+            for dc in range(3):
+                window_invalid |= invalid[dr:dr + stop - start, dc:dc + cols]
+        classes[window_invalid] = NO_CLASS
+        planes[0, start:stop] = classes
+        planes[1, start:stop] = np.where(window_invalid, NO_CLASS, np.rint(slope)).astype(np.uint8)
+    planes.flush()
+    del planes
+    os.replace(tmp_path, cache_path)
+
+def source_fingerprint(path):
+    stat = os.stat(path)
+    return {"path": os.path.basename(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+class Terrain:
+    """Aspect classes and slope over a DEM's extent, memory-mapped from the cache."""
+
+    def __init__(self, planes, bounds, header):
+        self.classes = planes[0]
+        self.slope = planes[1]
+        self.bounds = bounds
+        self.header = header
+
+    @classmethod
+    def load(cls, dem_path=DEM_PATH, cache_dir=CACHE_DIR):
+        """Opens the aspect cache for dem_path, rebuilding it if the DEM changed."""
+        dem = open_raster(dem_path)
+        name = os.path.splitext(os.path.basename(dem_path))[0]
+        cache_path = os.path.join(cache_dir, f"{name}.aspect")
+        header_path = cache_path + ".json"
+        header = {
+            "version": CACHE_VERSION,
+            "source": source_fingerprint(dem_path),
+            "shape": list(dem.shape),
+            "bounds": dem.bounds,
+            "flat_slope_deg": FLAT_SLOPE_DEG
+        }
+        try:
+            with open(header_path, "r") as f:
+                fresh = json.load(f) == header and os.path.exists(cache_path)
+        except (FileNotFoundError, ValueError):
+            fresh = False
+        if not fresh:
+            print(f"Building aspect cache for {dem_path} ({dem.shape[0]}x{dem.shape[1]})...")
+            build_aspect_cache(dem, cache_path)
+            with open(header_path, "w") as f:
+                json.dump(header, f, indent=2)
+        planes = np.memmap(cache_path, dtype=np.uint8, mode="r", shape=(2, *dem.shape))
+        return cls(planes, dem.bounds, header)
+
+    def fingerprint(self):
+        """Identifies the DEM and settings the aspect classes came from."""
+        return self.header
+
+    def lookup(self, lats, lngs):
+        """(aspect classes, slope degrees) at the points; NO_CLASS outside the DEM or on nodata."""
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        rows, cols = self.classes.shape
+        row = np.floor((self.bounds["north"] - lats) / (self.bounds["north"] - self.bounds["south"]) * rows)
+        col = np.floor((lngs - self.bounds["west"]) / (self.bounds["east"] - self.bounds["west"]) * cols)
+        inside = (row >= 0) & (row < rows) & (col >= 0) & (col < cols)
+        row = row[inside].astype(np.intp)
+        col = col[inside].astype(np.intp)
+        classes = np.full(lats.shape, NO_CLASS, dtype=np.uint8)
+        slope = np.full(lats.shape, NO_CLASS, dtype=np.uint8)
+        classes[inside] = self.classes[row, col]
+        slope[inside] = self.slope[row, col]
+        return classes, slope
+
+    def aspect_weights(self, lats, lngs):
+        """ASPECT_WEIGHTS for the points' aspect classes; NaN where the DEM has none."""
+        classes, _ = self.lookup(lats, lngs)
+        known = classes != NO_CLASS
+        weights = np.full(classes.shape, np.nan)
+        weights[known] = ASPECT_WEIGHTS[classes[known]]
+        return weights
+
+def load_terrain(dem_path=DEM_PATH, cache_dir=CACHE_DIR):
+    """Terrain for dem_path, or None when there is no DEM there."""
+    if not dem_path or not os.path.exists(dem_path):
+        return None
+    return Terrain.load(dem_path, cache_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the DEM aspect cache and look up aspect at points.")
+    parser.add_argument("--dem", default=DEM_PATH, help="GeoTIFF, or JSON header of a raw grid")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--point", action="append", default=[], metavar="LAT,LNG", help="report aspect at a point")
+    parser.add_argument("--synthetic", metavar="PATH",
+                        help="first write a synthetic cone DEM fixture to PATH (.tif or .json) and use it")
+    parser.add_argument("--synthetic-size", type=int, default=400, help="fixture rows and columns")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        bounds = {"north": 38.6, "south": 38.4, "west": -123.4, "east": -123.2}
+        elevation = synthetic_dem(bounds, args.synthetic_size, args.synthetic_size)
+        os.makedirs(os.path.dirname(os.path.abspath(args.synthetic)), exist_ok=True)
+        writer = write_raw_grid if args.synthetic.endswith(".json") else write_geotiff
+        writer(args.synthetic, elevation, bounds)
+        args.dem = args.synthetic
+        center = (38.5, -123.3)
+        args.point += [f"{center[0] + dlat},{center[1] + dlng}"
+                       for dlat, dlng in [(0.0, 0.0), (0.07, 0.0), (0.0, 0.07), (-0.07, 0.0), (0.0, -0.07), (0.3, 0.0)]]
+
+    started = time.perf_counter()
+    terrain = load_terrain(args.dem, args.cache_dir)
+    if terrain is None:
+        print(f"No DEM at {args.dem}")
+        return
+    print(f"Loaded {args.dem} in {time.perf_counter() - started:.3f}s")
+    names = {FLAT: "flat", NORTH: "north", EAST: "east", SOUTH: "south", WEST: "west", NO_CLASS: "no data"}
+    points = [tuple(float(v) for v in p.split(",")) for p in args.point]
+    if points:
+        classes, slope = terrain.lookup([p[0] for p in points], [p[1] for p in points])
+        weights = terrain.aspect_weights([p[0] for p in points], [p[1] for p in points])
+        for (lat, lng), aspect, degrees, weight in zip(points, classes, slope, weights):
+            print(f"  {lat:.4f},{lng:.4f}: {names[int(aspect)]}, slope {degrees} deg, weight {weight}")
+
+if __name__ == "__main__":
+    main()
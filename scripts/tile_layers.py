@@ -0,0 +1,211 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+from collections import defaultdict
+
+from publish import publish
+
+# Tiling stage: splits each layer in client/public/data/layers into
+# web-mercator z/x/y GeoJSON tiles plus an index manifest, so the map only
+# downloads tiles inside the viewport. Point layers are aggregated into
+# AGGREGATE_BINS x AGGREGATE_BINS bins per tile below AGGREGATE_BELOW_ZOOM;
+# polygons are copied into every tile their bounding box touches.
+#
+# Tiles go into a directory named after a hash of their contents, and the
+# layer's index.json, replaced atomically once every tile is on disk,
+# names the directory to read. A client holding the previous index keeps
+# reading the previous tiles, which stay until the next version replaces
+# them; retiling unchanged features writes nothing.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LAYERS_DIR = os.path.join(SCRIPT_DIR, "../client/public/data/layers")
+TILES_DIR = os.path.join(SCRIPT_DIR, "../client/public/data/tiles")
+
+MIN_ZOOM = 5
+MAX_ZOOM = 11
+AGGREGATE_BELOW_ZOOM = 9
+AGGREGATE_BINS = 32 # ~8 px bins on a 256 px tile
+MAX_MERCATOR_LAT = 85.05112878
+
+def lnglat_to_tile_fraction(lng, lat, z):
+    """Fractional tile coordinates of a point at zoom z."""
+    n = 2 ** z
+    lat = max(min(lat, MAX_MERCATOR_LAT), -MAX_MERCATOR_LAT)
+    x = (lng + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    return min(max(x, 0.0), n - 1e-9), min(max(y, 0.0), n - 1e-9)
+
+def lnglat_to_tile(lng, lat, z):
+    x, y = lnglat_to_tile_fraction(lng, lat, z)
+    return int(x), int(y)
+
+def geometry_bounds(geometry):
+    """(west, south, east, north) of a GeoJSON geometry."""
+    coords = geometry["coordinates"]
+    while isinstance(coords[0], list) and isinstance(coords[0][0], list):
+        coords = [c for part in coords for c in part]
+    if not isinstance(coords[0], list):
+        coords = [coords]
+    lngs = [c[0] for c in coords]
+    lats = [c[1] for c in coords]
+    return min(lngs), min(lats), max(lngs), max(lats)
+
+def aggregate_points(features):
+    """Merges point features in one bin into a single weighted point."""
+    if len(features) == 1:
+        return features[0]
+    count = sum(f["properties"].get("count", 1) for f in features)
+
+    def weighted_mean(get):
+        return sum(get(f) * f["properties"].get("count", 1) for f in features) / count
+
+    props = features[0]["properties"]
+    merged = {
+        "intensity": round(weighted_mean(lambda f: f["properties"]["intensity"]), 2),
+        "count": count
+    }
+    if "factors" in props:
+        merged["factors"] = {
+            name: round(weighted_mean(lambda f: f["properties"]["factors"][name]), 2)
+            for name in props["factors"]
+        }
+    if "location" in props:
+        merged["location"] = props["location"]
+    if "public_land" in props:
+        # A merged point is public only if everything merged into it shares the land
+        lands = {f["properties"].get("public_land") for f in features}
+        merged["public_land"] = lands.pop() if len(lands) == 1 else None
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [
+                round(weighted_mean(lambda f: f["geometry"]["coordinates"][0]), 6),
+                round(weighted_mean(lambda f: f["geometry"]["coordinates"][1]), 6)
+            ]
+        },
+        "properties": merged
+    }
+
+def tile_features(features, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, aggregate_below=AGGREGATE_BELOW_ZOOM):
+    """Returns {(z, x, y): [features]} for every non-empty tile."""
+    tiles = {}
+    for z in range(min_zoom, max_zoom + 1):
+        level = defaultdict(list)
+        for feature in features:
+            geometry = feature["geometry"]
+            if geometry["type"] == "Point":
+                lng, lat = geometry["coordinates"][:2]
+                fx, fy = lnglat_to_tile_fraction(lng, lat, z)
+                tx, ty = int(fx), int(fy)
+                if z < aggregate_below:
+                    bin_key = (int((fx - tx) * AGGREGATE_BINS), int((fy - ty) * AGGREGATE_BINS))
+                else:
+                    bin_key = None
+                level[(tx, ty, bin_key)].append(feature)
+            else:
+                west, south, east, north = geometry_bounds(geometry)
+                x0, y0 = lnglat_to_tile(west, north, z)
+                x1, y1 = lnglat_to_tile(east, south, z)
+                for tx in range(x0, x1 + 1):
+                    for ty in range(y0, y1 + 1):
+                        level[(tx, ty, None)].append(feature)
+
+        for (tx, ty, bin_key), group in level.items():
+            tile = tiles.setdefault((z, tx, ty), [])
+            if bin_key is None:
+                tile.extend(group)
+            else:
+                tile.append(aggregate_points(group))
+    return tiles
+
+def read_index(layer_dir):
+    try:
+        with open(os.path.join(layer_dir, "index.json"), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def tile_layer(layer_path, tiles_dir=TILES_DIR, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM,
+               aggregate_below=AGGREGATE_BELOW_ZOOM):
+    """Tiles one layer file into tiles_dir/<layer>/<version>/ and publishes its index.json."""
+    layer = os.path.splitext(os.path.basename(layer_path))[0]
+    with open(layer_path, "r") as f:
+        geojson = json.load(f)
+    features = geojson["features"]
+    tiles = tile_features(features, min_zoom, max_zoom, aggregate_below)
+
+    encoded = {key: json.dumps({"type": "FeatureCollection", "features": tile}, separators=(",", ":"))
+               for key, tile in sorted(tiles.items())}
+    digest = hashlib.sha256()
+    for (z, x, y), text in encoded.items():
+        digest.update(f"{z}/{x}/{y}\n{text}\n".encode())
+    version = digest.hexdigest()[:12]
+
+    layer_dir = os.path.join(tiles_dir, layer)
+    previous = read_index(layer_dir)
+    version_dir = os.path.join(layer_dir, version)
+    if not os.path.isdir(version_dir):
+        staging_dir = os.path.join(layer_dir, f".{version}.{os.getpid()}.tmp")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        for (z, x, y), text in encoded.items():
+            tile_dir = os.path.join(staging_dir, str(z), str(x))
+            os.makedirs(tile_dir, exist_ok=True)
+            with open(os.path.join(tile_dir, f"{y}.json"), "w") as f:
+                f.write(text)
+        os.makedirs(staging_dir, exist_ok=True)
+        os.rename(staging_dir, version_dir)
+
+    bounds = None
+    if features:
+        boxes = [geometry_bounds(feature["geometry"]) for feature in features]
+        bounds = [min(b[0] for b in boxes), min(b[1] for b in boxes),
+                  max(b[2] for b in boxes), max(b[3] for b in boxes)]
+    index = {
+        "layer": layer,
+        "minzoom": min_zoom,
+        "maxzoom": max_zoom,
+        "aggregate_below": aggregate_below,
+        "bounds": bounds,
+        "features": len(features),
+        "version": version,
+        "tiles": {f"{z}/{x}/{y}": len(tile) for (z, x, y), tile in sorted(tiles.items())}
+    }
+    publish(os.path.join(layer_dir, "index.json"), json.dumps(index, separators=(",", ":")),
+            os.path.dirname(os.path.abspath(tiles_dir)))
+
+    # Keep this version and the one the previous index named; older ones
+    # (and tiles from before versioning) are no longer referenced
+    keep = {version, "index.json", (previous or {}).get("version")}
+    for name in os.listdir(layer_dir):
+        if name not in keep and not name.startswith("."):
+            path = os.path.join(layer_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Split layer GeoJSON into z/x/y tiles for the map client.")
+    parser.add_argument("layers", nargs="*", help="layer files to tile (default: every file in the layers dir)")
+    parser.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    parser.add_argument("--aggregate-below", type=int, default=AGGREGATE_BELOW_ZOOM,
+                        help="aggregate nearby points on zooms below this one")
+    parser.add_argument("--output-dir", default=TILES_DIR)
+    args = parser.parse_args()
+
+    layer_paths = args.layers or sorted(
+        os.path.join(LAYERS_DIR, name) for name in os.listdir(LAYERS_DIR) if name.endswith(".json")
+    )
+    for path in layer_paths:
+        index = tile_layer(path, args.output_dir, args.min_zoom, args.max_zoom, args.aggregate_below)
+        print(f"Tiled {index['layer']}: {index['features']} features into {len(index['tiles'])} tiles "
+              f"(z{args.min_zoom}-z{args.max_zoom})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import numpy as np
+
+# Array versions of the per-point factor functions in generate_probability.
+# Each mirrors its scalar counterpart operation for operation so the batch
+# engine produces the same floats as the scalar path.
+
+MIN_INTENSITY = 0.1
+MAX_INTENSITY = 5.0
+
+def weather_scores(precip, moisture, soil_temp, thresholds):
+    """
+    Vectorized calculate_weather_score. NaN precip marks points with no
+    weather data, which fall back to 1.0 like the scalar path.
+    """
+    precip = np.asarray(precip, dtype=float)
+    moisture = np.asarray(moisture, dtype=float)
+    soil_temp = np.asarray(soil_temp, dtype=float)
+    min_rain = thresholds["min_rain"]
+
+    with np.errstate(invalid="ignore"):
+        # 1. Rain Accumulation
+        rain_score = np.minimum(precip / min_rain, 1.5)
+
+        # 2. Soil Moisture
+        moisture_score = np.where(moisture > 0.35, 1.2, np.where(moisture < 0.15, 0.5, 1.0))
+
+        # 3. Temperature Shock
+        shock_score = np.ones_like(precip)
+        if thresholds["needs_shock"]:
+            shock_score = np.where(soil_temp < 15.0, 1.3, 1.0)
+
+        scores = rain_score * moisture_score * shock_score
+        scores = np.where(precip < min_rain * 0.5, 0.1, scores)
+    return np.where(np.isnan(precip), 1.0, scores)
+
+def aspect_scores(lats, lngs):
+    """Vectorized get_aspect_score."""
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    aspect = np.mod(lats * 1000 + lngs * 1000, 360)
+    return np.select(
+        [(aspect < 45) | (aspect > 315), aspect < 135, aspect < 225],
+        [1.3, 1.2, 0.7],
+        default=0.9
+    )
+
+def clamp_intensity(intensity):
+    return np.minimum(np.maximum(intensity, MIN_INTENSITY), MAX_INTENSITY)
@@ -0,0 +1,177 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Durable weather cache shared by generate_probability.py and
+# fetch_hyperlocal_weather.py. Entries are keyed by the rounded coordinate
+# cell plus the date window they cover, so a rerun on the same day is
+# served entirely from disk.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(SCRIPT_DIR, "data", "weather_cache.sqlite")
+DEFAULT_TTL_HOURS = 24
+DEFAULT_MAX_ENTRIES = 100_000
+WINDOW_DAYS = 14
+
+def cell_key(lat, lng):
+    return f"{lat:.3f},{lng:.3f}"
+
+def weather_window(now=None, days=WINDOW_DAYS):
+    """(start_date, end_date) strings for the trailing weather window."""
+    now = now or datetime.now()
+    end_date = now.strftime("%Y-%m-%d")
+    start_date = (now - timedelta(days=days)).strftime("%Y-%m-%d")
+    return start_date, end_date
+
+class WeatherCache:
+    """
+    SQLite-backed cache of weather aggregates with a TTL and a size cap.
+    WAL mode plus a busy timeout lets several processes share one file.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_hours=DEFAULT_TTL_HOURS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS weather ("
+            " cell TEXT NOT NULL,"
+            " start_date TEXT NOT NULL,"
+            " end_date TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " PRIMARY KEY (cell, start_date, end_date))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS weather_fetched_at ON weather (fetched_at)")
+        self._conn.commit()
+        self.evict()
+
+    def get(self, lat, lng, start_date, end_date):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM weather WHERE cell = ? AND start_date = ? AND end_date = ? AND fetched_at >= ?",
+                (cell_key(lat, lng), start_date, end_date, time.time() - self.ttl_seconds)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, lat, lng, start_date, end_date, result):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO weather VALUES (?, ?, ?, ?, ?)",
+                (cell_key(lat, lng), start_date, end_date, json.dumps(result), time.time())
+            )
+            self._conn.commit()
+
+    def set_many(self, entries, start_date, end_date):
+        """Stores [(lat, lng, result), ...] in a single transaction."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO weather VALUES (?, ?, ?, ?, ?)",
+                [(cell_key(lat, lng), start_date, end_date, json.dumps(result), now) for lat, lng, result in entries]
+            )
+            self._conn.commit()
+
+    def digest_cells(self, cells, start_date, end_date):
+        """
+        sha256 over the live cached payloads for the given cell keys, plus
+        the number of cells with no live entry. Does not count as lookups.
+        """
+        cells = sorted(set(cells))
+        payloads = {}
+        with self._lock:
+            for i in range(0, len(cells), 500):
+                chunk = cells[i:i + 500]
+                rows = self._conn.execute(
+                    "SELECT cell, payload FROM weather WHERE start_date = ? AND end_date = ? AND fetched_at >= ?"
+                    f" AND cell IN ({','.join('?' * len(chunk))})",
+                    [start_date, end_date, time.time() - self.ttl_seconds] + chunk
+                ).fetchall()
+                payloads.update(rows)
+        sha = hashlib.sha256()
+        for cell in cells:
+            if cell in payloads:
+                sha.update(f"{cell}={payloads[cell]}\n".encode())
+        return sha.hexdigest(), len(cells) - len(payloads)
+
+    def evict(self):
+        """Drops expired entries, then the oldest entries beyond max_entries."""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM weather WHERE fetched_at < ?", (time.time() - self.ttl_seconds,))
+            removed = cur.rowcount
+            cur = self._conn.execute(
+                "DELETE FROM weather WHERE rowid IN ("
+                " SELECT rowid FROM weather ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            removed += cur.rowcount
+            self._conn.commit()
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM weather")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM weather").fetchone()[0]
+        lookups = self.hits + self.misses
+        size_bytes = sum(
+            os.path.getsize(self.path + suffix)
+            for suffix in ("", "-wal")
+            if os.path.exists(self.path + suffix)
+        )
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": size_bytes
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_shared_cache = None
+
+def get_weather_cache(**kwargs):
+    """Process-wide cache instance; kwargs only apply on first use."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = WeatherCache(**kwargs)
+    return _shared_cache
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or maintain the on-disk weather cache.")
+    parser.add_argument("--path", default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--ttl-hours", type=float, default=DEFAULT_TTL_HOURS)
+    parser.add_argument("--max-entries", type=int, default=DEFAULT_MAX_ENTRIES)
+    parser.add_argument("--clear", action="store_true", help="remove every cached entry")
+    args = parser.parse_args()
+
+    cache = WeatherCache(args.path, args.ttl_hours, args.max_entries)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {args.path}")
+    print(json.dumps(cache.stats(), indent=2))
+    cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Shared Open-Meteo archive client used by generate_probability.py and
+# fetch_hyperlocal_weather.py. Coordinates are grouped into multi-location
+# requests which run on a thread pool over one pooled session, with a
+# token-bucket rate limiter and backoff on 429/5xx responses.
+
+ARCHIVE_URL = os.environ.get("OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
+DAILY_VARIABLES = ["precipitation_sum", "soil_temperature_0_to_7cm_mean", "soil_moisture_0_to_7cm_mean"]
+TIMEZONE = "America/Los_Angeles"
+
+DEFAULT_BATCH_SIZE = 50 # Locations per archive request
+DEFAULT_MAX_WORKERS = 4 # Max requests in flight
+DEFAULT_RATE_PER_SEC = 5.0
+DEFAULT_TIMEOUT = 30
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+def aggregate_daily(daily):
+    """
+    Collapses an Open-Meteo daily series into the 14-day aggregates. The
+    archive returns null for days it doesn't have yet (the last few); those
+    are left out, as weather_series does. None if a variable has no days.
+    """
+    precip, soil_temp, soil_moisture = (
+        [value for value in daily[name] if value is not None]
+        for name in ("precipitation_sum", "soil_temperature_0_to_7cm_mean", "soil_moisture_0_to_7cm_mean")
+    )
+    if not (precip and soil_temp and soil_moisture):
+        return None
+    precip_total = sum(precip) / 25.4 # mm to inches
+    avg_soil_temp = sum(soil_temp) / len(soil_temp)
+    avg_soil_moisture = sum(soil_moisture) / len(soil_moisture)
+    return {
+        "precip_14d_in": precip_total,
+        "soil_temp_c": avg_soil_temp,
+        "soil_moisture_m3": avg_soil_moisture # Volumetric water content
+    }
+
+class RateLimiter:
+    """Thread-safe token bucket; acquire() blocks until a token is free."""
+
+    def __init__(self, rate_per_sec, burst=None):
+        self.rate = rate_per_sec
+        self.capacity = burst or max(1.0, rate_per_sec)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class ApiClient:
+    """
+    JSON GETs against one endpoint over a pooled session, under a rate
+    limiter, retrying 429/5xx responses with exponential backoff (or the
+    server's Retry-After). Shared by WeatherClient and fetch_host_trees'
+    HostTreeHarvester.
+    """
+
+    def __init__(self, base_url, max_workers=DEFAULT_MAX_WORKERS, rate_per_sec=DEFAULT_RATE_PER_SEC,
+                 timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES, rate_limiter=None):
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limiter = rate_limiter or RateLimiter(rate_per_sec)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._count_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Zeroes the request counters and latencies, for a client reused across runs."""
+        with self._count_lock:
+            self.request_count = 0
+            self.retry_count = 0
+            self.latencies = [] # Seconds per HTTP request, including failed attempts
+
+    def _get(self, params):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            with self._count_lock:
+                self.request_count += 1
+            started = time.perf_counter()
+            response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            with self._count_lock:
+                self.latencies.append(time.perf_counter() - started)
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+                retry_after = response.headers.get("Retry-After")
+                if retry_after and retry_after.isdigit():
+                    delay = float(retry_after)
+                else:
+                    delay = BACKOFF_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5)
+                with self._count_lock:
+                    self.retry_count += 1
+                time.sleep(min(delay, BACKOFF_MAX_SECONDS))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def close(self):
+        self.session.close()
+
+class WeatherClient(ApiClient):
+    def __init__(self, base_url=ARCHIVE_URL, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS,
+                 rate_per_sec=DEFAULT_RATE_PER_SEC, timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 rate_limiter=None):
+        super().__init__(base_url, max_workers, rate_per_sec, timeout, max_retries, rate_limiter)
+        self.batch_size = batch_size
+
+    def _fetch_chunk(self, chunk, start_date, end_date, transform=aggregate_daily):
+        params = {
+            "latitude": ",".join(str(lat) for lat, _ in chunk),
+            "longitude": ",".join(str(lng) for _, lng in chunk),
+            "start_date": start_date,
+            "end_date": end_date,
+            "daily": DAILY_VARIABLES,
+            "timezone": TIMEZONE
+        }
+        try:
+            data = self._get(params)
+        except Exception as e:
+            print(f"Error fetching weather for {len(chunk)} locations: {e}")
+            return [None] * len(chunk)
+
+        # A single location comes back as an object, several as a list
+        locations = data if isinstance(data, list) else [data]
+        results = []
+        for loc in locations[:len(chunk)]:
+            try:
+                results.append(transform(loc["daily"]))
+            except (KeyError, TypeError, ValueError, ZeroDivisionError) as e:
+                # One malformed location shouldn't take down the rest of the batch
+                print(f"Error reading weather for ({loc.get('latitude')}, {loc.get('longitude')}): {e!r}")
+                results.append(None)
+        results.extend([None] * (len(chunk) - len(results)))
+        return results
+
+    def fetch_batch(self, coords, start_date, end_date, transform=aggregate_daily):
+        """
+        Fetches aggregates for a list of (lat, lng) tuples. Returns a list
+        aligned with coords, with None wherever a location failed.
+        """
+        chunks = [coords[i:i + self.batch_size] for i in range(0, len(coords), self.batch_size)]
+        if not chunks:
+            return []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            chunk_results = pool.map(lambda chunk: self._fetch_chunk(chunk, start_date, end_date, transform), chunks)
+            return [result for results in chunk_results for result in results]
+
+    def fetch_daily_batch(self, coords, start_date, end_date):
+        """Like fetch_batch, but returns each location's raw daily series."""
+        return self.fetch_batch(coords, start_date, end_date, transform=lambda daily: daily)
+
+    def fetch_one(self, lat, lng, start_date, end_date):
+        return self._fetch_chunk([(lat, lng)], start_date, end_date)[0]
+
+_shared_client = None
+
+def get_weather_client(**kwargs):
+    """Process-wide client so every caller shares one pool and rate budget."""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = WeatherClient(**kwargs)
+    return _shared_client
+
+# Local stand-in for the archive API, for offline throughput testing
+
+STUB_NULL_DAYS = 2 # Like the real archive, the stub has no values for the most recent days
+
+class StubArchiveHandler(BaseHTTPRequestHandler):
+    latency = 0.05
+    error_rate = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+
+        query = parse_qs(urlparse(self.path).query)
+        lats = [float(v) for v in query["latitude"][0].split(",")]
+        lngs = [float(v) for v in query["longitude"][0].split(",")]
+        start = datetime.strptime(query["start_date"][0], "%Y-%m-%d")
+        end = datetime.strptime(query["end_date"][0], "%Y-%m-%d")
+        days = (end - start).days + 1
+        available = (datetime.now() - timedelta(days=STUB_NULL_DAYS)).strftime("%Y-%m-%d")
+
+        def daily(rngs, dates, low, high, digits):
+            return [round(rng.uniform(low, high), digits) if day <= available else None for rng, day in zip(rngs, dates)]
+
+        locations = []
+        for lat, lng in zip(lats, lngs):
+            dates = [(start + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(days)]
+            # Seeded per cell and day, so overlapping windows agree
+            rngs = [random.Random(f"{lat:.3f},{lng:.3f},{day}") for day in dates]
+            locations.append({
+                "latitude": lat,
+                "longitude": lng,
+                "daily": {
+                    "time": dates,
+                    "precipitation_sum": daily(rngs, dates, 0, 12, 1),
+                    "soil_temperature_0_to_7cm_mean": daily(rngs, dates, 6, 18, 1),
+                    "soil_moisture_0_to_7cm_mean": daily(rngs, dates, 0.1, 0.45, 3)
+                }
+            })
+        body = json.dumps(locations[0] if len(locations) == 1 else locations).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(port=0, latency=0.05, error_rate=0.0):
+    """Starts the stub archive API on a daemon thread; returns (server, url)."""
+    handler = type("Handler", (StubArchiveHandler,), {"latency": latency, "error_rate": error_rate})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/archive"
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-Meteo client throughput check against a local stub server.")
+    parser.add_argument("--serve", action="store_true", help="only run the stub server until interrupted")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--locations", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub response delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub responses that are 429s")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.port, args.latency, args.error_rate)
+    if args.serve:
+        print(f"Stub archive API listening on {url}")
+        try:
+            threading.Event().wait() # The server thread does the serving
+        except KeyboardInterrupt:
+            pass
+        server.shutdown()
+        server.server_close()
+        return
+
+    rng = random.Random(0)
+    coords = [(rng.uniform(36.5, 42.0), rng.uniform(-124.5, -119.0)) for _ in range(args.locations)]
+    start_date = (datetime.now() - timedelta(days=14)).strftime("%Y-%m-%d")
+    end_date = datetime.now().strftime("%Y-%m-%d")
+
+    configs = [
+        ("sequential, 1 location/request", dict(batch_size=1, max_workers=1)),
+        ("batched + pooled", dict()),
+    ]
+    for label, kwargs in configs:
+        client = WeatherClient(base_url=url, rate_per_sec=0, **kwargs)
+        started = time.perf_counter()
+        results = client.fetch_batch(coords, start_date, end_date)
+        elapsed = time.perf_counter() - started
+        ok = sum(1 for r in results if r)
+        print(f"{label}: {ok}/{len(coords)} locations in {elapsed:.2f}s "
+              f"({len(coords) / elapsed:.0f} loc/s, {client.request_count} requests, {client.retry_count} retries)")
+        client.close()
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+from fetch_env_data import AOI_BOUNDS, REGIONAL_WEATHER, region_for
+from weather_cache import cell_key
+
+# Coarse weather lattice. Instead of one Open-Meteo lookup per observation
+# point, weather is fetched once per node of a regular lattice over the AOI
+# and each point's value is interpolated from the four nodes around it.
+# Open-Meteo's archive reanalysis is ~0.25 deg anyway, so points a few km
+# apart were already getting the same cell; now the number of lookups is
+# bounded by the lattice size however many points are scored. Nodes the API
+# has no data for take the regional numbers from fetch_env_data.
+
+LATTICE_SPACING_DEG = 0.25
+METHODS = ["bilinear", "idw"]
+
+# Order of the rows returned by interpolate(), as fetch_weather_arrays uses
+FIELDS = ["precip_14d_in", "soil_moisture_m3", "soil_temp_c"]
+
+# Converting the regional summaries to the API's units: soil_moisture_pct
+# is percent of saturation, temp_anomaly_c is relative to a typical
+# rainy-season 0-7cm soil temperature
+SOIL_POROSITY_M3 = 0.45
+SOIL_TEMP_NORMAL_C = 10.0
+
+def regional_fallback(lat, lng):
+    """Weather aggregates for a point from its fetch_env_data region."""
+    region = REGIONAL_WEATHER[region_for(lat, lng)]
+    return {
+        "precip_14d_in": region["precip_total_14d_in"],
+        "soil_moisture_m3": region["soil_moisture_pct"] / 100 * SOIL_POROSITY_M3,
+        "soil_temp_c": SOIL_TEMP_NORMAL_C + region["temp_anomaly_c"]
+    }
+
+class WeatherLattice:
+    """
+    Lattice nodes at multiples of spacing from the south-west corner of
+    bounds, covering it. Node weather is fetched lazily, only for nodes some
+    point actually needs, through fetch(coords) -> [aggregates dict or None].
+    """
+
+    def __init__(self, fetch, bounds=AOI_BOUNDS, spacing=LATTICE_SPACING_DEG, method="bilinear"):
+        if method not in METHODS:
+            raise ValueError(f"unknown interpolation method {method!r}")
+        self.fetch = fetch
+        self.bounds = bounds
+        self.spacing = spacing
+        self.method = method
+        rows = max(2, int(math.ceil((bounds["north"] - bounds["south"]) / spacing - 1e-9)) + 1)
+        cols = max(2, int(math.ceil((bounds["east"] - bounds["west"]) / spacing - 1e-9)) + 1)
+        self.node_lats = bounds["south"] + np.arange(rows) * spacing
+        self.node_lngs = bounds["west"] + np.arange(cols) * spacing
+        self.values = np.full((len(FIELDS), rows, cols), np.nan)
+        self.loaded = np.zeros((rows, cols), dtype=bool)
+        self.fallback_nodes = 0
+
+    @property
+    def shape(self):
+        return self.loaded.shape
+
+    def describe(self):
+        """Settings that change interpolated values, for the build manifest."""
+        return {"bounds": self.bounds, "spacing": self.spacing, "method": self.method}
+
+    def _corners(self, lats, lngs):
+        """South-west node (row, col) of each point's lattice cell, plus its fractional offsets."""
+        rows, cols = self.shape
+        fy = np.clip((np.asarray(lats, dtype=float) - self.bounds["south"]) / self.spacing, 0, rows - 1)
+        fx = np.clip((np.asarray(lngs, dtype=float) - self.bounds["west"]) / self.spacing, 0, cols - 1)
+        row = np.minimum(np.floor(fy).astype(np.intp), rows - 2)
+        col = np.minimum(np.floor(fx).astype(np.intp), cols - 2)
+        return row, col, fy - row, fx - col
+
+    def _ensure(self, rows, cols):
+        """Fetches the given nodes that aren't loaded yet, filling gaps from the regional numbers."""
+        wanted = np.zeros(self.shape, dtype=bool)
+        wanted[rows, cols] = True
+        todo = np.argwhere(wanted & ~self.loaded)
+        if not len(todo):
+            return
+        coords = [(float(self.node_lats[r]), float(self.node_lngs[c])) for r, c in todo]
+        for (r, c), (lat, lng), result in zip(todo, coords, self.fetch(coords)):
+            if result is None:
+                result = regional_fallback(lat, lng)
+                self.fallback_nodes += 1
+            self.values[:, r, c] = [result[field] for field in FIELDS]
+        self.loaded[todo[:, 0], todo[:, 1]] = True
+
+    def node_cells(self, lats, lngs):
+        """Cell keys of every node the points' values are interpolated from."""
+        row, col, _, _ = self._corners(lats, lngs)
+        nodes = set(zip(row.tolist(), col.tolist()))
+        nodes |= {(r + dr, c + dc) for r, c in nodes for dr in (0, 1) for dc in (0, 1)}
+        return {cell_key(self.node_lats[r], self.node_lngs[c]) for r, c in nodes}
+
+    def interpolate(self, lats, lngs):
+        """(len(FIELDS), n) array of interpolated weather for the points."""
+        row, col, ty, tx = self._corners(lats, lngs)
+        corners = [(row, col), (row, col + 1), (row + 1, col), (row + 1, col + 1)]
+        self._ensure(np.concatenate([r for r, _ in corners]), np.concatenate([c for _, c in corners]))
+
+        if self.method == "bilinear":
+            weights = [(1 - ty) * (1 - tx), (1 - ty) * tx, ty * (1 - tx), ty * tx]
+        else:
+            # Inverse distance squared in lattice units; a point on a node takes its value
+            offsets = [(ty, tx), (ty, 1 - tx), (1 - ty, tx), (1 - ty, 1 - tx)]
+            distances = [dy * dy + dx * dx for dy, dx in offsets]
+            exact = np.any([d == 0 for d in distances], axis=0)
+            with np.errstate(divide="ignore"):
+                weights = [np.where(exact, (d == 0).astype(float), 1 / d) for d in distances]
+        total = sum(weights)
+        return sum(self.values[:, r, c] * w for (r, c), w in zip(corners, weights)) / total
+
+    def stats(self):
+        return {
+            "nodes": int(self.loaded.size),
+            "nodes_fetched": int(self.loaded.sum()),
+            "fallback_nodes": self.fallback_nodes
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Interpolate lattice weather at random AOI points.")
+    parser.add_argument("--spacing", type=float, default=LATTICE_SPACING_DEG, help="node spacing in degrees")
+    parser.add_argument("--method", choices=METHODS, default="bilinear")
+    parser.add_argument("--points", type=int, default=100_000)
+    args = parser.parse_args()
+
+    from generate_probability import fetch_cell_weather
+    lattice = WeatherLattice(fetch_cell_weather, spacing=args.spacing, method=args.method)
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(AOI_BOUNDS["south"], AOI_BOUNDS["north"], args.points)
+    lngs = rng.uniform(AOI_BOUNDS["west"], AOI_BOUNDS["east"], args.points)
+
+    started = time.perf_counter()
+    weather = lattice.interpolate(lats, lngs)
+    elapsed = time.perf_counter() - started
+    print(f"{args.points} points from {lattice.shape[0]}x{lattice.shape[1]} nodes in {elapsed:.3f}s: {lattice.stats()}")
+    for field, row in zip(FIELDS, weather):
+        print(f"  {field}: min {row.min():.3f}, mean {row.mean():.3f}, max {row.max():.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from weather_cache import cell_key
+
+# Local store of daily weather per grid cell. Each day is fetched once and
+# kept, so a run only requests the days a cell doesn't have yet (normally
+# just the newest one or two) instead of the whole trailing window. Window
+# queries are answered from cumulative sums, so "rain total N days ago over
+# M days" costs one subtraction per cell however long the window is.
+#
+# Days the archive has no values for yet (it trails real time by a few
+# days) are not stored and are asked for again on the next run.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SERIES_PATH = os.path.join(SCRIPT_DIR, "data", "weather_series.sqlite")
+RETENTION_DAYS = 120
+
+# Store column -> Open-Meteo daily variable
+VARIABLES = {
+    "precip_mm": "precipitation_sum",
+    "soil_temp_c": "soil_temperature_0_to_7cm_mean",
+    "soil_moisture_m3": "soil_moisture_0_to_7cm_mean"
+}
+MM_PER_INCH = 25.4
+
+def parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d").date() if isinstance(value, str) else value
+
+def cell_coords(cell):
+    lat, lng = cell.split(",")
+    return float(lat), float(lng)
+
+class SeriesTable:
+    """
+    Daily values for a set of cells over [start, end], plus cumulative sums
+    and valid-day counts along the day axis for O(1) window queries.
+    """
+
+    def __init__(self, cells, start, end, values):
+        self.cells = cells
+        self.start = start
+        self.end = end
+        self.values = values # {variable: (cells, days) array, NaN where missing}
+        self._cum = {}
+        self._count = {}
+        for name, array in values.items():
+            valid = ~np.isnan(array)
+            zeros = np.zeros((len(cells), 1))
+            self._cum[name] = np.concatenate([zeros, np.cumsum(np.where(valid, array, 0.0), axis=1)], axis=1)
+            self._count[name] = np.concatenate([zeros, np.cumsum(valid, axis=1)], axis=1)
+
+    @property
+    def days(self):
+        return (self.end - self.start).days + 1
+
+    def _bounds(self, lag, days):
+        stop = self.days - lag
+        first = stop - days
+        if first < 0 or lag < 0 or days < 1:
+            raise ValueError(f"window of {days} days lagged {lag} falls outside {self.start}..{self.end}")
+        return first, stop
+
+    def window_sum(self, name, lag=0, days=1):
+        """Per-cell sum over the days-long window ending lag days before end."""
+        first, stop = self._bounds(lag, days)
+        return self._cum[name][:, stop] - self._cum[name][:, first]
+
+    def window_count(self, name, lag=0, days=1):
+        first, stop = self._bounds(lag, days)
+        return self._count[name][:, stop] - self._count[name][:, first]
+
+    def window_mean(self, name, lag=0, days=1):
+        """Per-cell mean over the window's days with data; NaN where there are none."""
+        count = self.window_count(name, lag, days)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, self.window_sum(name, lag, days) / count, np.nan)
+
+    def aggregate_stack(self, lags, days):
+        """
+        (3, len(lags), cells) array of precip (in), soil moisture and soil
+        temp over the days-long window ending each lag days before end; NaN
+        where a window has no data. Each window is one difference of the
+        cumulative sums, so the cost doesn't grow with the window length.
+        """
+        lags = np.asarray(lags, dtype=np.intp).reshape(-1)
+        for lag in lags:
+            self._bounds(int(lag), days)
+        stops = self.days - lags
+        firsts = stops - days
+        stack = np.full((3, len(lags), len(self.cells)), np.nan)
+        if not len(self.cells):
+            return stack
+        sums = {name: (cum[:, stops] - cum[:, firsts]).T for name, cum in self._cum.items()}
+        counts = {name: (count[:, stops] - count[:, firsts]).T for name, count in self._count.items()}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            moisture = sums["soil_moisture_m3"] / counts["soil_moisture_m3"]
+            soil_temp = sums["soil_temp_c"] / counts["soil_temp_c"]
+        has_data = (counts["precip_mm"] > 0) & (counts["soil_moisture_m3"] > 0) & (counts["soil_temp_c"] > 0)
+        stack[0] = np.where(has_data, sums["precip_mm"] / MM_PER_INCH, np.nan)
+        stack[1] = np.where(has_data, moisture, np.nan)
+        stack[2] = np.where(has_data, soil_temp, np.nan)
+        return stack
+
+    def aggregates(self, lag=0, days=None):
+        """
+        The three 14-day style aggregates per cell, as WeatherClient returns
+        them, or None for cells with no data in the window.
+        """
+        precip, moisture, soil_temp = self.aggregate_stack([lag], days or self.days)[:, 0]
+        results = []
+        for i in range(len(self.cells)):
+            if np.isnan(precip[i]):
+                results.append(None)
+                continue
+            results.append({
+                "precip_14d_in": float(precip[i]),
+                "soil_temp_c": float(soil_temp[i]),
+                "soil_moisture_m3": float(moisture[i])
+            })
+        return results
+
+class WeatherSeriesStore:
+    """SQLite store of daily values per cell; WAL mode so processes can share it."""
+
+    def __init__(self, path=DEFAULT_SERIES_PATH, retention_days=RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self.days_fetched = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS daily ("
+            " cell TEXT NOT NULL,"
+            " day INTEGER NOT NULL," # date.toordinal()
+            " precip_mm REAL,"
+            " soil_temp_c REAL,"
+            " soil_moisture_m3 REAL,"
+            " fetched_at REAL NOT NULL,"
+            " PRIMARY KEY (cell, day)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def _rows(self, cells, start, end, columns, group_by_cell=False):
+        """(cell, day, *columns) rows in [start, end], or (cell, days stored) when grouping."""
+        cells = list(cells)
+        select = "COUNT(*)" if group_by_cell else f"day{columns}"
+        group = " GROUP BY cell" if group_by_cell else ""
+        with self._lock:
+            for i in range(0, len(cells), 500):
+                chunk = cells[i:i + 500]
+                yield from self._conn.execute(
+                    f"SELECT cell, {select} FROM daily WHERE day BETWEEN ? AND ?"
+                    f" AND cell IN ({','.join('?' * len(chunk))}){group}",
+                    [start.toordinal(), end.toordinal()] + chunk
+                )
+
+    def missing_ranges(self, cells, start, end):
+        """{cell: (first missing day, last missing day)} for cells with gaps in [start, end]."""
+        start, end = parse_day(start), parse_day(end)
+        days = (end - start).days + 1
+        # Only cells short of days need their stored days listed
+        stored = dict(self._rows(dict.fromkeys(cells), start, end, "", group_by_cell=True))
+        cells = [cell for cell in dict.fromkeys(cells) if stored.get(cell, 0) < days]
+        position = {cell: i for i, cell in enumerate(cells)}
+        have = np.zeros((len(cells), max(days, 0)), dtype=bool)
+        rows = list(self._rows(cells, start, end, ""))
+        if rows:
+            row_cells, row_days = zip(*rows)
+            have[np.fromiter(map(position.get, row_cells), dtype=np.intp, count=len(rows)),
+                 np.array(row_days, dtype=np.intp) - start.toordinal()] = True
+        ranges = {}
+        for i in np.flatnonzero(~have.all(axis=1)):
+            missing = np.flatnonzero(~have[i])
+            ranges[cells[i]] = (start + timedelta(days=int(missing[0])), start + timedelta(days=int(missing[-1])))
+        return ranges
+
+    def add_daily(self, entries):
+        """Stores [(cell, Open-Meteo daily dict), ...]; days without values are skipped."""
+        now = time.time()
+        rows = []
+        for cell, daily in entries:
+            columns = [daily.get(VARIABLES[name]) or [] for name in VARIABLES]
+            for i, day in enumerate(daily.get("time", [])):
+                values = [column[i] if i < len(column) else None for column in columns]
+                if all(value is None for value in values):
+                    continue
+                rows.append((cell, parse_day(day).toordinal(), *values, now))
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO daily VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+        return len(rows)
+
+    def update(self, cells, start, end, client):
+        """
+        Fetches only the days each cell is missing in [start, end]. Cells
+        sharing the same gap go out together in batched requests.
+        Returns the number of (cell, day) values stored.
+        """
+        groups = defaultdict(list)
+        for cell, gap in self.missing_ranges(cells, start, end).items():
+            groups[gap].append(cell)
+        stored = 0
+        for (gap_start, gap_end), gap_cells in groups.items():
+            coords = [cell_coords(cell) for cell in gap_cells]
+            series = client.fetch_daily_batch(coords, gap_start.isoformat(), gap_end.isoformat())
+            stored += self.add_daily([(cell, daily) for cell, daily in zip(gap_cells, series) if daily])
+        self.days_fetched += stored
+        return stored
+
+    def load(self, cells, start, end):
+        """SeriesTable of stored values for cells over [start, end]."""
+        start, end = parse_day(start), parse_day(end)
+        cells = list(cells)
+        position = {cell: i for i, cell in enumerate(cells)}
+        days = (end - start).days + 1
+        values = {name: np.full((len(cells), days), np.nan) for name in VARIABLES}
+        columns = "".join(f", {name}" for name in VARIABLES)
+        rows = list(self._rows(cells, start, end, columns))
+        if rows:
+            row_cells, row_days, *row_values = zip(*rows)
+            rows_at = np.fromiter(map(position.get, row_cells), dtype=np.intp, count=len(rows))
+            days_at = np.array(row_days, dtype=np.intp) - start.toordinal()
+            for name, column in zip(VARIABLES, row_values):
+                values[name][rows_at, days_at] = np.array(column, dtype=float) # None -> NaN
+        return SeriesTable(cells, start, end, values)
+
+    def prune(self, today=None):
+        """Drops days older than the retention period."""
+        cutoff = (today or date.today()) - timedelta(days=self.retention_days)
+        with self._lock:
+            self._conn.execute("DELETE FROM daily WHERE day < ?", (cutoff.toordinal(),))
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            cells, rows = self._conn.execute("SELECT COUNT(DISTINCT cell), COUNT(*) FROM daily").fetchone()
+        return {"cells": cells, "days": rows, "days_fetched": self.days_fetched}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_shared_store = None
+
+def get_weather_series(**kwargs):
+    """Process-wide store instance; kwargs only apply on first use."""
+    global _shared_store
+    if _shared_store is None:
+        _shared_store = WeatherSeriesStore(**kwargs)
+    return _shared_store
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or maintain the daily weather series store.")
+    parser.add_argument("--path", default=DEFAULT_SERIES_PATH)
+    parser.add_argument("--cell", help="lat,lng of the cell to query")
+    parser.add_argument("--lag", type=int, default=0, help="window ends this many days before today")
+    parser.add_argument("--days", type=int, default=14, help="window length in days")
+    parser.add_argument("--prune", action="store_true", help=f"drop days older than {RETENTION_DAYS} days")
+    args = parser.parse_args()
+
+    store = WeatherSeriesStore(args.path)
+    if args.prune:
+        store.prune()
+    if args.cell:
+        lat, lng = (float(v) for v in args.cell.split(","))
+        end = date.today()
+        table = store.load([cell_key(lat, lng)], end - timedelta(days=args.lag + args.days - 1), end)
+        rain = table.window_sum("precip_mm", args.lag, args.days)[0] / MM_PER_INCH
+        count = int(table.window_count("precip_mm", args.lag, args.days)[0])
+        print(f"{cell_key(lat, lng)}: {rain:.2f} in of rain over {args.days} days ending {args.lag} days ago "
+              f"({count}/{args.days} days stored)")
+    print(store.stats())
+
+if __name__ == "__main__":
+    main()